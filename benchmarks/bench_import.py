@@ -0,0 +1,62 @@
+"""
+Benchmark the time to import elma in a fresh interpreter, and list the
+slowest imports reported by ``python -X importtime``.
+
+Usage:
+    python benchmarks/bench_import.py [--module elma] [--repeat 10] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def import_time(module: str) -> float:
+    """
+    Returns the wall time in seconds of starting an interpreter and importing
+    a module.
+    """
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import %s' % module], cwd=ROOT, check=True)
+    return time.perf_counter() - start
+
+
+def slowest_imports(module: str, top: int) -> list:
+    """
+    Returns (cumulative microseconds, module name) of the slowest imports of
+    `python -X importtime`.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                            cwd=ROOT, check=True, capture_output=True, text=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times.append((int(cumulative), name.strip()))
+    return sorted(times, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='elma', help="module to import")
+    parser.add_argument('--repeat', type=int, default=10, help="number of timed interpreter starts")
+    parser.add_argument('--top', type=int, default=10, help="number of slowest imports to list")
+    args = parser.parse_args()
+
+    baseline = [import_time('sys') for _ in range(args.repeat)]
+    times = [import_time(args.module) for _ in range(args.repeat)]
+    print('interpreter start: %.1f ms' % (statistics.median(baseline) * 1000))
+    print('import %s: %.1f ms (median of %d, interpreter start excluded)' %
+          (args.module, (statistics.median(times) - statistics.median(baseline)) * 1000, args.repeat))
+    print('slowest imports (cumulative):')
+    for cumulative, name in slowest_imports(args.module, args.top):
+        print('  %8.1f ms  %s' % (cumulative / 1000, name))
+
+
+if __name__ == '__main__':
+    main()
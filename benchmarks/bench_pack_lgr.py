@@ -0,0 +1,66 @@
+"""
+Benchmark serial and parallel pack_LGR on a synthetically scaled up LGR.
+
+The images of tests/files/default.lgr are repeated ``--copies`` times and
+resized by ``--zoom`` to imitate a large custom LGR.
+
+Usage:
+    python benchmarks/bench_pack_lgr.py [--copies 10] [--zoom 4] [--workers 1 2 4 8] [--processes]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from elma.lgr import LGR, LGR_Image, pack_LGR, unpack_LGR  # noqa: E402
+
+DEFAULT_LGR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'tests', 'files', 'default.lgr')
+
+
+def scaled_lgr(copies: int, zoom: int) -> LGR:
+    """
+    Returns default.lgr with every image repeated `copies` times and resized
+    by a factor of `zoom`.
+    """
+    source = unpack_LGR(DEFAULT_LGR)
+    lgr = LGR(palette=source.palette)
+    for i in range(copies):
+        for image in source.images:
+            img = image.img.resize((image.img.width * zoom, image.img.height * zoom))
+            lgr.images.append(LGR_Image(
+                '%s%d' % (image.name[:6], i) if i else image.name,
+                img=img,
+                image_type=image.image_type,
+                default_distance=image.default_distance,
+                default_clipping=image.default_clipping,
+                transparency=image.transparency,
+                padding=image.padding))
+    return lgr
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=10)
+    parser.add_argument('--zoom', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--processes', action='store_true', help='use a process pool instead of threads')
+    args = parser.parse_args()
+
+    lgr = scaled_lgr(args.copies, args.zoom)
+    expected = pack_LGR(lgr)
+    print('%d images, %d bytes packed' % (len(lgr.images), len(expected)))
+    for workers in args.workers:
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            packed = pack_LGR(lgr, workers=workers, use_processes=args.processes)
+            best = min(best, time.perf_counter() - start)
+        assert packed == expected, 'output differs from serial packing'
+        print('workers=%-3d %8.3f s' % (workers, best))
+
+
+if __name__ == '__main__':
+    main()
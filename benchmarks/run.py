@@ -0,0 +1,315 @@
+"""
+Benchmark suite for packing, unpacking, rendering and LGR handling, run over
+the files in tests/files and over inputs scaled up from them.
+
+Results are compared to a baseline JSON file. Benchmarks slower than the
+baseline by more than the threshold are reported as regressions and make the
+script exit with status 1. Baselines depend on the machine, so record one
+locally with --save before making changes.
+
+Usage:
+    python benchmarks/run.py [--save] [--baseline FILE] [--threshold 0.25] [--scale 20] [--repeat 5] [FILTER...]
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, ROOT)
+
+from elma.error import check_LGR_error  # noqa: E402
+from elma.lgr import pack_LGR, unpack_LGR  # noqa: E402
+from elma.models import Level, Obj, Replay  # noqa: E402
+from elma.packing import pack_level, pack_replay, unpack_level, unpack_replay  # noqa: E402
+from elma.render import LevelRenderer  # noqa: E402
+from elma.synth import random_level, random_replay  # noqa: E402
+
+import bench_import  # noqa: E402
+import bench_pack_lgr  # noqa: E402
+
+FILES = os.path.join(ROOT, 'tests', 'files')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# benchmark name -> function of the scale factor that prepares the inputs and
+# returns the function to time
+BENCHMARKS: Dict[str, Callable[[int], Callable[[], Any]]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    def register(setup: Callable[[int], Callable[[], Any]]) -> Callable[[int], Callable[[], Any]]:
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def read(name: str) -> bytes:
+    with open(os.path.join(FILES, name), 'rb') as f:
+        return f.read()
+
+
+def scaled_level(scale: int) -> Level:
+    """
+    Returns qwquu039.lev with its polygons, pictures and objects other than
+    the start repeated `scale` times side by side.
+    """
+    level = unpack_level(read('qwquu039.lev'))
+    width = level.max_x() - level.min_x()
+    polygons, objects, pictures = list(level.polygons), list(level.objects), list(level.pictures)
+    for i in range(1, scale):
+        for polygon in copy.deepcopy(polygons):
+            polygon.move_by(x=i * width)
+            level.polygons.append(polygon)
+        for obj in copy.deepcopy(objects):
+            if obj.type != Obj.START:
+                obj.point.x += i * width
+                level.objects.append(obj)
+        for picture in copy.deepcopy(pictures):
+            picture.point.x += i * width
+            level.pictures.append(picture)
+    return level
+
+
+def scaled_replay(scale: int) -> Replay:
+    """
+    Returns test.rec with its frames and events repeated `scale` times.
+    """
+    replay = unpack_replay(read('test.rec'))
+    frames, events = replay.frames, list(replay.events)
+    offset = events[-1].time if events else 0
+    replay.frames = [frame for _ in range(scale) for frame in frames]
+    for i in range(1, scale):
+        for event in copy.deepcopy(events):
+            event.time += i * offset
+            replay.events.append(event)
+    return replay
+
+
+for name in ['test.lev', 'qwquu039.lev']:
+    @benchmark('unpack_level[%s]' % name)
+    def _(scale: int, name: str = name) -> Callable[[], Any]:
+        packed = read(name)
+        return lambda: unpack_level(packed)
+
+    @benchmark('pack_level[%s]' % name)
+    def _(scale: int, name: str = name) -> Callable[[], Any]:
+        level = unpack_level(read(name))
+        return lambda: pack_level(level)
+
+for name in ['test.rec', 'test_nonstandard_rec_format.rec']:
+    @benchmark('unpack_replay[%s]' % name)
+    def _(scale: int, name: str = name) -> Callable[[], Any]:
+        packed = read(name)
+        return lambda: unpack_replay(packed)
+
+    @benchmark('unpack_replay_frames[%s]' % name)
+    def _(scale: int, name: str = name) -> Callable[[], Any]:
+        packed = read(name)
+        return lambda: unpack_replay(packed).frames
+
+    @benchmark('pack_replay[%s]' % name)
+    def _(scale: int, name: str = name) -> Callable[[], Any]:
+        replay = unpack_replay(read(name))
+        replay.frames
+        return lambda: pack_replay(replay)
+
+
+@benchmark('unpack_level[scaled]')
+def _(scale: int) -> Callable[[], Any]:
+    packed = pack_level(scaled_level(scale))
+    return lambda: unpack_level(packed)
+
+
+@benchmark('pack_level[scaled]')
+def _(scale: int) -> Callable[[], Any]:
+    level = scaled_level(scale)
+    return lambda: pack_level(level)
+
+
+@benchmark('unpack_level[synth]')
+def _(scale: int) -> Callable[[], Any]:
+    packed = random_level(seed=0, polygons=10 * scale, vertices=5000 * scale, objects=50 * scale).pack()
+    return lambda: unpack_level(packed)
+
+
+@benchmark('pack_level[synth]')
+def _(scale: int) -> Callable[[], Any]:
+    level = random_level(seed=0, polygons=10 * scale, vertices=5000 * scale, objects=50 * scale)
+    return lambda: pack_level(level)
+
+
+@benchmark('unpack_replay_frames[synth]')
+def _(scale: int) -> Callable[[], Any]:
+    packed = random_replay(seed=0, seconds=30 * scale).pack()
+    return lambda: unpack_replay(packed).frames
+
+
+@benchmark('render[synth]')
+def _(scale: int) -> Callable[[], Any]:
+    level = random_level(seed=0, polygons=10 * scale, vertices=5000 * scale, objects=50 * scale)
+    return lambda: LevelRenderer(level).render()
+
+
+@benchmark('render_thumbnail[synth]')
+def _(scale: int) -> Callable[[], Any]:
+    level = random_level(seed=0, polygons=10 * scale, vertices=5000 * scale, objects=50 * scale)
+    return lambda: LevelRenderer(level, max_width=200, max_height=200).render()
+
+
+@benchmark('render_thumbnail_simplified[synth]')
+def _(scale: int) -> Callable[[], Any]:
+    level = random_level(seed=0, polygons=10 * scale, vertices=5000 * scale, objects=50 * scale)
+    return lambda: LevelRenderer(level, max_width=200, max_height=200, simplify=True).render()
+
+
+@benchmark('unpack_replay_frames[scaled]')
+def _(scale: int) -> Callable[[], Any]:
+    packed = pack_replay(scaled_replay(scale))
+    return lambda: unpack_replay(packed).frames
+
+
+@benchmark('pack_replay[scaled]')
+def _(scale: int) -> Callable[[], Any]:
+    replay = scaled_replay(scale)
+    return lambda: pack_replay(replay)
+
+
+@benchmark('render[qwquu039.lev]')
+def _(scale: int) -> Callable[[], Any]:
+    level = unpack_level(read('qwquu039.lev'))
+    return lambda: LevelRenderer(level).render()
+
+
+@benchmark('render_lgr[qwquu039.lev]')
+def _(scale: int) -> Callable[[], Any]:
+    level = unpack_level(read('qwquu039.lev'))
+    lgr = unpack_LGR(os.path.join(FILES, 'default.lgr'))
+    return lambda: LevelRenderer(level, lgr=lgr).render()
+
+
+@benchmark('render[scaled]')
+def _(scale: int) -> Callable[[], Any]:
+    level = scaled_level(scale)
+    return lambda: LevelRenderer(level, max_width=None, max_height=None).render()
+
+
+@benchmark('unpack_LGR[default.lgr]')
+def _(scale: int) -> Callable[[], Any]:
+    packed = read('default.lgr')
+    return lambda: unpack_LGR(packed)
+
+
+@benchmark('pack_LGR[default.lgr]')
+def _(scale: int) -> Callable[[], Any]:
+    lgr = unpack_LGR(os.path.join(FILES, 'default.lgr'))
+    return lambda: pack_LGR(lgr)
+
+
+@benchmark('pack_LGR[scaled]')
+def _(scale: int) -> Callable[[], Any]:
+    lgr = bench_pack_lgr.scaled_lgr(max(1, scale // 10), 2)
+    return lambda: pack_LGR(lgr)
+
+
+@benchmark('check_LGR_error[default.lgr]')
+def _(scale: int) -> Callable[[], Any]:
+    lgr = unpack_LGR(os.path.join(FILES, 'default.lgr'))
+    return lambda: check_LGR_error(lgr)
+
+
+@benchmark('import[elma]')
+def _(scale: int) -> Callable[[], Any]:
+    return lambda: bench_import.import_time('elma')
+
+
+def measure(function: Callable[[], Any], repeat: int, min_time: float = 0.05) -> float:
+    """
+    Returns the fastest time in seconds of one call to a function, timing
+    `repeat` rounds of as many calls as take at least `min_time` seconds.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed * 2 >= min_time else 10
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('filters', nargs='*', metavar='FILTER', help="only run benchmarks containing one of these")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument('--save', action='store_true', help="save the results as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="relative slowdown reported as a regression (default: 0.25)")
+    parser.add_argument('--scale', type=int, default=20, help="scale factor of the scaled inputs")
+    parser.add_argument('--repeat', type=int, default=5, help="number of timed rounds")
+    parser.add_argument('--list', action='store_true', help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if not args.filters or any(f in name for f in args.filters)]
+    if args.list:
+        print('\n'.join(names))
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is not None and baseline.get('scale') != args.scale:
+        print('baseline was recorded with --scale %s, not comparing' % baseline.get('scale'))
+        baseline = None
+    previous = baseline['results'] if baseline is not None else {}
+
+    results = {}
+    regressions = []
+    for name in names:
+        seconds = measure(BENCHMARKS[name](args.scale), args.repeat)
+        results[name] = seconds
+        line = '%-55s %10.3f ms' % (name, seconds * 1000)
+        if name in previous:
+            change = seconds / previous[name] - 1
+            line += '  %+7.1f%%' % (change * 100)
+            if change > args.threshold:
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line, flush=True)
+
+    if args.save:
+        if baseline is not None:
+            results = dict(baseline['results'], **results)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'processor': platform.processor(),
+                'scale': args.scale,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+        print('saved baseline to %s' % args.baseline)
+    if regressions:
+        print('%d regressions beyond %g%%: %s' % (len(regressions), args.threshold * 100, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
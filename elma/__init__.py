@@ -1,13 +1,26 @@
-import elma.error
-import elma.lgr
+import importlib
+
 import elma.models
-import elma.render
 
-from .error import *
-from .lgr import *
 from .models import *
-from .render import *
+
+# Modules that depend on Pillow are imported on first use of one of their
+# names, so that importing elma for parsing does not import Pillow.
+_lazy_modules = {
+    'elma.error': ["check_LGR_error"],
+    'elma.lgr': ["LGR_Image", "LGR", "unpack_LGR", "pack_LGR"],
+    'elma.render': ["LevelRenderer"],
+}
+_lazy_names = {name: module for module, names in _lazy_modules.items() for name in names}
 
 __all__ = (
-    elma.error.__all__ + elma.lgr.__all__ + elma.models.__all__ + elma.render.__all__
+    _lazy_modules['elma.error'] + _lazy_modules['elma.lgr'] + elma.models.__all__ + _lazy_modules['elma.render']
 )
+
+
+def __getattr__(name):
+    if name in _lazy_names:
+        return getattr(importlib.import_module(_lazy_names[name]), name)
+    if 'elma.' + name in _lazy_modules:
+        return importlib.import_module('elma.' + name)
+    raise AttributeError(f"module 'elma' has no attribute '{name}'")
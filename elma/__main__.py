@@ -0,0 +1,5 @@
+import sys
+
+from elma.cli import main
+
+sys.exit(main())
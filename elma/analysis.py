@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from math import hypot
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+import elma.models
+from elma.columns import EventColumns, FrameColumns, FRAMES_PER_SECOND
+from elma.constants import EVENT_GROUND_TOUCH
+from elma.constants import EVENT_LEFT_VOLT
+from elma.constants import EVENT_RIGHT_VOLT
+from elma.constants import EVENT_TIME_UNIT
+from elma.constants import EVENT_TURN
+
+__all__ = ["ReplayStats", "column_stats", "replay_stats", "batch_replay_stats"]
+
+#: Gaps between ground touches shorter than this many seconds are not airtime
+DEFAULT_MIN_AIRTIME = 0.5
+
+ReplayStats = namedtuple('ReplayStats', [
+    'level_id', 'time', 'is_finished', 'frames', 'top_speed', 'distance', 'gas_time', 'turns',
+    'left_volts', 'right_volts', 'airtime', 'longest_airtime'])
+ReplayStats.__doc__ = """
+Kinematics statistics of a single replay.
+
+Attributes:
+    level_id (int): The level_id of the replay.
+    time (float): The time of the replay in seconds.
+    is_finished (boolean): Whether or not the replay is (probably) finished.
+    frames (int): The number of frames.
+    top_speed (float): The highest speed between two frames in level units
+        per second.
+    distance (float): The distance travelled by the kuski in level units.
+    gas_time (float): The time spent gasing in seconds.
+    turns (int): The number of turns.
+    left_volts (int): The number of left volts.
+    right_volts (int): The number of right volts.
+    airtime (float): The total time between ground touches that are at least
+        min_airtime seconds apart.
+    longest_airtime (float): The longest time between two ground touches.
+"""
+
+
+def column_stats(frames: FrameColumns,
+                 events: EventColumns,
+                 min_airtime: float = DEFAULT_MIN_AIRTIME) -> dict:
+    """
+    Computes the kinematics statistics of a replay from its frame and event
+    columns.
+
+    Returns:
+        dictionary with the top_speed, distance, gas_time, turns, left_volts,
+        right_volts, airtime and longest_airtime of ReplayStats
+    """
+    xs = frames.x
+    ys = frames.y
+    steps = list(map(hypot,
+                     [b - a for a, b in zip(xs, xs[1:])],
+                     [b - a for a, b in zip(ys, ys[1:])]))
+    types = events.type.tolist()
+    ground_times = [t * EVENT_TIME_UNIT for t, kind in zip(events.time, types) if kind == EVENT_GROUND_TOUCH]
+    gaps = [b - a for a, b in zip(ground_times, ground_times[1:])]
+    return {
+        'top_speed': max(steps, default=0.0) * FRAMES_PER_SECOND,
+        'distance': sum(steps),
+        'gas_time': sum(state & 0b1 for state in frames.gas_and_turn_state) / FRAMES_PER_SECOND,
+        'turns': types.count(EVENT_TURN),
+        'left_volts': types.count(EVENT_LEFT_VOLT),
+        'right_volts': types.count(EVENT_RIGHT_VOLT),
+        'airtime': sum(gap for gap in gaps if gap >= min_airtime),
+        'longest_airtime': max(gaps, default=0.0),
+    }
+
+
+def replay_stats(replay: Union[elma.models.Replay, str, Path],
+                 min_airtime: float = DEFAULT_MIN_AIRTIME) -> ReplayStats:
+    """
+    Computes the kinematics statistics of a replay.
+
+    Args:
+        replay: Replay object or path to a replay file
+        min_airtime: shortest time between two ground touches in seconds
+            that counts as airtime
+
+    Returns:
+        ReplayStats of the replay
+    """
+    if not isinstance(replay, elma.models.Replay):
+        replay = elma.models.Replay.load(replay)
+    stats = column_stats(replay.frame_columns(), replay.event_columns(), min_airtime)
+    return ReplayStats(level_id=replay.level_id,
+                       time=replay.time,
+                       is_finished=replay.is_finished,
+                       frames=len(replay.frames),
+                       **stats)
+
+
+def batch_replay_stats(replays: Iterable[Union[elma.models.Replay, str, Path]],
+                       min_airtime: float = DEFAULT_MIN_AIRTIME,
+                       jobs: Optional[int] = None) -> List[ReplayStats]:
+    """
+    Computes the kinematics statistics of many replays, one row per replay in
+    the order of the input.
+
+    Args:
+        replays: Replay objects or paths to replay files
+        min_airtime: shortest time between two ground touches in seconds
+            that counts as airtime
+        jobs: number of worker processes to load and analyse the replays
+            with. Replays are processed serially if None or 1.
+
+    Returns:
+        list of ReplayStats
+    """
+    replays = list(replays)
+    if jobs is None or jobs <= 1:
+        return [replay_stats(replay, min_airtime) for replay in replays]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(replay_stats, replays, [min_airtime] * len(replays), chunksize=16))
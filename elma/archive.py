@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Callable, Deque, Iterator, Optional, Sequence, Tuple, TypeVar, Union
+
+import elma.models
+from elma.packing import unpack_level, unpack_replay
+
+__all__ = ["iter_members", "iter_levels", "iter_replays"]
+
+#: File name suffixes of levels and replays
+LEVEL_SUFFIXES = ('.lev',)
+REPLAY_SUFFIXES = ('.rec',)
+
+_Item = TypeVar('_Item')
+
+Archive = Union[str, Path, BinaryIO]
+
+
+def iter_members(archive: Archive, suffixes: Sequence[str]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yields the names and contents of the files in a zip or tar archive whose
+    names end with one of the suffixes, ignoring case, without extracting the
+    archive. Members are read one at a time, and tar archives, including
+    compressed ones, are read as a stream, so they need not be seekable.
+
+    Args:
+        archive: Path of the archive, or a readable binary file object.
+        suffixes: File name suffixes of the members to read.
+
+    Raises:
+        tarfile.ReadError: if the archive is neither a zip nor a tar archive.
+    """
+    suffixes = tuple(suffix.lower() for suffix in suffixes)
+    if isinstance(archive, (str, Path)):
+        is_zip = zipfile.is_zipfile(archive)
+    elif archive.seekable():
+        start = archive.tell()
+        is_zip = zipfile.is_zipfile(archive)
+        archive.seek(start)
+    else:
+        is_zip = False
+    if is_zip:
+        with zipfile.ZipFile(archive) as zf:
+            for info in zf.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(suffixes):
+                    yield info.filename, zf.read(info)
+        return
+    if isinstance(archive, (str, Path)):
+        tf = tarfile.open(archive, mode='r|*')
+    else:
+        tf = tarfile.open(fileobj=archive, mode='r|*')
+    with tf:
+        for member in tf:
+            if member.isfile() and member.name.lower().endswith(suffixes):
+                f = tf.extractfile(member)
+                assert f is not None
+                yield member.name, f.read()
+
+
+def _iter_unpacked(archive: Archive, suffixes: Sequence[str], unpack: Callable[[bytes], _Item],
+                   jobs: Optional[int]) -> Iterator[Tuple[str, _Item]]:
+    members = iter_members(archive, suffixes)
+    if jobs is None or jobs <= 1:
+        for name, data in members:
+            yield name, unpack(data)
+        return
+    # keep a few members per worker in flight, so memory use stays bounded
+    # and results are yielded in archive order
+    pending: Deque[Tuple[str, Future]] = deque()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for name, data in members:
+            pending.append((name, executor.submit(unpack, data)))
+            if len(pending) >= 4 * jobs:
+                name, future = pending.popleft()
+                yield name, future.result()
+        while pending:
+            name, future = pending.popleft()
+            yield name, future.result()
+
+
+def iter_levels(archive: Archive,
+                jobs: Optional[int] = None,
+                suffixes: Sequence[str] = LEVEL_SUFFIXES) -> Iterator[Tuple[str, elma.models.Level]]:
+    """
+    Yields the names and unpacked levels of the level files in a zip or tar
+    archive, in archive order, without extracting the archive.
+
+    Args:
+        archive: Path of the archive, or a readable binary file object.
+        jobs: Number of processes to unpack the levels in. Levels are
+            unpacked in the calling process if None or 1.
+        suffixes: File name suffixes of the levels.
+    """
+    return _iter_unpacked(archive, suffixes, unpack_level, jobs)
+
+
+def iter_replays(archive: Archive,
+                 jobs: Optional[int] = None,
+                 suffixes: Sequence[str] = REPLAY_SUFFIXES) -> Iterator[Tuple[str, elma.models.Replay]]:
+    """
+    Yields the names and unpacked replays of the replay files in a zip or tar
+    archive, in archive order, without extracting the archive.
+
+    Args:
+        archive: Path of the archive, or a readable binary file object.
+        jobs: Number of processes to unpack the replays in. Replays are
+            unpacked in the calling process if None or 1.
+        suffixes: File name suffixes of the replays.
+    """
+    return _iter_unpacked(archive, suffixes, unpack_replay, jobs)
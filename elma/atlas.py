@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import json
+import struct
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from PIL import Image
+
+from elma.lgr import LGR, LGR_Image
+from elma.utils import null_padded
+
+__all__ = ["AtlasSprite", "Atlas", "build_atlas"]
+
+#: Rectangle of a single LGR_Image inside an atlas page
+AtlasSprite = namedtuple('AtlasSprite', ['page', 'x', 'y', 'width', 'height'])
+
+ATLAS_MANIFEST_VERSION = 1
+ATLAS_DEFAULT_SIZE = 2048
+ATLAS_DEFAULT_PADDING = 1
+ATLAS_MEMORY_CACHE_SIZE = 8
+
+_memory_cache: OrderedDict = OrderedDict()
+
+
+class Atlas(object):
+    """
+    Texture atlas of all images of an LGR.
+
+    Attributes:
+        pages (list): A list of RGBA images the sprites are packed into.
+        sprites (dict): A dictionary of AtlasSprites keyed by image name.
+        lgr_hash (string): The content hash of the LGR the atlas was built
+            from.
+    """
+    def __init__(self,
+                 pages: List[Image],
+                 sprites: Dict[str, AtlasSprite],
+                 lgr_hash: str = '') -> None:
+        self.pages = pages
+        self.sprites = sprites
+        self.lgr_hash = lgr_hash
+
+    def __repr__(self) -> str:
+        return 'Atlas(pages: %s, sprites: %s, lgr_hash: %s)' % (
+            [page.size for page in self.pages], len(self.sprites), self.lgr_hash)
+
+    def sprite_image(self, name: str) -> Image:
+        """
+        Returns the image of a single sprite cropped from its page.
+        """
+        sprite = self.sprites[name]
+        return self.pages[sprite.page].crop(
+            (sprite.x, sprite.y, sprite.x + sprite.width, sprite.y + sprite.height))
+
+    def manifest(self) -> dict:
+        """
+        Returns the manifest of the atlas as a JSON serializable dictionary.
+        Sprites are stored as [page, x, y, width, height].
+        """
+        return {
+            'version': ATLAS_MANIFEST_VERSION,
+            'lgr_hash': self.lgr_hash,
+            'pages': [list(page.size) for page in self.pages],
+            'sprites': {name: list(sprite) for name, sprite in self.sprites.items()},
+        }
+
+    def manifest_json(self) -> str:
+        """
+        Returns the manifest of the atlas as compact JSON.
+        """
+        return json.dumps(self.manifest(), separators=(',', ':'))
+
+    def manifest_binary(self) -> bytes:
+        """
+        Returns the manifest of the atlas in a compact binary format: the
+        number of pages and sprites, the width and height of each page, and
+        for each sprite its name null-padded to 8 bytes followed by page, x, y,
+        width and height. All integers are unsigned 16-bit little endian.
+        """
+        return b''.join([
+            struct.pack('<HH', len(self.pages), len(self.sprites)),
+            b''.join([struct.pack('<HH', *page.size) for page in self.pages]),
+            b''.join([null_padded(name, 8) + struct.pack('<HHHHH', *sprite)
+                      for name, sprite in self.sprites.items()]),
+        ])
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """
+        Save the atlas pages as page<n>.png files and the manifest as
+        manifest.json into a directory, creating it if necessary.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for i, page in enumerate(self.pages):
+            page.save(directory / ('page%d.png' % i))
+        (directory / 'manifest.json').write_text(self.manifest_json())
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> Atlas:
+        """
+        Load an atlas saved with Atlas.save().
+
+        Raises:
+            FileNotFoundError: if the directory does not contain an atlas
+        """
+        directory = Path(directory)
+        manifest = json.loads((directory / 'manifest.json').read_text())
+        pages = []
+        for i in range(len(manifest['pages'])):
+            with Image.open(directory / ('page%d.png' % i)) as page:
+                pages.append(page.convert('RGBA'))
+        sprites = {name: AtlasSprite(*sprite) for name, sprite in manifest['sprites'].items()}
+        return cls(pages, sprites, manifest['lgr_hash'])
+
+
+def _pack_shelves(sizes: List[Tuple[int, int]],
+                  max_size: int,
+                  padding: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int, int]]]:
+    """
+    Shelf first-fit decreasing height bin packing.
+
+    Returns the (width, height) of each page and the (page, x, y) position of
+    each size. Sizes larger than max_size get a page of their own.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    positions: List[Tuple[int, int, int]] = [(0, 0, 0)] * len(sizes)
+    pages: List[Tuple[int, int]] = []
+    # open shelves as [page, y, height, next free x]
+    shelves: List[List[int]] = []
+    for i in order:
+        width, height = sizes[i][0] + padding, sizes[i][1] + padding
+        if width > max_size or height > max_size:
+            pages.append((width, height))
+            positions[i] = (len(pages) - 1, 0, 0)
+            continue
+        for shelf in shelves:
+            if height <= shelf[2] and shelf[3] + width <= max_size:
+                break
+        else:
+            # open a new shelf below the last shelf of the last page, or on a new page
+            last = shelves[-1] if shelves else None
+            if last is not None and last[1] + last[2] + height <= max_size:
+                shelf = [last[0], last[1] + last[2], height, 0]
+            else:
+                pages.append((0, 0))
+                shelf = [len(pages) - 1, 0, height, 0]
+            shelves.append(shelf)
+        page, y, _, x = shelf
+        positions[i] = (page, x, y)
+        pages[page] = (max(pages[page][0], x + width), max(pages[page][1], y + height))
+        shelf[3] += width
+    return pages, positions
+
+
+def build_atlas(lgr: LGR,
+                max_size: int = ATLAS_DEFAULT_SIZE,
+                padding: int = ATLAS_DEFAULT_PADDING,
+                cache_dir: Optional[Union[str, Path]] = None) -> Atlas:
+    """
+    Pack all images of an LGR into one or more texture atlas pages.
+
+    Transparency is applied with LGR_Image.to_rgba(). Atlases are cached in
+    memory and, if cache_dir is given, on disk, keyed by LGR.content_hash().
+
+    Args:
+        lgr: LGR to build the atlas of
+        max_size: maximum width and height of an atlas page in pixels
+        padding: space between sprites in pixels
+        cache_dir: optional directory to store and look up atlases in
+
+    Returns:
+        Atlas of the LGR
+    """
+    lgr_hash = lgr.content_hash()
+    key = '%s-%d-%d' % (lgr_hash, max_size, padding)
+    if key in _memory_cache:
+        _memory_cache.move_to_end(key)
+        return _memory_cache[key]
+    if cache_dir is not None and (Path(cache_dir) / key / 'manifest.json').exists():
+        atlas = Atlas.load(Path(cache_dir) / key)
+    else:
+        atlas = _build_atlas(lgr.images, max_size, padding, lgr_hash)
+        if cache_dir is not None:
+            atlas.save(Path(cache_dir) / key)
+    _memory_cache[key] = atlas
+    if len(_memory_cache) > ATLAS_MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+    return atlas
+
+
+def _build_atlas(images: List[LGR_Image], max_size: int, padding: int, lgr_hash: str) -> Atlas:
+    """
+    Build an atlas of the given images without caching.
+    """
+    page_sizes, positions = _pack_shelves([image.img.size for image in images], max_size, padding)
+    pages = [Image.new('RGBA', size, (0, 0, 0, 0)) for size in page_sizes]
+    sprites = {}
+    for image, (page, x, y) in zip(images, positions):
+        pages[page].paste(image.to_rgba(), (x, y))
+        sprites[image.name] = AtlasSprite(page, x, y, image.img.width, image.img.height)
+    return Atlas(pages, sprites, lgr_hash)
@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple, TypeVar, Union
+
+import elma.models
+from elma.packing import unpack_level, unpack_replay
+from elma.shared import to_buffer, from_buffer
+from elma.utils import read_file
+
+__all__ = ["CacheStats", "DiskCache", "ObjectCache", "estimate_size"]
+
+#: Default size limit of a DiskCache in bytes
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+#: Default memory budget of an ObjectCache in bytes
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# approximate memory used per item of unpacked levels and replays, measured
+# with tracemalloc on CPython
+_BASE_SIZE = 1000
+_POLYGON_SIZE = 200
+_POINT_SIZE = 150
+_OBJ_SIZE = 300
+_PICTURE_SIZE = 500
+_FRAME_SIZE = 800
+_EVENT_SIZE = 250
+
+_SUFFIX = '.elmc'
+
+_Item = TypeVar('_Item')
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'entries', 'size'])
+CacheStats.__doc__ = """
+Statistics of a DiskCache or ObjectCache.
+
+Attributes:
+    hits (int): Number of loads served from the cache.
+    misses (int): Number of loads that had to load the file.
+    evictions (int): Number of entries removed to stay within the size limit.
+    entries (int): Number of entries in the cache.
+    size (int): Total size of the entries in bytes, estimated for an
+        ObjectCache.
+"""
+
+
+def _write_entry(path: Path, item: Union[elma.models.Level, elma.models.Replay]) -> None:
+    """
+    Writes an entry next to its destination and then renames it, so readers
+    never see a partially written entry.
+    """
+    tmp = path.with_name('%s.%s.tmp' % (path.name, os.getpid()))
+    tmp.write_bytes(to_buffer(item))
+    os.replace(tmp, path)
+
+
+def _read_entry(path: Path) -> Union[elma.models.Level, elma.models.Replay]:
+    """
+    Memory maps an entry. The mapping stays open as long as any of the views
+    of the entry is referenced.
+    """
+    with open(path, 'rb') as f:
+        return from_buffer(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class DiskCache(object):
+    """
+    Persistent cache of unpacked levels and replays, keyed by a SHA-256 hash
+    of the file contents, so changed files are never served stale.
+
+    Entries store the columns of a level or replay as raw arrays in the
+    machine's native byte order, which are memory mapped when loaded. Replay
+    frames are not decoded until they are used. When the entries grow larger
+    than max_size, the least recently used are removed.
+
+    Replay files are stored column-wise themselves and already unpack without
+    decoding their frames, so the cache mostly pays off for levels.
+
+    Usage::
+
+        cache = DiskCache('~/.cache/elma')
+        level = Level.load('mylevel.lev', cache=cache)
+
+    Attributes:
+        directory (Path): Directory of the cache entries.
+        max_size (int): Size limit of the entries in bytes.
+        hits (int): Number of loads served from the cache.
+        misses (int): Number of loads that had to unpack the file.
+        evictions (int): Number of entries removed to stay within max_size.
+    """
+    def __init__(self, directory: Union[str, Path], max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.directory = Path(directory).expanduser()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # entry file names and sizes, least recently used first
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        stats = [(path.stat(), path.name) for path in self.directory.glob('*' + _SUFFIX)]
+        for stat, name in sorted(stats, key=lambda item: item[0].st_mtime):
+            self._entries[name] = stat.st_size
+            self._size += stat.st_size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return 'DiskCache(directory: %s, entries: %s, size: %s)' % (self.directory, len(self), self._size)
+
+    def stats(self) -> CacheStats:
+        """
+        Returns the hit, miss and eviction counts and the current size.
+        """
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self._entries), self._size)
+
+    def clear(self) -> None:
+        """
+        Removes all entries from the cache.
+        """
+        with self._lock:
+            for name in self._entries:
+                self._unlink(name)
+            self._entries.clear()
+            self._size = 0
+
+    def load_level(self, file: Union[str, Path, BinaryIO]) -> elma.models.Level:
+        """
+        Loads a level from a file or a readable binary file object through the
+        cache.
+        """
+        return self._load(read_file(file), 'level', unpack_level)
+
+    def load_replay(self, file: Union[str, Path, BinaryIO]) -> elma.models.Replay:
+        """
+        Loads a replay from a file or a readable binary file object through
+        the cache.
+        """
+        return self._load(read_file(file), 'replay', unpack_replay)
+
+    def _load(self, data: bytes, kind: str, unpack: Callable[[bytes], _Item]) -> _Item:
+        name = '%s.%s%s' % (hashlib.sha256(data).hexdigest(), kind, _SUFFIX)
+        path = self.directory / name
+        if name in self._entries or path.exists():
+            try:
+                cached = _read_entry(path)
+            except (OSError, ValueError, KeyError, TypeError, struct.error):
+                with self._lock:
+                    self._remove(name)
+            else:
+                with self._lock:
+                    self.hits += 1
+                    self._touch(name, path)
+                return cached  # type: ignore[return-value]
+        item = unpack(data)
+        _write_entry(path, item)  # type: ignore[arg-type]
+        with self._lock:
+            self.misses += 1
+            self._touch(name, path)
+            self._evict()
+        return item
+
+    def _touch(self, name: str, path: Path) -> None:
+        """
+        Marks an entry as most recently used.
+        """
+        try:
+            os.utime(path)
+            size = path.stat().st_size
+        except OSError:
+            self._remove(name)
+            return
+        self._size += size - self._entries.pop(name, 0)
+        self._entries[name] = size
+
+    def _evict(self) -> None:
+        """
+        Removes the least recently used entries until the cache fits within
+        max_size. A new entry is only removed if it alone is too large.
+        """
+        while self._size > self.max_size and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, name: str) -> None:
+        self._size -= self._entries.pop(name, 0)
+        self._unlink(name)
+
+    def _unlink(self, name: str) -> None:
+        try:
+            (self.directory / name).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def estimate_size(item: Union[elma.models.Level, elma.models.Replay]) -> int:
+    """
+    Returns an estimate of the memory used by a level or replay in bytes, from
+    its vertex, object, picture, frame and event counts. Replay frames that
+    have not been decoded yet count as their column buffers.
+    """
+    if isinstance(item, elma.models.Level):
+        return (_BASE_SIZE +
+                _POLYGON_SIZE * len(item.polygons) +
+                _POINT_SIZE * sum(len(polygon.points) for polygon in item.polygons) +
+                _OBJ_SIZE * len(item.objects) +
+                _PICTURE_SIZE * len(item.pictures))
+    if isinstance(item, elma.models.Replay):
+        if item._frame_view is not None:
+            frames = sum(column.nbytes for column in item._frame_view)
+        else:
+            frames = _FRAME_SIZE * len(item.frames)
+        if item._second_rider is not None:
+            second_rider = estimate_size(item._second_rider)
+        elif item._second_rider_view is not None:
+            second_rider = item._second_rider_view.nbytes
+        else:
+            second_rider = 0
+        return _BASE_SIZE + frames + _EVENT_SIZE * len(item.events) + second_rider
+    raise TypeError(f"Cannot estimate the size of {type(item)}")
+
+
+class ObjectCache(object):
+    """
+    Thread-safe in-memory cache of loaded levels and replays by path, within a
+    memory budget. Sizes are estimated with estimate_size, and the least
+    recently used entries are removed to stay within max_bytes.
+
+    An entry is loaded again when the modification time or size of its file
+    has changed. Threads that request a path that is being loaded wait for
+    that load instead of loading the file again. Cached objects are shared,
+    so they should not be changed by the caller.
+
+    Usage::
+
+        cache = ObjectCache(max_bytes=256 * 1024 * 1024)
+        level = cache.get_level('mylevel.lev')
+
+    Attributes:
+        max_bytes (int): Memory budget of the entries in bytes.
+        disk_cache (DiskCache): Optional DiskCache to load files through.
+        hits (int): Number of loads served from the cache.
+        misses (int): Number of loads that had to load the file.
+        evictions (int): Number of entries removed to stay within max_bytes.
+    """
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, disk_cache: Optional[DiskCache] = None) -> None:
+        self.max_bytes = max_bytes
+        self.disk_cache = disk_cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # (kind, path) -> ((mtime_ns, size), item, estimated size), least
+        # recently used first
+        self._entries: OrderedDict[Tuple[str, str], Tuple[Tuple[int, int], Any, int]] = OrderedDict()
+        self._loading: Dict[Tuple[str, str], Future] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return 'ObjectCache(entries: %s, size: %s, max_bytes: %s)' % (len(self), self._size, self.max_bytes)
+
+    def stats(self) -> CacheStats:
+        """
+        Returns the hit, miss and eviction counts and the estimated size.
+        """
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, len(self._entries), self._size)
+
+    def clear(self) -> None:
+        """
+        Removes all entries from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def invalidate(self, file: Union[str, Path]) -> None:
+        """
+        Removes the level and replay of a file from the cache.
+        """
+        path = str(Path(file).resolve())
+        with self._lock:
+            for kind in ('level', 'replay'):
+                self._remove((kind, path))
+
+    def get_level(self, file: Union[str, Path]) -> elma.models.Level:
+        """
+        Returns the level of a file, loading it if it is not cached.
+        """
+        return self._get('level', file, lambda path: elma.models.Level.load(path, cache=self.disk_cache))
+
+    def get_replay(self, file: Union[str, Path]) -> elma.models.Replay:
+        """
+        Returns the replay of a file, loading it if it is not cached.
+        """
+        return self._get('replay', file, lambda path: elma.models.Replay.load(path, cache=self.disk_cache))
+
+    def _get(self, kind: str, file: Union[str, Path], load: Callable[[Path], _Item]) -> _Item:
+        path = Path(file).resolve()
+        key = (kind, str(path))
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                self._account(key, version, entry[1])
+                self._evict()
+                return entry[1]
+            future = self._loading.get(key)
+            if future is not None:
+                # another thread is loading the file
+                self.hits += 1
+                waiting = True
+            else:
+                future = self._loading[key] = Future()
+                self.misses += 1
+                waiting = False
+        if waiting:
+            return future.result()
+
+        try:
+            item = load(path)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[key]
+            self._account(key, version, item)
+            self._evict()
+        future.set_result(item)
+        return item
+
+    def _account(self, key: Tuple[str, str], version: Tuple[int, int], item: Any) -> None:
+        """
+        Stores or refreshes an entry as the most recently used, estimating its
+        size again since e.g. replay frames may have been decoded since.
+        """
+        size = estimate_size(item)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= previous[2]
+        self._entries[key] = (version, item, size)
+        self._size += size
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
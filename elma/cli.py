@@ -0,0 +1,307 @@
+"""
+Command line interface for batch processing of levels, replays and LGRs.
+
+Usage:
+    python -m elma info PATH... [--jobs N]
+    python -m elma render PATH... --output DIR [--width W] [--height H] [--scale S] [--lgr FILE] [--no-objects]
+                                    [--simplify]
+    python -m elma validate PATH... [--jobs N]
+    python -m elma convert PATH... --output DIR [--jobs N]
+
+PATH can be a file, a directory (searched recursively) or a glob pattern.
+Each file gives one line of JSON on stdout. A throughput summary is written
+to stderr at the end.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import elma.models
+from elma.constants import RENDER_HEIGHT, RENDER_WIDTH
+
+__all__ = ["main"]
+
+LEVEL_SUFFIX = '.lev'
+REPLAY_SUFFIX = '.rec'
+LGR_SUFFIX = '.lgr'
+
+# LGRs used for rendering, loaded once per worker process
+_lgrs: Dict[str, Any] = {}
+
+
+def find_files(paths: Iterable[str], suffixes: Sequence[str]) -> Iterator[Path]:
+    """
+    Yields the files of the given paths, which can be files, directories
+    searched recursively for files with one of the suffixes, or glob
+    patterns.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(tuple(suffixes)):
+                        yield Path(root) / name
+        elif os.path.exists(path):
+            yield Path(path)
+        else:
+            matches = sorted(glob.glob(path, recursive=True))
+            if not matches:
+                raise FileNotFoundError(f"No files match {path}")
+            for match in matches:
+                if os.path.isdir(match):
+                    yield from find_files([match], suffixes)
+                elif match.lower().endswith(tuple(suffixes)):
+                    yield Path(match)
+
+
+def _kind(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix == LEVEL_SUFFIX:
+        return 'level'
+    if suffix == REPLAY_SUFFIX:
+        return 'replay'
+    if suffix == LGR_SUFFIX:
+        return 'lgr'
+    raise ValueError(f"Unknown file type {path.suffix}")
+
+
+def _info(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    kind = _kind(path)
+    if kind == 'level':
+        level = elma.models.Level.load(path)
+        types = [obj.type for obj in level.objects]
+        return {
+            'version': level.version,
+            'level_id': level.level_id,
+            'name': level.name,
+            'lgr': level.lgr,
+            'ground_texture': level.ground_texture,
+            'sky_texture': level.sky_texture,
+            'polygons': len(level.polygons),
+            'vertices': sum(len(polygon.points) for polygon in level.polygons),
+            'flowers': types.count(elma.models.Obj.FLOWER),
+            'apples': types.count(elma.models.Obj.FOOD),
+            'killers': types.count(elma.models.Obj.KILLER),
+            'pictures': len(level.pictures),
+            'single_times': len(level.top10.single),
+            'multi_times': len(level.top10.multi),
+        }
+    if kind == 'replay':
+        from elma.analysis import replay_stats
+        replay = elma.models.Replay.load(path)
+        info = {
+            'level_name': replay.level_name,
+            'is_multi': replay.is_multi,
+            'is_flagtag': replay.is_flagtag,
+        }
+        info.update(replay_stats(replay)._asdict())
+        return info
+    from elma.lgr import unpack_LGR
+    lgr = unpack_LGR(path)
+    return {
+        'images': len(lgr.images),
+        'content_hash': lgr.content_hash(),
+    }
+
+
+def _render(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    lgr = None
+    if options['lgr'] is not None:
+        if options['lgr'] not in _lgrs:
+            from elma.lgr import unpack_LGR
+            _lgrs[options['lgr']] = unpack_LGR(options['lgr'])
+        lgr = _lgrs[options['lgr']]
+    level = elma.models.Level.load(path)
+    image = level.as_image(max_width=options['width'], max_height=options['height'], scale=options['scale'],
+                           render_objects=options['objects'], lgr=lgr, simplify=options['simplify'])
+    output = Path(options['output']) / _output_name('render', path)
+    image.save(output)
+    return {'output': str(output), 'width': image.width, 'height': image.height}
+
+
+def _level_problems(level: elma.models.Level) -> List[str]:
+    problems = []
+    types = [obj.type for obj in level.objects]
+    if types.count(elma.models.Obj.START) != 1:
+        problems.append("Level has %d start objects instead of 1" % types.count(elma.models.Obj.START))
+    if elma.models.Obj.FLOWER not in types:
+        problems.append("Level has no flower")
+    for i, polygon in enumerate(level.polygons):
+        if len(polygon.points) < 3:
+            problems.append("Polygon %d has only %d vertices" % (i, len(polygon.points)))
+    if len(level.name) > 50:
+        problems.append("Level name is longer than 50 characters")
+    return problems
+
+
+def _validate(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    kind = _kind(path)
+    errors: List[Any] = []
+    warnings: List[Any] = []
+    if kind == 'level':
+        errors = _level_problems(elma.models.Level.load(path))
+    elif kind == 'replay':
+        elma.models.Replay.load(path)
+    else:
+        from elma import error
+        from elma.lgr import unpack_LGR
+        warning_codes = {value for name, value in vars(error).items() if name.startswith('WARN_')}
+        for code, image, message in error.check_LGR_error(unpack_LGR(path)):
+            problem = {'code': code, 'image': None if image is None else image.name, 'message': message}
+            (warnings if code in warning_codes else errors).append(problem)
+    return {'ok': not errors, 'errors': errors, 'warnings': warnings}
+
+
+def _convert(path: Path, options: Dict[str, Any]) -> Dict[str, Any]:
+    kind = _kind(path)
+    output = Path(options['output']) / _output_name('convert', path)
+    if kind == 'level':
+        elma.models.Level.load(path).save(output, allow_overwrite=True)
+    elif kind == 'replay':
+        elma.models.Replay.load(path).save(output, allow_overwrite=True)
+    else:
+        from elma.lgr import pack_LGR, unpack_LGR
+        output.write_bytes(pack_LGR(unpack_LGR(path)))
+    return {'output': str(output)}
+
+
+_COMMANDS: Dict[str, Callable[[Path, Dict[str, Any]], Dict[str, Any]]] = {
+    'info': _info,
+    'render': _render,
+    'validate': _validate,
+    'convert': _convert,
+}
+
+
+def _output_name(command: str, path: Path) -> str:
+    """
+    Returns the name of the file a command writes for an input file.
+    """
+    return path.stem + '.png' if command == 'render' else path.name
+
+
+def _output_collisions(command: str, paths: List[Path]) -> Dict[Path, str]:
+    """
+    Returns an error for each input file whose output file name would also
+    be written for a different input file, e.g. files with the same name in
+    different directories. Names are compared ignoring case, as on the file
+    systems of Elasto Mania.
+    """
+    if command not in ('render', 'convert'):
+        return {}
+    by_name: Dict[str, List[Path]] = {}
+    for path in paths:
+        inputs = by_name.setdefault(_output_name(command, path).lower(), [])
+        if path.resolve() not in inputs:
+            inputs.append(path.resolve())
+    errors = {}
+    for path in paths:
+        name = _output_name(command, path)
+        others = [str(other) for other in by_name[name.lower()] if other != path.resolve()]
+        if others:
+            errors[path] = 'OutputCollision: %s would also be written for %s' % (name, ', '.join(others))
+    return errors
+
+
+def _run(task: tuple) -> Dict[str, Any]:
+    """
+    Runs a command on one file. Failures are reported in the result instead
+    of being raised, so one bad file does not stop the batch.
+    """
+    command, path, options = task
+    result: Dict[str, Any] = {'path': str(path), 'size': 0}
+    try:
+        result['size'] = path.stat().st_size
+        result.update(_COMMANDS[command](path, options))
+    except Exception as e:
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+    return result
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='elma', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_command(name: str, help: str) -> argparse.ArgumentParser:
+        subparser = subparsers.add_parser(name, help=help)
+        subparser.add_argument('paths', nargs='+', metavar='PATH', help="files, directories or glob patterns")
+        subparser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                               help="number of worker processes (default: number of CPUs)")
+        return subparser
+
+    add_command('info', "print information about levels, replays and LGRs")
+    render = add_command('render', "render levels to PNG images")
+    render.add_argument('-o', '--output', required=True, help="directory to write the images to")
+    render.add_argument('--width', type=int, default=RENDER_WIDTH, help="maximum image width")
+    render.add_argument('--height', type=int, default=RENDER_HEIGHT, help="maximum image height")
+    render.add_argument('--scale', type=float, help="pixels per level unit, overrides --width and --height")
+    render.add_argument('--lgr', help="LGR file to render textures, pictures and object sprites with")
+    render.add_argument('--no-objects', dest='objects', action='store_false', help="do not render objects")
+    render.add_argument('--simplify', action='store_true', help="draw polygons simplified to the pixel size")
+    add_command('validate', "check levels, replays and LGRs for errors")
+    convert = add_command('convert', "unpack and save levels, replays and LGRs again")
+    convert.add_argument('-o', '--output', required=True, help="directory to write the files to")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the command line interface.
+
+    Files of render and convert whose output files would have the same name
+    fail without being processed, and so do glob patterns that match no
+    files.
+
+    Returns:
+        exit status: 0 if all files were processed and valid, 1 if any failed
+    """
+    args = _parser().parse_args(argv)
+    options = {key: value for key, value in vars(args).items() if key not in ('command', 'paths', 'jobs')}
+    if 'output' in options:
+        os.makedirs(options['output'], exist_ok=True)
+    suffixes = [LEVEL_SUFFIX] if args.command == 'render' else [LEVEL_SUFFIX, REPLAY_SUFFIX, LGR_SUFFIX]
+    files: List[Path] = []
+    unmatched: Dict[str, str] = {}
+    for pattern in args.paths:
+        try:
+            files.extend(find_files([pattern], suffixes))
+        except FileNotFoundError as e:
+            unmatched[pattern] = '%s: %s' % (type(e).__name__, e)
+    collisions = _output_collisions(args.command, files)
+    tasks = [(args.command, path, options) for path in files if path not in collisions]
+
+    start = time.perf_counter()
+    failed = 0
+    size = 0
+    for pattern, error in unmatched.items():
+        failed += 1
+        print(json.dumps({'path': pattern, 'size': 0, 'error': error}), flush=True)
+    for path in files:
+        if path in collisions:
+            failed += 1
+            print(json.dumps({'path': str(path), 'size': 0, 'error': collisions[path]}), flush=True)
+    executor = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs and args.jobs > 1 and len(tasks) > 1 else None
+    try:
+        results = map(_run, tasks) if executor is None else executor.map(_run, tasks, chunksize=8)
+        for result in results:
+            failed += 'error' in result or result.get('ok') is False
+            size += result['size']
+            print(json.dumps(result), flush=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print('%s: %d files (%d failed), %.1f MB in %.2f s: %.1f files/s, %.1f MB/s' %
+          (args.command, len(files) + len(unmatched), failed, size / 1e6, elapsed, len(files) / elapsed,
+           size / 1e6 / elapsed),
+          file=sys.stderr)
+    return 1 if failed else 0
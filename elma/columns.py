@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+from array import array
+from collections import namedtuple
+from math import floor
+from typing import Iterable, List, Tuple, Union
+
+import elma.models
+from elma.constants import EVENT_APPLE_TOUCH
+from elma.constants import EVENT_GROUND_TOUCH
+from elma.constants import EVENT_LEFT_VOLT
+from elma.constants import EVENT_OBJECT_TOUCH
+from elma.constants import EVENT_RIGHT_VOLT
+from elma.constants import EVENT_TURN
+from elma.instrumentation import instrumented
+
+__all__ = ["FRAME_COLUMNS", "FrameColumns", "EventColumns", "KuskiState", "frame_columns", "frames_from_columns",
+           "event_type", "event_columns", "events_from_columns", "interpolate_frames"]
+
+#: Names and array typecodes of the frame columns, in the order they are
+#: stored in a replay file
+FRAME_COLUMNS = [
+    ('x', 'f'),
+    ('y', 'f'),
+    ('left_wheel_x', 'h'),
+    ('left_wheel_y', 'h'),
+    ('right_wheel_x', 'h'),
+    ('right_wheel_y', 'h'),
+    ('head_x', 'h'),
+    ('head_y', 'h'),
+    ('rotation', 'h'),
+    ('left_wheel_rotation', 'B'),
+    ('right_wheel_rotation', 'B'),
+    ('gas_and_turn_state', 'B'),
+    ('spring_sound_effect_volume', 'h'),
+]
+
+#: Number of replay frames per second
+FRAMES_PER_SECOND = 30.0
+
+#: A full kuski rotation in Frame.rotation units
+FULL_ROTATION = 10000
+
+FrameColumns = namedtuple('FrameColumns', [
+    'x', 'y', 'left_wheel_x', 'left_wheel_y', 'right_wheel_x', 'right_wheel_y', 'head_x', 'head_y', 'rotation',
+    'left_wheel_rotation', 'right_wheel_rotation', 'gas_and_turn_state', 'spring_sound_effect_volume'])
+FrameColumns.__doc__ = """
+Replay frames stored column-wise, one array per frame attribute. See
+FRAME_COLUMNS for the names and typecodes of the columns.
+"""
+
+EventColumns = namedtuple('EventColumns', ['time', 'type', 'info', 'volume'])
+EventColumns.__doc__ = """
+Replay events stored column-wise: time ('d'), event type code ('h', one of
+the EVENT_* constants in elma.constants), info ('h', the object number of
+object touch events) and sound volume ('f').
+"""
+
+KuskiState = namedtuple('KuskiState', [
+    'x', 'y', 'rotation', 'left_wheel_x', 'left_wheel_y', 'right_wheel_x', 'right_wheel_y', 'head_x', 'head_y'])
+KuskiState.__doc__ = """
+Interpolated state of the kuski. Fields are floats for a single time and
+arrays of doubles for a sequence of times. Units are the same as in Frame:
+wheel and head positions are relative to the kuski position and rotation is
+given in 10000ths of a full rotation within [0, 10000).
+"""
+
+
+def frame_columns(frames: List[elma.models.Frame]) -> FrameColumns:
+    """
+    Returns the frames as FrameColumns.
+    """
+    return FrameColumns(
+        array('f', [frame.position.x for frame in frames]),
+        array('f', [frame.position.y for frame in frames]),
+        array('h', [frame.left_wheel_position.x for frame in frames]),
+        array('h', [frame.left_wheel_position.y for frame in frames]),
+        array('h', [frame.right_wheel_position.x for frame in frames]),
+        array('h', [frame.right_wheel_position.y for frame in frames]),
+        array('h', [frame.head_position.x for frame in frames]),
+        array('h', [frame.head_position.y for frame in frames]),
+        array('h', [frame.rotation for frame in frames]),
+        array('B', [frame.left_wheel_rotation for frame in frames]),
+        array('B', [frame.right_wheel_rotation for frame in frames]),
+        array('B', [frame._gas_and_turn_state & 0b11111100 | (frame.is_turned_right << 1) | frame.is_gasing
+                    for frame in frames]),
+        array('h', [frame.spring_sound_effect_volume for frame in frames]),
+    )
+
+
+@instrumented('unpack_frames', size=lambda frames, columns: sum(memoryview(column).nbytes for column in columns))
+def frames_from_columns(columns: FrameColumns) -> List[elma.models.Frame]:
+    """
+    Returns a list of Frames built from FrameColumns.
+    """
+    # digests of replays with decoded frames are not cached, so positions need not
+    # track their changes
+    Point = elma.models._UntrackedPoint
+    frames = []
+    for (x, y, left_wheel_x, left_wheel_y, right_wheel_x, right_wheel_y, head_x, head_y, rotation,
+         left_wheel_rotation, right_wheel_rotation, gas_and_turn_state,
+         sound_effect_volume) in zip(*columns):
+        frame = elma.models.Frame()
+        frame.position = Point(x, y)
+        frame.left_wheel_position = Point(left_wheel_x, left_wheel_y)
+        frame.right_wheel_position = Point(right_wheel_x, right_wheel_y)
+        frame.head_position = Point(head_x, head_y)
+        frame.rotation = rotation
+        frame.left_wheel_rotation = left_wheel_rotation
+        frame.right_wheel_rotation = right_wheel_rotation
+        frame.is_gasing = bool(gas_and_turn_state & 0b1)
+        frame.is_turned_right = bool(gas_and_turn_state & 0b10)
+        # preserve remaining 6 bits of state
+        frame._gas_and_turn_state = gas_and_turn_state
+        frame.spring_sound_effect_volume = sound_effect_volume
+        frames.append(frame)
+    return frames
+
+
+def event_type(event: elma.models.Event) -> int:
+    """
+    Returns the type code of an event as stored in replay files.
+    """
+    if isinstance(event, elma.models.ObjectTouchEvent):
+        return EVENT_OBJECT_TOUCH
+    if isinstance(event, elma.models.GroundTouchEvent):
+        return EVENT_GROUND_TOUCH
+    if isinstance(event, elma.models.AppleTouchEvent):
+        return EVENT_APPLE_TOUCH
+    if isinstance(event, elma.models.TurnEvent):
+        return EVENT_TURN
+    if isinstance(event, elma.models.RightVoltEvent):
+        return EVENT_RIGHT_VOLT
+    if isinstance(event, elma.models.LeftVoltEvent):
+        return EVENT_LEFT_VOLT
+    raise NotImplementedError(f"Event type {type(event)} not implemented.")
+
+
+def event_columns(events: List[elma.models.Event]) -> EventColumns:
+    """
+    Returns the events as EventColumns.
+    """
+    return EventColumns(
+        array('d', [event.time for event in events]),
+        array('h', [event_type(event) for event in events]),
+        array('h', [getattr(event, 'object_number', -1) for event in events]),
+        array('f', [getattr(event, 'event_sound_volume', 0.0) for event in events]),
+    )
+
+
+def events_from_columns(columns: EventColumns) -> List[elma.models.Event]:
+    """
+    Returns a list of Events built from EventColumns.
+    """
+    classes = {
+        EVENT_OBJECT_TOUCH: elma.models.ObjectTouchEvent,
+        EVENT_GROUND_TOUCH: elma.models.GroundTouchEvent,
+        EVENT_APPLE_TOUCH: elma.models.AppleTouchEvent,
+        EVENT_TURN: elma.models.TurnEvent,
+        EVENT_RIGHT_VOLT: elma.models.RightVoltEvent,
+        EVENT_LEFT_VOLT: elma.models.LeftVoltEvent,
+    }
+    events = []
+    for time, kind, info, volume in zip(*columns):
+        if kind not in classes:
+            raise NotImplementedError(f"Event type {kind} not implemented.")
+        event = classes[kind]()
+        event.time = time
+        if isinstance(event, elma.models.ObjectTouchEvent):
+            event.object_number = info
+        elif isinstance(event, elma.models.GroundTouchEvent):
+            event.event_sound_volume = volume
+        events.append(event)
+    return events
+
+
+def _neighbours(position: float, last: int) -> Tuple[int, int, float]:
+    """
+    Returns the frames around a position in frames, clamped to the frames
+    0 to last, and the weight of the later frame.
+    """
+    i = floor(position)
+    if i < 0:
+        return 0, 0, 0.0
+    if i >= last:
+        return last, last, 0.0
+    return i, i + 1, position - i
+
+
+def _interpolate_pair(columns: FrameColumns, i: int, j: int, weight: float) -> KuskiState:
+    """
+    Interpolates the kuski state between two frames of the columns, indexing
+    them directly, which is faster than converting the columns for a single
+    time.
+    """
+    half = FULL_ROTATION / 2
+    x, y, left_wheel_x, left_wheel_y, right_wheel_x, right_wheel_y, head_x, head_y, rotation = columns[:9]
+    positional = [values[i] + (values[j] - values[i]) * weight
+                  for values in (x, y, left_wheel_x, left_wheel_y, right_wheel_x, right_wheel_y, head_x, head_y)]
+    a = rotation[i]
+    rotated = (a + ((rotation[j] - a + half) % FULL_ROTATION - half) * weight) % FULL_ROTATION
+    return KuskiState(positional[0], positional[1], rotated, *positional[2:])
+
+
+def interpolate_frames(columns: FrameColumns, times: Union[float, Iterable[float]]) -> KuskiState:
+    """
+    Linearly interpolate the kuski state between frames at the given times in
+    seconds. Frame i is at time i/30. Times outside the replay are clamped to
+    the first or last frame. Rotation is interpolated along the shorter arc.
+
+    Args:
+        columns: frames of the replay
+        times: a single time or a sequence of times in seconds
+
+    Returns:
+        KuskiState of floats for a single time, or of arrays for a sequence
+    """
+    n = len(columns.x)
+    if n == 0:
+        raise ValueError("Cannot interpolate a replay without frames")
+    if isinstance(times, (int, float)):
+        # frame times are i/30, so the frames around a time are found without
+        # searching
+        return _interpolate_pair(columns, *_neighbours(times * FRAMES_PER_SECOND, n - 1))
+
+    last = n - 1
+    fps = FRAMES_PER_SECOND
+    full = FULL_ROTATION
+    half = full / 2
+    # plain lists index faster than arrays in the loop below
+    positional = [columns.x.tolist(), columns.y.tolist(),
+                  columns.left_wheel_x.tolist(), columns.left_wheel_y.tolist(),
+                  columns.right_wheel_x.tolist(), columns.right_wheel_y.tolist(),
+                  columns.head_x.tolist(), columns.head_y.tolist()]
+    rotations = columns.rotation.tolist()
+    lower = []
+    upper = []
+    weights = []
+    for t in times:
+        f = t * fps
+        i = floor(f)
+        if i < 0:
+            lower.append(0)
+            upper.append(0)
+            weights.append(0.0)
+        elif i >= last:
+            lower.append(last)
+            upper.append(last)
+            weights.append(0.0)
+        else:
+            lower.append(i)
+            upper.append(i + 1)
+            weights.append(f - i)
+
+    result = []
+    for values in positional:
+        result.append(array('d', [values[i] + (values[j] - values[i]) * a
+                                  for i, j, a in zip(lower, upper, weights)]))
+    rotation = array('d', [(rotations[i] + ((rotations[j] - rotations[i] + half) % full - half) * a) % full
+                           for i, j, a in zip(lower, upper, weights)])
+    x, y, left_wheel_x, left_wheel_y, right_wheel_x, right_wheel_y, head_x, head_y = result
+    return KuskiState(x, y, rotation, left_wheel_x, left_wheel_y, right_wheel_x, right_wheel_y, head_x, head_y)
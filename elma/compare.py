@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+from array import array
+from collections import namedtuple
+from math import floor, hypot, inf
+from typing import Dict, List, Sequence, Tuple
+
+import elma.models
+from elma.columns import FRAMES_PER_SECOND
+from elma.constants import EVENT_OBJECT_TOUCH
+from elma.constants import EVENT_TIME_UNIT
+
+__all__ = ["PointGrid", "Split", "Comparison", "compare_replays", "compare_to_many"]
+
+#: Default edge length of the grid cells in level units
+DEFAULT_CELL_SIZE = 1.0
+
+Split = namedtuple('Split', ['object_number', 'time', 'reference_time', 'delta'])
+Split.__doc__ = """
+Time difference at a touched object.
+
+Attributes:
+    object_number (int): Index number of the touched object.
+    time (float): Time in seconds the object was touched in the replay.
+    reference_time (float): Time in seconds the object was touched in the
+        reference replay.
+    delta (float): time - reference_time. Positive values mean the replay is
+        behind the reference.
+"""
+
+Comparison = namedtuple('Comparison', ['times', 'reference_times', 'deltas', 'distances', 'splits'])
+Comparison.__doc__ = """
+Time-aligned comparison of a replay against a reference replay. The arrays
+have one value per frame of the replay.
+
+Attributes:
+    times (array): Time of each frame of the replay in seconds.
+    reference_times (array): Time in seconds at which the reference replay
+        passed closest to the position of each frame.
+    deltas (array): times - reference_times. Positive values mean the replay
+        is behind the reference.
+    distances (array): Distance from each frame to the reference path in level
+        units.
+    splits (list): Splits at the objects touched in both replays.
+"""
+
+
+class PointGrid(object):
+    """
+    Uniform grid index over a sequence of points for nearest point queries.
+
+    Attributes:
+        cell_size (float): Edge length of the grid cells in level units.
+    """
+    def __init__(self, xs: Sequence[float], ys: Sequence[float], cell_size: float = DEFAULT_CELL_SIZE) -> None:
+        if len(xs) == 0:
+            raise ValueError("Cannot index an empty sequence of points")
+        self.cell_size = cell_size
+        self._xs = list(xs)
+        self._ys = list(ys)
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, (x, y) in enumerate(zip(self._xs, self._ys)):
+            self._cells.setdefault((floor(x / cell_size), floor(y / cell_size)), []).append(i)
+        cell_xs = [cx for cx, _ in self._cells]
+        cell_ys = [cy for _, cy in self._cells]
+        # rings beyond this radius cannot contain any point
+        self._max_ring = max(max(cell_xs) - min(cell_xs), max(cell_ys) - min(cell_ys)) + 1
+        self._min_cell = (min(cell_xs), min(cell_ys))
+        self._max_cell = (max(cell_xs), max(cell_ys))
+
+    def __len__(self) -> int:
+        return len(self._xs)
+
+    def nearest(self, x: float, y: float) -> Tuple[int, float]:
+        """
+        Returns the index of the point nearest to (x, y) and its distance.
+        """
+        xs = self._xs
+        ys = self._ys
+        cells = self._cells
+        cell_size = self.cell_size
+        cx = floor(x / cell_size)
+        cy = floor(y / cell_size)
+        # start the search at the closest occupied part of the grid
+        start = max(self._min_cell[0] - cx, cx - self._max_cell[0],
+                    self._min_cell[1] - cy, cy - self._max_cell[1], 0)
+        best = -1
+        best_distance = inf
+        for ring in range(start, start + self._max_ring + 1):
+            # every point in this ring is at least (ring - 1) cells away
+            if best >= 0 and (ring - 1) * cell_size > best_distance:
+                break
+            for i in self._ring(cx, cy, ring, cells):
+                distance = hypot(xs[i] - x, ys[i] - y)
+                if distance < best_distance:
+                    best, best_distance = i, distance
+        return best, best_distance
+
+    @staticmethod
+    def _ring(cx: int, cy: int, ring: int, cells: Dict[Tuple[int, int], List[int]]) -> List[int]:
+        """
+        Returns the indices of the points in the cells at Chebyshev distance
+        `ring` from cell (cx, cy).
+        """
+        if ring == 0:
+            return cells.get((cx, cy), [])
+        found: List[int] = []
+        for dx in range(-ring, ring + 1):
+            found.extend(cells.get((cx + dx, cy - ring), ()))
+            found.extend(cells.get((cx + dx, cy + ring), ()))
+        for dy in range(-ring + 1, ring):
+            found.extend(cells.get((cx - ring, cy + dy), ()))
+            found.extend(cells.get((cx + ring, cy + dy), ()))
+        return found
+
+    def nearest_on_path(self, x: float, y: float) -> Tuple[float, float]:
+        """
+        Treats the points as a path and returns the fractional index of the
+        path position nearest to (x, y) and its distance. The nearest point is
+        refined by projecting (x, y) onto its adjacent path segments.
+        """
+        i, best_distance = self.nearest(x, y)
+        best = float(i)
+        xs = self._xs
+        ys = self._ys
+        for j in (i - 1, i):
+            if j < 0 or j + 1 >= len(xs):
+                continue
+            dx = xs[j + 1] - xs[j]
+            dy = ys[j + 1] - ys[j]
+            length2 = dx * dx + dy * dy
+            if length2 == 0:
+                continue
+            a = min(1.0, max(0.0, ((x - xs[j]) * dx + (y - ys[j]) * dy) / length2))
+            distance = hypot(xs[j] + a * dx - x, ys[j] + a * dy - y)
+            if distance < best_distance:
+                best, best_distance = j + a, distance
+        return best, best_distance
+
+
+def _object_touch_times(replay: elma.models.Replay) -> Dict[int, float]:
+    """
+    Returns the time in seconds of the first touch of each object number.
+    """
+    touches: Dict[int, float] = {}
+    events = replay.event_columns()
+    for time, kind, object_number in zip(events.time, events.type, events.info):
+        if kind == EVENT_OBJECT_TOUCH and object_number not in touches:
+            touches[object_number] = time * EVENT_TIME_UNIT
+    return touches
+
+
+def compare_replays(replay: elma.models.Replay,
+                    reference: elma.models.Replay,
+                    cell_size: float = DEFAULT_CELL_SIZE) -> Comparison:
+    """
+    Compares a replay against a reference replay of the same level. For each
+    frame of the replay, the nearest position on the path of the reference is
+    looked up, giving the time difference between the two replays at that
+    point.
+
+    Args:
+        replay: the replay to compare
+        reference: the replay to compare against, e.g. the record
+        cell_size: edge length of the grid cells of the reference path index
+
+    Returns:
+        Comparison of the two replays
+    """
+    frames = replay.frame_columns()
+    reference_frames = reference.frame_columns()
+    return _compare(frames.x, frames.y, _object_touch_times(replay),
+                    PointGrid(reference_frames.x, reference_frames.y, cell_size), _object_touch_times(reference))
+
+
+def compare_to_many(replay: elma.models.Replay,
+                    references: Sequence[elma.models.Replay],
+                    cell_size: float = DEFAULT_CELL_SIZE) -> List[Comparison]:
+    """
+    Compares a replay against several reference replays, e.g. the top
+    replays of a level. The replay's columns are only built once.
+
+    Returns:
+        list of Comparisons in the order of the references
+    """
+    frames = replay.frame_columns()
+    touches = _object_touch_times(replay)
+    comparisons = []
+    for reference in references:
+        reference_frames = reference.frame_columns()
+        comparisons.append(_compare(frames.x, frames.y, touches,
+                                    PointGrid(reference_frames.x, reference_frames.y, cell_size),
+                                    _object_touch_times(reference)))
+    return comparisons
+
+
+def _compare(xs: Sequence[float],
+             ys: Sequence[float],
+             touches: Dict[int, float],
+             reference_grid: PointGrid,
+             reference_touches: Dict[int, float]) -> Comparison:
+    """
+    Compares replay positions against an indexed reference path.
+    """
+    times = array('d', [i / FRAMES_PER_SECOND for i in range(len(xs))])
+    reference_times = array('d')
+    distances = array('d')
+    nearest_on_path = reference_grid.nearest_on_path
+    for x, y in zip(xs, ys):
+        index, distance = nearest_on_path(x, y)
+        reference_times.append(index / FRAMES_PER_SECOND)
+        distances.append(distance)
+    deltas = array('d', [t - r for t, r in zip(times, reference_times)])
+    splits = [Split(object_number, time, reference_touches[object_number], time - reference_touches[object_number])
+              for object_number, time in sorted(touches.items(), key=lambda item: item[1])
+              if object_number in reference_touches]
+    return Comparison(times, reference_times, deltas, distances, splits)
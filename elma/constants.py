@@ -3,6 +3,28 @@ VERSION_ACROSS = 'POT06'
 END_OF_DATA_MARKER = 0x0067103A
 END_OF_FILE_MARKER = 0x00845D52
 END_OF_REPLAY_FILE_MARKER = 0x00492F75
+
+#: Size in bytes of the encrypted top10 block of a level file
+TOP10_SIZE = 688
+
+#: Default maximum size and padding of rendered level images in pixels
+RENDER_WIDTH = 1920
+RENDER_HEIGHT = 1080
+RENDER_PADDING = 10
+
+#: Outline error in pixels allowed when rendering with simplified polygons
+RENDER_SIMPLIFY_TOLERANCE = 0.5
+
+#: Length of one replay event time unit in seconds
+EVENT_TIME_UNIT = 0.001/(0.182*0.0024)
+
+#: Replay event type codes as stored in replay files
+EVENT_OBJECT_TOUCH = 0
+EVENT_GROUND_TOUCH = 1
+EVENT_APPLE_TOUCH = 4
+EVENT_TURN = 5
+EVENT_RIGHT_VOLT = 6
+EVENT_LEFT_VOLT = 7
 TOP10_SINGLEPLAYER = [
     21, 5, 106, 183, 137, 237, 89, 196, 72, 255, 143, 115, 118, 188, 112, 192,
     223, 87, 180, 47, 13, 158, 7, 188, 99, 8, 111, 138, 9, 40, 173, 56, 224,
@@ -131,6 +153,9 @@ LGR_DEFAULT_PALETTE = [
     88, 80, 80, 72, 220, 40, 16, 80, 172, 228, 128, 96, 204, 64, 24, 252, 252,
     252]
 
+#: Approximate number of LGR image pixels per level unit in Elasto Mania
+LGR_PIXELS_PER_UNIT = 48
+
 OBJECT_RADIUS = 0.4
 WHEEL_RADIUS = 0.4
 HEAD_RADIUS = 0.238
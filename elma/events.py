@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from math import floor
+from typing import Dict, List, Optional, Tuple, Type, TYPE_CHECKING, Union
+
+import elma.models
+from elma.columns import FRAMES_PER_SECOND, event_type
+from elma.constants import EVENT_APPLE_TOUCH
+from elma.constants import EVENT_GROUND_TOUCH
+from elma.constants import EVENT_LEFT_VOLT
+from elma.constants import EVENT_OBJECT_TOUCH
+from elma.constants import EVENT_RIGHT_VOLT
+from elma.constants import EVENT_TIME_UNIT
+from elma.constants import EVENT_TURN
+
+__all__ = ["EventIndex"]
+
+if TYPE_CHECKING:
+    EventKind = Union[Type[elma.models.Event], Tuple[Type[elma.models.Event], ...], None]
+
+
+def _type_codes(kind: EventKind) -> Optional[List[int]]:
+    """
+    Returns the type codes of an Event subclass or a tuple of them, or None
+    for all events.
+    """
+    if kind is None or kind is elma.models.Event:
+        return None
+    codes = {
+        elma.models.ObjectTouchEvent: EVENT_OBJECT_TOUCH,
+        elma.models.GroundTouchEvent: EVENT_GROUND_TOUCH,
+        elma.models.AppleTouchEvent: EVENT_APPLE_TOUCH,
+        elma.models.TurnEvent: EVENT_TURN,
+        elma.models.RightVoltEvent: EVENT_RIGHT_VOLT,
+        elma.models.LeftVoltEvent: EVENT_LEFT_VOLT,
+    }
+    kinds = kind if isinstance(kind, tuple) else (kind,)
+    return [codes[k] for k in kinds]
+
+
+class EventIndex(object):
+    """
+    Time-sorted index of replay events for range queries by time and type.
+
+    All times are in seconds. The index is a snapshot: build a new one after
+    changing the events of the replay.
+
+    Attributes:
+        events (list): The events sorted by time. Events with the same time
+            keep their original order.
+        times (array): The time of each event in seconds.
+        types (array): The type code of each event (see the EVENT_* constants
+            in elma.constants).
+    """
+    def __init__(self, events: List[elma.models.Event]) -> None:
+        self.events = sorted(events, key=lambda event: event.time)
+        self.times = array('d', [event.time * EVENT_TIME_UNIT for event in self.events])
+        self.types = array('h', [event_type(event) for event in self.events])
+        self._times_by_type: Dict[int, array] = {}
+        self._positions_by_type: Dict[int, array] = {}
+        for position, (time, code) in enumerate(zip(self.times, self.types)):
+            if code not in self._times_by_type:
+                self._times_by_type[code] = array('d')
+                self._positions_by_type[code] = array('l')
+            self._times_by_type[code].append(time)
+            self._positions_by_type[code].append(position)
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def __repr__(self) -> str:
+        return 'EventIndex(len(events): %s)' % len(self.events)
+
+    def _ranges(self, t0: float, t1: float, kind: EventKind) -> List[Tuple[Optional[array], int, int]]:
+        """
+        Returns (positions, start, stop) of the events of the given kind
+        within [t0, t1]. positions is None for all events.
+        """
+        codes = _type_codes(kind)
+        if codes is None:
+            return [(None, bisect_left(self.times, t0), bisect_right(self.times, t1))]
+        ranges: List[Tuple[Optional[array], int, int]] = []
+        for code in codes:
+            times = self._times_by_type.get(code)
+            if times is not None:
+                ranges.append((self._positions_by_type[code], bisect_left(times, t0), bisect_right(times, t1)))
+        return ranges
+
+    def events_between(self, t0: float, t1: float, kind: EventKind = None) -> List[elma.models.Event]:
+        """
+        Returns the events within the time range [t0, t1] in seconds, sorted by
+        time.
+
+        Args:
+            t0: start of the time range in seconds
+            t1: end of the time range in seconds
+            kind: optional Event subclass or tuple of subclasses to return
+                only events of these types, e.g. AppleTouchEvent
+        """
+        ranges = self._ranges(t0, t1, kind)
+        if len(ranges) == 1 and ranges[0][0] is None:
+            _, start, stop = ranges[0]
+            return self.events[start:stop]
+        positions = sorted(position for positions, start, stop in ranges if positions is not None
+                           for position in positions[start:stop])
+        return [self.events[position] for position in positions]
+
+    def count(self, kind: EventKind = None, t0: float = float('-inf'), t1: float = float('inf')) -> int:
+        """
+        Returns the number of events of the given kind within the time range
+        [t0, t1] in seconds, without building a list of them.
+        """
+        return sum(stop - start for _, start, stop in self._ranges(t0, t1, kind))
+
+    def counts(self) -> Dict[Type[elma.models.Event], int]:
+        """
+        Returns the number of events of each Event subclass in the index.
+        """
+        counts: Dict[Type[elma.models.Event], int] = {}
+        for event in self.events:
+            counts[type(event)] = counts.get(type(event), 0) + 1
+        return counts
+
+    def rate(self, kind: EventKind, t0: float, t1: float) -> float:
+        """
+        Returns the number of events of the given kind per second within the
+        time range [t0, t1], e.g. volts per second.
+        """
+        if t1 <= t0:
+            raise ValueError("Empty time range [%s, %s]" % (t0, t1))
+        return self.count(kind, t0, t1) / (t1 - t0)
+
+    @staticmethod
+    def frame_index(time: float) -> int:
+        """
+        Returns the index of the replay frame at the given time in seconds.
+        """
+        return floor(time * FRAMES_PER_SECOND)
+
+    @staticmethod
+    def frame_time(frame_index: int) -> float:
+        """
+        Returns the time in seconds of the replay frame with the given index.
+        """
+        return frame_index / FRAMES_PER_SECOND
+
+    def events_in_frame(self, frame_index: int, kind: EventKind = None) -> List[elma.models.Event]:
+        """
+        Returns the events that occur between the given frame and the next.
+        """
+        start = frame_index / FRAMES_PER_SECOND
+        stop = (frame_index + 1) / FRAMES_PER_SECOND
+        return [event for event in self.events_between(start, stop, kind)
+                if self.frame_index(event.time * EVENT_TIME_UNIT) == frame_index]
@@ -0,0 +1,483 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+
+import elma.models
+from elma.constants import TOP10_SIZE
+from elma.packing import unpack_level_header, unpack_replay, unpack_top10
+
+__all__ = ["IndexedTime", "CatalogEntry", "UpdateStats", "Top10Index", "ReplayCatalog"]
+
+_Index = TypeVar('_Index', bound='_FileIndex')
+
+#: Number of files written to the database per transaction
+DEFAULT_BATCH_SIZE = 500
+
+# level header and top10 block (with its markers) sizes in bytes
+_HEADER_SIZE = 94
+_TAIL_SIZE = TOP10_SIZE + 8
+
+_TOP10_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    level_id INTEGER NOT NULL,
+    level_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS times (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    level_id INTEGER NOT NULL,
+    is_multi INTEGER NOT NULL,
+    time INTEGER NOT NULL,
+    kuski TEXT NOT NULL,
+    kuski2 TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS times_path ON times (path);
+CREATE INDEX IF NOT EXISTS times_level ON times (level_id, is_multi, time);
+CREATE INDEX IF NOT EXISTS times_kuski ON times (kuski, is_multi, level_id, time);
+CREATE INDEX IF NOT EXISTS times_kuski2 ON times (kuski2, is_multi, level_id, time);
+"""
+
+# files that could not be read, which are read again when they change
+_FAILURES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS failures (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    error TEXT NOT NULL
+);
+"""
+
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS replays (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    level_id INTEGER NOT NULL,
+    level_name TEXT NOT NULL,
+    is_multi INTEGER NOT NULL,
+    is_flagtag INTEGER NOT NULL,
+    time REAL NOT NULL,
+    is_finished INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    events INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS replays_level ON replays (level_id, is_finished, time);
+CREATE INDEX IF NOT EXISTS replays_level_name ON replays (level_name);
+CREATE INDEX IF NOT EXISTS replays_content_hash ON replays (content_hash);
+"""
+
+IndexedTime = namedtuple('IndexedTime', ['level_id', 'level_name', 'time', 'kuski', 'kuski2', 'is_multi', 'path'])
+IndexedTime.__doc__ = """
+A top10 time in the index.
+
+Attributes:
+    level_id (int): The level_id of the level.
+    level_name (string): The name of the level.
+    time (int): The finished time in hundredths.
+    kuski (string): The name of the first player.
+    kuski2 (string): The name of the second player.
+    is_multi (boolean): Whether or not the time is a multiplayer time.
+    path (string): Path of a level file the time was read from.
+"""
+
+CatalogEntry = namedtuple('CatalogEntry', [
+    'path', 'level_id', 'level_name', 'is_multi', 'is_flagtag', 'time', 'is_finished', 'frames', 'events',
+    'content_hash'])
+CatalogEntry.__doc__ = """
+A replay file in the catalog.
+
+Attributes:
+    path (string): Path of the replay file.
+    level_id (int): The unique identifier of the level of the replay.
+    level_name (string): The name of the level of the replay.
+    is_multi (boolean): Whether or not the replay is a multiplayer replay.
+    is_flagtag (boolean): Whether or not the replay is a flagtag replay.
+    time (float): The time of the replay in seconds.
+    is_finished (boolean): Whether or not the replay is (probably) finished.
+    frames (int): The number of frames of the (first) rider.
+    events (int): The number of events of the (first) rider.
+    content_hash (string): SHA-256 hex digest of the replay file.
+"""
+
+UpdateStats = namedtuple('UpdateStats', ['added', 'updated', 'unchanged', 'removed', 'failed'])
+UpdateStats.__doc__ = """
+Number of files added, updated, unchanged and removed by an update of an
+index, and number of files that could not be read, including files that
+failed before and have not changed since.
+"""
+
+
+def _read_level_file(path: str) -> tuple:
+    """
+    Reads the level_id, name and top10 of a level file without reading the
+    polygons, objects and pictures in between.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(_HEADER_SIZE)
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - _TAIL_SIZE, 0))
+        tail = f.read()
+    _, level_id, name = unpack_level_header(header)
+    return level_id, name, unpack_top10(tail)
+
+
+def _read_replay_file(path: str) -> tuple:
+    """
+    Reads the catalog columns of a replay file. Frames are not decoded.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    replay = unpack_replay(data)
+    return (replay.level_id, replay.level_name, replay.is_multi, replay.is_flagtag, replay.time,
+            replay.is_finished, len(replay.frame_columns().x), len(replay.events),
+            hashlib.sha256(data).hexdigest())
+
+
+def _try_read(read: Callable[[str], tuple], path: str) -> Tuple[Optional[tuple], str]:
+    """
+    Returns the values read from a file and an empty string, or None and the
+    error if the file could not be read.
+    """
+    try:
+        return read(path), ''
+    # a corrupt file can fail in many ways, and must not abort the update
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+
+def _files(paths: Iterable[Union[str, Path]], suffix: str) -> Iterator[str]:
+    """
+    Yields the files among paths and the files with the given suffix in the
+    directories among paths.
+    """
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(suffix):
+                        yield os.path.join(root, name)
+        else:
+            yield str(path)
+
+
+class _FileIndex(object):
+    """
+    Base class of SQLite indexes over files that are only read again when
+    their modification time or size has changed.
+    """
+    #: Table with a row per indexed file and path, mtime_ns and size columns
+    _table = 'files'
+    _schema = ''
+    _suffix = ''
+
+    def __init__(self, database: Union[str, Path] = ':memory:') -> None:
+        self.database = str(database)
+        self._connection = sqlite3.connect(self.database)
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        self._connection.executescript(self._schema)
+        self._connection.executescript(_FAILURES_SCHEMA)
+
+    def __enter__(self: _Index) -> _Index:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute(f'SELECT COUNT(*) FROM {self._table}').fetchone()[0]
+
+    def __repr__(self) -> str:
+        return '%s(database: %s)' % (type(self).__name__, self.database)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    @staticmethod
+    def _read(path: str) -> tuple:
+        raise NotImplementedError
+
+    def _write(self, batch: List[tuple]) -> None:
+        """
+        Writes a batch of (path, mtime_ns, size, *read values) rows.
+        """
+        raise NotImplementedError
+
+    def _write_failures(self, read: List[tuple], failed: List[tuple]) -> None:
+        """
+        Records a batch of (path, mtime_ns, size, error) rows of files that
+        could not be read, and forgets earlier failures of the files read.
+        """
+        connection = self._connection
+        with connection:
+            connection.executemany('DELETE FROM failures WHERE path = ?', [(item[0],) for item in read])
+            connection.executemany(f'DELETE FROM {self._table} WHERE path = ?', [(item[0],) for item in failed])
+            connection.executemany('INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?)', failed)
+
+    def failures(self) -> List[Tuple[str, str]]:
+        """
+        Returns the path and error of each file that could not be read, sorted
+        by path. The files are read again when they change.
+        """
+        return list(self._connection.execute('SELECT path, error FROM failures ORDER BY path'))
+
+    def update(self,
+               paths: Iterable[Union[str, Path]],
+               batch_size: int = DEFAULT_BATCH_SIZE,
+               remove_missing: bool = True,
+               jobs: Optional[int] = None) -> UpdateStats:
+        """
+        Adds new and changed files to the index. Files that cannot be read,
+        e.g. corrupt files, are skipped and recorded in failures().
+
+        Args:
+            paths: files and directories to search for files to index
+            batch_size: number of files written per transaction
+            remove_missing: remove indexed files that no longer exist
+            jobs: number of worker processes to read the files with. Files
+                are read serially if None or 1.
+
+        Returns:
+            UpdateStats of the update
+        """
+        connection = self._connection
+        known = {path: (mtime_ns, size) for path, mtime_ns, size
+                 in connection.execute(f'SELECT path, mtime_ns, size FROM {self._table}')}
+        failures = {path: (mtime_ns, size) for path, mtime_ns, size
+                    in connection.execute('SELECT path, mtime_ns, size FROM failures')}
+        added = updated = unchanged = failed = 0
+        changed = []
+        for path in _files(paths, self._suffix):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                failed += 1
+                continue
+            current = (stat.st_mtime_ns, stat.st_size)
+            if known.get(path) == current:
+                unchanged += 1
+            elif failures.get(path) == current:
+                failed += 1
+            else:
+                changed.append((path,) + current)
+
+        read_file = partial(_try_read, self._read)
+        executor = ProcessPoolExecutor(max_workers=jobs) if jobs is not None and jobs > 1 else None
+        try:
+            for i in range(0, len(changed), batch_size):
+                chunk = changed[i:i + batch_size]
+                chunk_paths = [path for path, _, _ in chunk]
+                results: Iterable[Tuple[Optional[tuple], str]]
+                if executor is None:
+                    results = map(read_file, chunk_paths)
+                else:
+                    results = executor.map(read_file, chunk_paths, chunksize=16)
+                rows, errors = [], []
+                for item, (values, error) in zip(chunk, results):
+                    if values is None:
+                        errors.append(item + (error,))
+                    elif item[0] in known:
+                        rows.append(item + values)
+                        updated += 1
+                    else:
+                        rows.append(item + values)
+                        added += 1
+                failed += len(errors)
+                self._write(rows)
+                self._write_failures(rows, errors)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        removed = 0
+        if remove_missing:
+            missing = [(path,) for path in known if not os.path.exists(path)]
+            with connection:
+                connection.executemany(f'DELETE FROM {self._table} WHERE path = ?', missing)
+                connection.executemany('DELETE FROM failures WHERE path = ?',
+                                       [(path,) for path in failures if not os.path.exists(path)])
+            removed = len(missing)
+        return UpdateStats(added, updated, unchanged, removed, failed)
+
+
+class Top10Index(_FileIndex):
+    """
+    SQLite index of the top10 times of many level files, e.g. for building a
+    leaderboard. Only the header and the top10 block of each level file are
+    read, and files are only read again when their modification time or size
+    has changed.
+
+    Usage::
+
+        with Top10Index('top10.db') as index:
+            index.update(['levels/'])
+            print(index.best_times('kuski'))
+
+    Attributes:
+        database (string): Path to the SQLite database.
+    """
+    _schema = _TOP10_SCHEMA
+    _suffix = '.lev'
+    _read = staticmethod(_read_level_file)
+
+    def _write(self, batch: List[tuple]) -> None:
+        connection = self._connection
+        with connection:
+            connection.executemany('DELETE FROM files WHERE path = ?', [(item[0],) for item in batch])
+            connection.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?)', [item[:5] for item in batch])
+            connection.executemany('INSERT INTO times VALUES (?, ?, ?, ?, ?, ?)', [
+                (path, level_id, t.is_multi, t.time, t.kuski, t.kuski2)
+                for path, _, _, level_id, _, top10 in batch
+                for t in top10.single + top10.multi])
+
+    def _times(self, query: str, parameters: Tuple) -> List[IndexedTime]:
+        return [IndexedTime(level_id, level_name, time, kuski, kuski2, bool(is_multi), path)
+                for level_id, level_name, time, kuski, kuski2, is_multi, path
+                in self._connection.execute(query, parameters)]
+
+    def best_times(self, kuski: str, is_multi: Optional[bool] = False) -> List[IndexedTime]:
+        """
+        Returns the best time of a kuski in each level, sorted by level_id.
+
+        Args:
+            kuski: name of the kuski. Multiplayer times match either kuski.
+            is_multi: False for singleplayer times, True for multiplayer times
+                and None for the best time of either kind in each level
+        """
+        kinds = (0, 1) if is_multi is None else (int(is_multi),)
+        marks = ', '.join('?' * len(kinds))
+        # SQLite returns the other columns of the row with the MIN(time)
+        return self._times(f"""
+            SELECT t.level_id, f.level_name, MIN(t.time), t.kuski, t.kuski2, t.is_multi, t.path
+            FROM (SELECT * FROM times WHERE kuski = ? AND is_multi IN ({marks})
+                  UNION ALL
+                  SELECT * FROM times WHERE kuski2 = ? AND kuski != kuski2 AND is_multi IN ({marks})) AS t
+            JOIN files AS f ON f.path = t.path
+            GROUP BY t.level_id
+            ORDER BY t.level_id""", (kuski, *kinds, kuski, *kinds))
+
+    def level_times(self, level_id: int, is_multi: bool = False, limit: Optional[int] = 10) -> List[IndexedTime]:
+        """
+        Returns the best unique times of a level across all indexed files,
+        sorted by time.
+
+        Args:
+            level_id: level_id of the level
+            is_multi: whether to return multiplayer instead of singleplayer
+                times
+            limit: maximum number of times, or None for all times
+        """
+        return self._times("""
+            SELECT t.level_id, f.level_name, t.time, t.kuski, t.kuski2, t.is_multi, MIN(t.path)
+            FROM times AS t JOIN files AS f ON f.path = t.path
+            WHERE t.level_id = ? AND t.is_multi = ?
+            GROUP BY t.time, t.kuski, t.kuski2
+            ORDER BY t.time, t.kuski, t.kuski2
+            LIMIT ?""", (level_id, int(is_multi), -1 if limit is None else limit))
+
+    def top10(self, level_id: int) -> elma.models.Top10:
+        """
+        Returns the merged Top10 of a level across all indexed files.
+        """
+        top10 = elma.models.Top10()
+        top10.single = [elma.models.Top10Time(t.time, t.kuski, t.kuski2)
+                        for t in self.level_times(level_id)]
+        top10.multi = [elma.models.Top10Time(t.time, t.kuski, t.kuski2, True)
+                       for t in self.level_times(level_id, is_multi=True)]
+        return top10
+
+
+class ReplayCatalog(_FileIndex):
+    """
+    SQLite catalog of the header facts of many replay files, for finding
+    replays without unpacking them. Replay files are only read again when
+    their modification time or size has changed.
+
+    Usage::
+
+        with ReplayCatalog('replays.db') as catalog:
+            catalog.update(['replays/'], jobs=4)
+            for entry in catalog.find(level_id=1234567, is_finished=True, max_time=30):
+                print(entry.path, entry.time)
+
+    Attributes:
+        database (string): Path to the SQLite database.
+    """
+    _table = 'replays'
+    _schema = _CATALOG_SCHEMA
+    _suffix = '.rec'
+    _read = staticmethod(_read_replay_file)
+
+    def _write(self, batch: List[tuple]) -> None:
+        with self._connection:
+            self._connection.executemany('INSERT OR REPLACE INTO replays VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                         batch)
+
+    def find(self,
+             level_id: Optional[int] = None,
+             level_name: Optional[str] = None,
+             is_finished: Optional[bool] = None,
+             is_multi: Optional[bool] = None,
+             is_flagtag: Optional[bool] = None,
+             min_time: Optional[float] = None,
+             max_time: Optional[float] = None,
+             content_hash: Optional[str] = None,
+             limit: Optional[int] = None) -> List[CatalogEntry]:
+        """
+        Returns the replays matching all given conditions, sorted by time and
+        path. Conditions that are None are ignored.
+
+        Args:
+            level_id: level_id of the level
+            level_name: name of the level
+            is_finished: whether or not the replay is (probably) finished
+            is_multi: whether or not the replay is a multiplayer replay
+            is_flagtag: whether or not the replay is a flagtag replay
+            min_time: shortest time in seconds
+            max_time: longest time in seconds
+            content_hash: SHA-256 hex digest of the replay file, e.g. to find
+                copies of a replay
+            limit: maximum number of replays, or None for all
+        """
+        conditions = []
+        parameters: List[object] = []
+        for column, operator, value in [('level_id', '=', level_id),
+                                        ('level_name', '=', level_name),
+                                        ('is_finished', '=', is_finished),
+                                        ('is_multi', '=', is_multi),
+                                        ('is_flagtag', '=', is_flagtag),
+                                        ('time', '>=', min_time),
+                                        ('time', '<=', max_time),
+                                        ('content_hash', '=', content_hash)]:
+            if value is not None:
+                conditions.append(f'{column} {operator} ?')
+                parameters.append(value)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+        parameters.append(-1 if limit is None else limit)
+        return [CatalogEntry(path, level_id, level_name, bool(is_multi), bool(is_flagtag), time, bool(is_finished),
+                             frames, events, content_hash)
+                for (path, level_id, level_name, is_multi, is_flagtag, time, is_finished, frames, events,
+                     content_hash)
+                in self._connection.execute(f"""
+                    SELECT path, level_id, level_name, is_multi, is_flagtag, time, is_finished, frames, events,
+                           content_hash
+                    FROM replays {where}
+                    ORDER BY time, path
+                    LIMIT ?""", parameters)]
+
+    def level_ids(self) -> List[int]:
+        """
+        Returns the level_ids of all replays in the catalog.
+        """
+        return [level_id for level_id, in
+                self._connection.execute('SELECT DISTINCT level_id FROM replays ORDER BY level_id')]
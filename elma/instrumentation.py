@@ -0,0 +1,177 @@
+"""
+Opt-in instrumentation of the packing, unpacking, rendering and LGR hot paths.
+
+Hooks are callables that are called as hook(name, seconds, size, count) after
+each instrumented operation, where size is the number of bytes processed, if
+known, and count the number of items. When no hooks are registered the
+instrumented functions only check for hooks before doing their work.
+Exceptions raised by hooks are logged and do not reach the instrumented
+callers.
+
+Replay frames are decoded on first access, so unpack_frames is reported
+when Replay.frames is first used, not within unpack_replay.
+
+Usage::
+
+    from elma.instrumentation import PrometheusCollector, add_hook
+
+    collector = PrometheusCollector()
+    add_hook(collector)
+    ...
+    print(collector.expose())
+"""
+from __future__ import annotations
+
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+__all__ = ["Hook", "add_hook", "remove_hook", "clear_hooks", "instrumented", "count", "PrometheusCollector"]
+
+Hook = Callable[[str, float, int, int], None]
+
+_Function = TypeVar('_Function', bound=Callable[..., Any])
+
+# registered hooks, replaced rather than changed in place so instrumented
+# functions can iterate over it without a lock
+_hooks: Tuple[Hook, ...] = ()
+_lock = threading.Lock()
+
+_logger = logging.getLogger(__name__)
+
+
+def add_hook(hook: Hook) -> None:
+    """
+    Registers a hook to be called after each instrumented operation.
+    """
+    global _hooks
+    with _lock:
+        _hooks = _hooks + (hook,)
+
+
+def remove_hook(hook: Hook) -> None:
+    """
+    Unregisters a hook.
+
+    Raises:
+        ValueError: if the hook is not registered.
+    """
+    global _hooks
+    with _lock:
+        hooks = list(_hooks)
+        hooks.remove(hook)
+        _hooks = tuple(hooks)
+
+
+def clear_hooks() -> None:
+    """
+    Unregisters all hooks.
+    """
+    global _hooks
+    with _lock:
+        _hooks = ()
+
+
+def _emit(name: str, seconds: float, size: int, n: int) -> None:
+    for hook in _hooks:
+        try:
+            hook(name, seconds, size, n)
+        except Exception:
+            _logger.exception("Instrumentation hook %r failed on %s", hook, name)
+
+
+def count(name: str, n: int = 1, size: int = 0) -> None:
+    """
+    Reports n items of an untimed operation, e.g. decoded images, to the
+    hooks.
+    """
+    if _hooks:
+        _emit(name, 0.0, size, n)
+
+
+def instrumented(name: str, size: Optional[Callable[..., int]] = None) -> Callable[[_Function], _Function]:
+    """
+    Decorates a function to report its wall time to the hooks as an
+    operation called name.
+
+    Args:
+        name: Name of the operation.
+        size: Optional function of the result and the arguments of the
+            decorated function that returns the number of bytes processed.
+            It is only called when hooks are registered.
+    """
+    def decorate(function: _Function) -> _Function:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _hooks:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            _emit(name, seconds, size(result, *args, **kwargs) if size is not None else 0, 1)
+            return result
+        return wrapper  # type: ignore[return-value]
+    return decorate
+
+
+def _escape(label: str) -> str:
+    return label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class PrometheusCollector(object):
+    """
+    Hook that sums up the operations and exposes them in the Prometheus text
+    format, as the counters elma_operations_total, elma_operation_seconds_total
+    and elma_operation_bytes_total labelled by operation.
+
+    Attributes:
+        prefix (str): Prefix of the metric names.
+    """
+    def __init__(self, prefix: str = 'elma') -> None:
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # operation -> [count, seconds, bytes]
+        self._totals: Dict[str, List[float]] = {}
+
+    def __call__(self, name: str, seconds: float, size: int, n: int) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(name, [0, 0.0, 0])
+            totals[0] += n
+            totals[1] += seconds
+            totals[2] += size
+
+    def __repr__(self) -> str:
+        return 'PrometheusCollector(operations: %s)' % sorted(self._totals)
+
+    def totals(self) -> Dict[str, Tuple[int, float, int]]:
+        """
+        Returns the count, seconds and bytes of each operation.
+        """
+        with self._lock:
+            return {name: (int(n), seconds, int(size)) for name, (n, seconds, size) in self._totals.items()}
+
+    def reset(self) -> None:
+        """
+        Sets all totals to zero.
+        """
+        with self._lock:
+            self._totals.clear()
+
+    def expose(self) -> str:
+        """
+        Returns the totals in the Prometheus text exposition format.
+        """
+        totals = sorted(self.totals().items())
+        lines = []
+        for index, (metric, description) in enumerate([
+                ('operations_total', "Number of instrumented elma operations or items."),
+                ('operation_seconds_total', "Time spent in instrumented elma operations in seconds."),
+                ('operation_bytes_total', "Bytes processed by instrumented elma operations.")]):
+            metric = '%s_%s' % (self.prefix, metric)
+            lines.append('# HELP %s %s' % (metric, description))
+            lines.append('# TYPE %s counter' % metric)
+            for name, values in totals:
+                lines.append('%s{operation="%s"} %r' % (metric, _escape(name), values[index]))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import elma.models
+from elma.packing import pack_level, unpack_level, unpack_level_header
+from elma.utils import read_file
+
+__all__ = ["LevelPack", "LevelPackWriter", "fingerprint"]
+
+_MAGIC = b'ELMALVP1'
+_INDEX_MAGIC = b'ELMALVI1'
+# magic
+_HEADER = struct.Struct('<8s8x')
+# table offset, names offset, number of levels, flags and magic
+_TRAILER = struct.Struct('<QQII8s')
+# level offset, level length, level_id and name length
+_ENTRY = struct.Struct('<QIIH')
+
+_FINGERPRINT_SIZE = hashlib.sha256().digest_size
+
+# trailer flags
+_FINGERPRINTS = 1
+
+Key = Union[int, str]
+
+
+def fingerprint(packed_level: Union[bytes, bytearray, memoryview]) -> bytes:
+    """
+    Returns the SHA-256 digest of a packed level, as stored in level packs.
+    """
+    return hashlib.sha256(packed_level).digest()
+
+
+class LevelPack(object):
+    """
+    Read only container of many level files, memory mapped so that reading a
+    level only touches its own pages and the index. Levels are looked up by
+    index, by name or by level_id, and optionally by the SHA-256 fingerprint
+    of their packed bytes.
+
+    The file starts with a header, followed by the packed levels as they are
+    in .lev files, an offset table with the level_id of each level, the
+    optional fingerprints, the names, and a trailer locating the table. Packs
+    are built with LevelPackWriter. Levels appended to a pack follow its
+    trailer and are followed by a new index, and the last trailer that
+    follows its index is used, so levels whose index was never written are
+    ignored.
+
+    Usage::
+
+        with LevelPack('levels.elvp') as pack:
+            level = pack['qwquu039.lev']
+            level = pack[0]
+            level = pack.by_level_id(1234)
+
+    Attributes:
+        path (Path): Path of the pack file.
+    """
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size + _TRAILER.size:
+                raise ValueError(f"{self.path} is not a level pack")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_index()
+        except BaseException:
+            self._mmap.close()
+            raise
+        self._names: Optional[Dict[str, int]] = None
+        self._level_ids: Optional[Dict[int, int]] = None
+        self._fingerprints: Optional[Dict[bytes, int]] = None
+
+    def _read_index(self) -> None:
+        if _HEADER.unpack_from(self._mmap, 0)[0] != _MAGIC:
+            raise ValueError(f"{self.path} is not a level pack")
+        position = self._mmap.rfind(_INDEX_MAGIC, _HEADER.size)
+        while position >= 0:
+            trailer_offset = position + len(_INDEX_MAGIC) - _TRAILER.size
+            if trailer_offset >= _HEADER.size:
+                table, names_offset, count, flags, _ = _TRAILER.unpack_from(self._mmap, trailer_offset)
+                fingerprint_offset = table + count * _ENTRY.size
+                tables_end = fingerprint_offset + (count * _FINGERPRINT_SIZE if flags & _FINGERPRINTS else 0)
+                if _HEADER.size <= table and tables_end == names_offset <= trailer_offset:
+                    self._table, self._names_offset, self._count, self._flags = table, names_offset, count, flags
+                    self._fingerprint_offset = fingerprint_offset
+                    self._index_end = trailer_offset + _TRAILER.size
+                    return
+            position = self._mmap.rfind(_INDEX_MAGIC, _HEADER.size, position + len(_INDEX_MAGIC) - 1)
+        raise ValueError(f"{self.path} has no index, it may not have been closed")
+
+    def __enter__(self) -> LevelPack:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key: object) -> bool:
+        if isinstance(key, int):
+            return -self._count <= key < self._count
+        return key in self._name_index()
+
+    def __iter__(self) -> Iterator[elma.models.Level]:
+        for index in range(self._count):
+            yield self.get(index)
+
+    def __getitem__(self, key: Key) -> elma.models.Level:
+        return self.get(key)
+
+    def __repr__(self) -> str:
+        return 'LevelPack(path: %s, levels: %s)' % (self.path, self._count)
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int]:
+        if not 0 <= index < self._count:
+            raise IndexError(f"Level index {index} out of range")
+        return _ENTRY.unpack_from(self._mmap, self._table + index * _ENTRY.size)
+
+    def _name_index(self) -> Dict[str, int]:
+        # built on first use, reading only the names at the end of the file
+        if self._names is None:
+            self._names = {}
+            for index, name in enumerate(self.names()):
+                self._names.setdefault(name, index)
+        return self._names
+
+    def _index(self, key: Key) -> int:
+        if isinstance(key, int):
+            return key + self._count if key < 0 else key
+        try:
+            return self._name_index()[key]
+        except KeyError:
+            raise KeyError(f"No level named {key} in the pack") from None
+
+    def names(self) -> List[str]:
+        """
+        Returns the names of the levels in the order they were added.
+        """
+        names = []
+        offset = self._names_offset
+        for index in range(self._count):
+            length = self._entry(index)[3]
+            names.append(self._mmap[offset:offset + length].decode('utf-8'))
+            offset += length
+        return names
+
+    def level_id(self, key: Key) -> int:
+        """
+        Returns the level_id of a level without reading the level.
+        """
+        return self._entry(self._index(key))[2]
+
+    def fingerprint(self, key: Key) -> bytes:
+        """
+        Returns the SHA-256 digest of a packed level.
+
+        Raises:
+            ValueError: if the pack was built without fingerprints.
+        """
+        if not self._flags & _FINGERPRINTS:
+            raise ValueError(f"{self.path} has no fingerprints")
+        offset = self._fingerprint_offset + self._index(key) * _FINGERPRINT_SIZE
+        return self._mmap[offset:offset + _FINGERPRINT_SIZE]
+
+    def get_bytes(self, key: Key) -> memoryview:
+        """
+        Returns a packed level as a view into the memory mapped file, without
+        copying it.
+
+        Args:
+            key: Index of the level in the pack, or its name.
+
+        Raises:
+            IndexError: if the index is out of range.
+            KeyError: if there is no level with the name.
+        """
+        offset, length, _, _ = self._entry(self._index(key))
+        return memoryview(self._mmap)[offset:offset + length]
+
+    def get(self, key: Key) -> elma.models.Level:
+        """
+        Returns an unpacked level.
+
+        Args:
+            key: Index of the level in the pack, or its name.
+
+        Raises:
+            IndexError: if the index is out of range.
+            KeyError: if there is no level with the name.
+        """
+        with self.get_bytes(key) as packed:
+            return unpack_level(packed)
+
+    def by_level_id(self, level_id: int) -> elma.models.Level:
+        """
+        Returns the first level added with a level_id.
+
+        Raises:
+            KeyError: if there is no level with the level_id.
+        """
+        if self._level_ids is None:
+            self._level_ids = {}
+            for index in range(self._count):
+                self._level_ids.setdefault(self._entry(index)[2], index)
+        if level_id not in self._level_ids:
+            raise KeyError(f"No level with level_id {level_id} in the pack")
+        return self.get(self._level_ids[level_id])
+
+    def by_fingerprint(self, digest: bytes) -> elma.models.Level:
+        """
+        Returns the first level added whose packed bytes have a SHA-256
+        digest.
+
+        Raises:
+            KeyError: if there is no level with the digest.
+            ValueError: if the pack was built without fingerprints.
+        """
+        if self._fingerprints is None:
+            self._fingerprints = {}
+            for index in range(self._count):
+                self._fingerprints.setdefault(self.fingerprint(index), index)
+        if digest not in self._fingerprints:
+            raise KeyError(f"No level with fingerprint {digest.hex()} in the pack")
+        return self.get(self._fingerprints[digest])
+
+    def close(self) -> None:
+        """
+        Closes the memory map. Views returned by get_bytes must be released
+        first.
+        """
+        self._mmap.close()
+
+
+class LevelPackWriter(object):
+    """
+    Builds a LevelPack incrementally. Levels are appended to the file as they
+    are added and the index is written when the writer is closed, so packs of
+    any size are built without holding the levels in memory. Levels added to
+    an existing pack are written after its index, so if the writer is not
+    closed, the pack keeps the levels it had.
+
+    Usage::
+
+        with LevelPackWriter('levels.elvp') as writer:
+            for file in files:
+                writer.add_file(file)
+
+    Attributes:
+        path (Path): Path of the pack file.
+        fingerprints (bool): Whether to store the SHA-256 digest of each
+            level for lookups with LevelPack.by_fingerprint. When appending
+            to an existing pack, this is taken from the pack.
+    """
+    def __init__(self, path: Union[str, Path], mode: str = 'w', fingerprints: bool = True) -> None:
+        if mode not in ('a', 'w'):
+            raise ValueError(f"Invalid mode {mode}")
+        self.path = Path(path)
+        self.fingerprints = fingerprints
+        # offset, length, level_id, name and fingerprint of each level
+        self._entries: List[Tuple[int, int, int, str, bytes]] = []
+        self._names: Dict[str, int] = {}
+        if mode == 'a' and self.path.exists():
+            with LevelPack(self.path) as pack:
+                self.fingerprints = bool(pack._flags & _FINGERPRINTS)
+                for index, name in enumerate(pack.names()):
+                    offset, length, level_id, _ = pack._entry(index)
+                    digest = pack.fingerprint(index) if self.fingerprints else b''
+                    self._entries.append((offset, length, level_id, name, digest))
+                    self._names.setdefault(name, index)
+                self._end = pack._index_end
+            self._file = open(self.path, 'r+b')
+        else:
+            self._file = open(self.path, 'w+b')
+            self._file.write(_HEADER.pack(_MAGIC))
+            self._end = self._file.tell()
+
+    def __enter__(self) -> LevelPackWriter:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return 'LevelPackWriter(path: %s, levels: %s)' % (self.path, len(self))
+
+    def add(self, name: str, level: Union[elma.models.Level, bytes, bytearray, memoryview]) -> int:
+        """
+        Adds a level, given as a Level or packed as in a .lev file.
+
+        Returns:
+            The index of the level in the pack.
+
+        Raises:
+            KeyError: if a level with the name is already in the pack.
+        """
+        if name in self._names:
+            raise KeyError(f"Level {name} is already in the pack")
+        if isinstance(level, elma.models.Level):
+            level = pack_level(level)
+        _, level_id, _ = unpack_level_header(level)
+        self._file.seek(self._end)
+        self._file.write(level)
+        digest = fingerprint(level) if self.fingerprints else b''
+        self._entries.append((self._end, len(level), level_id, name, digest))
+        self._names[name] = len(self._entries) - 1
+        self._end += len(level)
+        return len(self._entries) - 1
+
+    def add_file(self, file: Union[str, Path], name: Optional[str] = None) -> int:
+        """
+        Adds a level file, with its file name as the name by default.
+
+        Returns:
+            The index of the level in the pack.
+        """
+        return self.add(name if name is not None else Path(file).name, read_file(file))
+
+    def close(self) -> None:
+        """
+        Writes the index and closes the file.
+        """
+        if self._file.closed:
+            return
+        names = [name.encode('utf-8') for _, _, _, name, _ in self._entries]
+        self._file.seek(self._end)
+        self._file.write(b''.join(_ENTRY.pack(offset, length, level_id, len(encoded))
+                                  for (offset, length, level_id, _, _), encoded in zip(self._entries, names)))
+        if self.fingerprints:
+            self._file.write(b''.join(digest for _, _, _, _, digest in self._entries))
+        names_offset = self._file.tell()
+        self._file.write(b''.join(names))
+        self._file.write(_TRAILER.pack(self._end, names_offset, len(self._entries),
+                                       _FINGERPRINTS if self.fingerprints else 0, _INDEX_MAGIC))
+        self._file.truncate()
+        self._file.close()
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import io
+import os
 import re
 import struct
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Union, Optional, BinaryIO
+from typing import List, Union, Optional, BinaryIO, TYPE_CHECKING
 from PIL import Image
 
 from elma.constants import LGR_DEFAULT_PALETTE
@@ -14,8 +17,12 @@ from elma.constants import LGR_NOT_IN_PICTURES_LST
 from elma.constants import LGR_OBJECT_NAME
 from elma.constants import LGR_PCX_PADDING
 from elma.constants import LGR_PICTURES_LST_ID
+from elma.instrumentation import count, instrumented
 from elma.utils import null_padded
 
+if TYPE_CHECKING:
+    from elma.atlas import Atlas
+
 __all__ = ["LGR_Image", "LGR", "unpack_LGR", "pack_LGR"]
 
 
@@ -133,6 +140,51 @@ class LGR_Image(object):
                 self.img.palette.mode == 'RGB' and
                 len(self.get_palette()) == 768)
 
+    def transparent_color_index(self) -> Optional[int]:
+        """
+        Returns the palette index that is drawn as transparent, or None if the
+        whole image is opaque.
+
+        Textures, qcolors and qgrass are opaque. Images that are not in
+        pictures.lst use the top left pixel, the rest follow `transparency`.
+        """
+        name_lower = self.name.lower()
+        if name_lower in ("qcolors", "qgrass"):
+            return None
+        if self.is_in_pictures_lst():
+            if self.image_type == LGR_Image.TEXTURE and not self.is_special():
+                return None
+            transparency = self.transparency
+        else:
+            transparency = LGR_Image.TRANSPARENCY_TOPLEFT
+        width, height = self.img.size
+        corners = {
+            LGR_Image.TRANSPARENCY_TOPLEFT: (0, 0),
+            LGR_Image.TRANSPARENCY_TOPRIGHT: (width - 1, 0),
+            LGR_Image.TRANSPARENCY_BOTTOMLEFT: (0, height - 1),
+            LGR_Image.TRANSPARENCY_BOTTOMRIGHT: (width - 1, height - 1),
+        }
+        if transparency == LGR_Image.TRANSPARENCY_PAL_ZERO:
+            return 0
+        if transparency in corners:
+            return self.img.getpixel(corners[transparency])
+        raise ValueError("%s's transparency (%s) is invalid" % (self.name, transparency))
+
+    def to_rgba(self) -> Image:
+        """
+        Returns an RGBA copy of the image with the transparent color (see
+        transparent_color_index()) given an alpha of 0.
+        """
+        img = self.img
+        if img.mode != 'P':
+            return img.convert('RGBA')
+        rgba = img.convert('RGBA')
+        index = self.transparent_color_index()
+        if index is not None:
+            table = bytes(0 if i == index else 255 for i in range(256))
+            rgba.putalpha(Image.frombytes('L', img.size, img.tobytes().translate(table)))
+        return rgba
+
     def save_PCX(self, filename: Union[str, Path, BinaryIO]) -> None:
         """
         Writes the image as a .pcx file to `filename`.
@@ -232,10 +284,46 @@ class LGR(object):
                 return i
         raise ValueError('\'%s\' not in LGR.images' % filename)
 
+    def content_hash(self) -> str:
+        """
+        Returns a SHA-256 hex digest of the palette and of the names,
+        attributes and pixels of all images.
+        """
+        h = hashlib.sha256(bytes(self.palette))
+        for image in self.images:
+            h.update(null_padded(image.name, 13))
+            h.update(struct.pack('<4I', image.image_type, image.default_distance,
+                                 image.default_clipping, image.transparency))
+            h.update(bytes(image.padding))
+            if image.img is not None:
+                h.update(bytes(image.img.mode, 'latin1'))
+                h.update(struct.pack('<2I', *image.img.size))
+                h.update(bytes(image.img.getpalette() or []))
+                h.update(image.img.tobytes())
+        return h.hexdigest()
+
+    def to_atlas(self,
+                 max_size: int = 2048,
+                 padding: int = 1,
+                 cache_dir: Optional[Union[str, Path]] = None) -> Atlas:
+        """
+        Packs all images into one or more RGBA texture atlas pages. See
+        elma.atlas.build_atlas().
+        """
+        from elma.atlas import build_atlas
+        return build_atlas(self, max_size=max_size, padding=padding, cache_dir=cache_dir)
+
     def __repr__(self) -> str:
         return 'LGR(images: %s)' % self.images
 
 
+def _packed_size(lgr: LGR, data_or_filename: Union[bytes, str, Path]) -> int:
+    if isinstance(data_or_filename, (str, Path)):
+        return os.path.getsize(data_or_filename)
+    return len(data_or_filename)
+
+
+@instrumented('unpack_LGR', size=_packed_size)
 def unpack_LGR(data_or_filename: Union[bytes, str, Path]) -> LGR:
     """
     Opens an LGR file when you pass raw data or a filename
@@ -247,6 +335,8 @@ def unpack_LGR(data_or_filename: Union[bytes, str, Path]) -> LGR:
     if isinstance(data_or_filename, str) or isinstance(data_or_filename, Path):
         with open(data_or_filename, 'rb') as f:
             data = f.read()
+    else:
+        data = data_or_filename
 
     lgr = LGR()
     pictures = []  # temp list to retain order of files by pcx order instead of Pictures.lst
@@ -298,6 +388,7 @@ def unpack_LGR(data_or_filename: Union[bytes, str, Path]) -> LGR:
                 img=pcx_img,
                 padding=pcx_padding))
         sp = sp+24+pcx_len
+    count('decode_pcx', n_pcx, sp - 17 - n_pics * 26 - 24 * n_pcx)
     if not found_palette and lgr.images:
         lgr.images[0].get_palette()
 
@@ -306,10 +397,28 @@ def unpack_LGR(data_or_filename: Union[bytes, str, Path]) -> LGR:
     return lgr
 
 
-def pack_LGR(lgr: LGR) -> bytes:
+def _encode_PCX(img: Image) -> bytes:
+    """
+    Returns the .pcx file contents of an image.
+    """
+    with io.BytesIO() as f:
+        img.save(f, 'pcx')
+        return f.getvalue()
+
+
+@instrumented('pack_LGR', size=lambda packed, *args, **kwargs: len(packed))
+def pack_LGR(lgr: LGR, workers: Optional[int] = None, use_processes: bool = False) -> bytes:
     """
     Converts LGR object into its binary representation to be saved as an lgr
     file.
+
+    Args:
+        lgr: LGR object to pack
+        workers: number of workers used to encode the images to .pcx
+            concurrently. Images are encoded serially if None or 1. The output
+            is identical regardless of the number of workers.
+        use_processes: encode the images in a process pool instead of a
+            thread pool (only used if workers > 1)
     """
 
     def to_int32(val: int) -> bytes:
@@ -321,7 +430,6 @@ def pack_LGR(lgr: LGR) -> bytes:
     l_default_distance = []
     l_default_clipping = []
     l_transparency = []
-    x = []
     for obj in lgr.images:
         if obj.is_in_pictures_lst():
             n_pics = n_pics+1
@@ -330,15 +438,28 @@ def pack_LGR(lgr: LGR) -> bytes:
             l_default_distance.append(to_int32(obj.default_distance))
             l_default_clipping.append(to_int32(obj.default_clipping))
             l_transparency.append(to_int32(obj.transparency))
-        with io.BytesIO() as f:
-            obj.save_PCX(f)
-            x_len = f.tell()
-            f.seek(0)
-            x.extend([
-                null_padded('%s.pcx' % obj.name, 13),
-                bytes(obj.padding),
-                to_int32(x_len),
-                f.read()])
+
+    imgs = [obj.img for obj in lgr.images]
+    if workers is None or workers <= 1 or len(imgs) <= 1:
+        pcx_files = [_encode_PCX(img) for img in imgs]
+    else:
+        executor: Executor
+        if use_processes:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+        with executor:
+            # map() yields the results in the order of the input images
+            pcx_files = list(executor.map(_encode_PCX, imgs))
+    count('encode_pcx', len(pcx_files), sum(len(pcx) for pcx in pcx_files))
+
+    x = []
+    for obj, pcx in zip(lgr.images, pcx_files):
+        x.extend([
+            null_padded('%s.pcx' % obj.name, 13),
+            bytes(obj.padding),
+            to_int32(len(pcx)),
+            pcx])
 
     return b"".join([
         b'LGR12',
@@ -1,18 +1,30 @@
 from __future__ import annotations
 
+import hashlib
+import heapq
 import itertools
 import random
 import struct
 from abc import ABCMeta
-from math import cos, sin
+from array import array
+from math import cos, frexp, ldexp, sin
 from pathlib import Path
-from typing import List, Optional, Union
-from PIL import Image
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple, Union, TYPE_CHECKING
 
+import elma.columns
+import elma.events
+import elma.nesting
 import elma.packing
+from elma.constants import RENDER_HEIGHT
+from elma.constants import RENDER_PADDING
+from elma.constants import RENDER_WIDTH
 from elma.constants import VERSION_ELMA
-from elma.render import LevelRenderer
-from elma.utils import null_padded, BoundingBox, check_writable_file
+from elma.utils import null_padded, read_file, BoundingBox, check_writable_file
+
+if TYPE_CHECKING:
+    from PIL import Image
+    import elma.cache
+    from elma.lgr import LGR
 
 __all__ = [
     "Point",
@@ -33,6 +45,177 @@ __all__ = [
     "Replay",
 ]
 
+#: Size in bytes of the structural digests of polygons, levels and replays
+DIGEST_SIZE = 16
+
+
+def _hash(*parts: Union[bytes, memoryview]) -> bytes:
+    h = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for part in parts:
+        h.update(part)
+    return h.digest()
+
+
+def _coordinates(values: List[float]) -> memoryview:
+    """
+    Returns coordinates as doubles, with -0.0 turned into 0.0, which compares
+    equal to it.
+    """
+    return _column_bytes(array('d', values))
+
+
+def _column_bytes(column: Union[array, memoryview]) -> memoryview:
+    """
+    Returns the bytes of a column, with -0.0 turned into 0.0 in float
+    columns, so that equal columns have equal bytes.
+    """
+    view = memoryview(column)
+    if view.format in ('f', 'd') and 0.0 in view:
+        view = memoryview(array(view.format, [value + 0.0 for value in view]))
+    return view.cast('B')
+
+
+# replaced whenever a digested object or list changes, which invalidates all
+# cached digests: a digest is cached with the token it was computed under
+_change_token = object()
+
+
+# sets an attribute without tracking the change, for new objects, which change
+# no digest. Unlike writing to __dict__, it keeps the attributes in the
+# compact layout of instances that is faster to read.
+_set = object.__setattr__
+
+
+def _changed() -> None:
+    global _change_token
+    _change_token = object()
+
+
+class _ChangeList(List[Any]):
+    """
+    List that invalidates cached digests when it is changed.
+    """
+    def __setitem__(self, index: Any, value: Any) -> None:
+        super().__setitem__(index, value)
+        _changed()
+
+    def __delitem__(self, index: Any) -> None:
+        super().__delitem__(index)
+        _changed()
+
+    def __iadd__(self, values: Iterable[Any]) -> _ChangeList:  # type: ignore[misc]
+        super().__iadd__(values)
+        _changed()
+        return self
+
+    def __imul__(self, count: Any) -> _ChangeList:  # type: ignore[misc]
+        super().__imul__(count)
+        _changed()
+        return self
+
+    def append(self, value: Any) -> None:
+        super().append(value)
+        _changed()
+
+    def extend(self, values: Iterable[Any]) -> None:
+        super().extend(values)
+        _changed()
+
+    def insert(self, index: Any, value: Any) -> None:
+        super().insert(index, value)
+        _changed()
+
+    def pop(self, index: Any = -1) -> Any:
+        value = super().pop(index)
+        _changed()
+        return value
+
+    def remove(self, value: Any) -> None:
+        super().remove(value)
+        _changed()
+
+    def clear(self) -> None:
+        super().clear()
+        _changed()
+
+    def reverse(self) -> None:
+        super().reverse()
+        _changed()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        super().sort(*args, **kwargs)
+        _changed()
+
+
+class _Tracked(object):
+    """
+    Base of the classes whose contents are digested. Changing a public
+    attribute invalidates all cached digests, and lists assigned to the
+    attributes named in _lists are copied into lists that do the same when
+    they are changed. Setting an attribute for the first time, as in
+    __init__, changes no existing digest.
+    """
+    _lists: Tuple[str, ...] = ()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in self._lists and type(value) is not _ChangeList:
+            value = _ChangeList(value)
+        changed = name in self.__dict__ and name[0] != '_'
+        _set(self, name, value)
+        if changed:
+            _changed()
+
+
+def _simplify(points: List[Point], tolerance: float) -> List[Point]:
+    """
+    Returns the vertices of a closed outline that are kept by a radial
+    distance pass followed by Douglas-Peucker, each allowed half of the
+    tolerance.
+    """
+    half = tolerance / 2
+    limit = half * half
+    # radial pass: drop vertices closer than half the tolerance to the last
+    # kept vertex, which removes most vertices of dense outlines cheaply
+    first = points[0]
+    last_x, last_y = first.x, first.y
+    kept = [first]
+    for p in points:
+        x, y = p.x, p.y
+        if (x - last_x) * (x - last_x) + (y - last_y) * (y - last_y) > limit:
+            kept.append(p)
+            last_x, last_y = x, y
+    # Douglas-Peucker over the outline closed by repeating the first vertex
+    xs = [p.x for p in kept] + [first.x]
+    ys = [p.y for p in kept] + [first.y]
+    keep = bytearray(len(xs))
+    keep[0] = 1
+    stack = [(0, len(xs) - 1)]
+    while stack:
+        start, end = stack.pop()
+        ax, ay = xs[start], ys[start]
+        dx, dy = xs[end] - ax, ys[end] - ay
+        length = dx * dx + dy * dy
+        farthest, index = limit, -1
+        for i in range(start + 1, end):
+            px, py = xs[i] - ax, ys[i] - ay
+            # distance to the segment, or to its start if it is a point
+            if length:
+                t = (px * dx + py * dy) / length
+                t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+                px -= t * dx
+                py -= t * dy
+            distance = px * px + py * py
+            if distance > farthest:
+                farthest, index = distance, i
+        if index >= 0:
+            keep[index] = 1
+            if index - start > 1:
+                stack.append((start, index))
+            if end - index > 1:
+                stack.append((index, end))
+    simplified = [p for p, k in zip(kept, keep) if k]
+    return simplified if len(simplified) >= 3 else points
+
 
 class Point(object):
     """
@@ -42,9 +225,16 @@ class Point(object):
         x (float): The x-coordinate of the point.
         y (float): The y-coordinate of the point.
     """
+    x: float
+    y: float
+
     def __init__(self, x: float, y: float) -> None:
-        self.x = x
-        self.y = y
+        _set(self, 'x', x)
+        _set(self, 'y', y)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        _set(self, name, value)
+        _changed()
 
     def __repr__(self) -> str:
         return 'Point(x: %s, y: %s)' % (self.x, self.y)
@@ -55,7 +245,19 @@ class Point(object):
         return self.x == other_point.x and self.y == other_point.y
 
 
-class Obj(object):
+class _UntrackedPoint(Point):
+    """
+    Point whose changes are not tracked, for the positions of frames, whose
+    digests are not cached.
+    """
+    __setattr__ = object.__setattr__  # type: ignore[assignment]
+
+    def __init__(self, x: float, y: float) -> None:
+        self.x = x
+        self.y = y
+
+
+class Obj(_Tracked):
     """
     Represents an Elasto Mania level object, which can be one of: flower, food,
     killer, start.
@@ -81,15 +283,20 @@ class Obj(object):
     GRAVITY_LEFT = 3
     GRAVITY_RIGHT = 4
 
+    point: Point
+    type: int
+    gravity: int
+    animation_number: int
+
     def __init__(self,
                  point: Point,
                  type: int,
                  gravity: int = GRAVITY_NORMAL,
                  animation_number: int = 1) -> None:
-        self.point = point
-        self.type = type
-        self.gravity = gravity
-        self.animation_number = animation_number
+        _set(self, 'point', point)
+        _set(self, 'type', type)
+        _set(self, 'gravity', gravity)
+        _set(self, 'animation_number', animation_number)
 
     def __repr__(self) -> str:
         return (
@@ -105,7 +312,7 @@ class Obj(object):
                 self.animation_number == other_obj.animation_number)
 
 
-class Picture(object):
+class Picture(_Tracked):
     """
     Represents an Elasto Mania level picture.
 
@@ -127,6 +334,13 @@ class Picture(object):
     CLIPPING_G = 1
     CLIPPING_S = 2
 
+    point: Point
+    picture_name: str
+    texture_name: str
+    mask_name: str
+    distance: int
+    clipping: int
+
     def __init__(self,
                  point: Point,
                  picture_name: str = '',
@@ -134,12 +348,12 @@ class Picture(object):
                  mask_name: str = '',
                  distance: int = 500,
                  clipping: int = CLIPPING_U) -> None:
-        self.point = point
-        self.picture_name = picture_name
-        self.texture_name = texture_name
-        self.mask_name = mask_name
-        self.distance = distance
-        self.clipping = clipping
+        _set(self, 'point', point)
+        _set(self, 'picture_name', picture_name)
+        _set(self, 'texture_name', texture_name)
+        _set(self, 'mask_name', mask_name)
+        _set(self, 'distance', distance)
+        _set(self, 'clipping', clipping)
 
     def __repr__(self) -> str:
         return (
@@ -159,18 +373,31 @@ class Picture(object):
                 self.clipping == other_picture.clipping)
 
 
-class Polygon(object):
+class Polygon(_Tracked):
     """
     Represents an Elasto Mania level polygon.
 
+    Polygons are hashable and compared by a structural digest of their points
+    and grass flag. The digest is cached until the polygon, its points or any
+    other digested object changes, so once computed, comparing and hashing
+    unchanged polygons takes constant time. Polygons whose digests are not
+    cached are compared point by point. Assigned lists of points are copied
+    into lists that track changes.
+
     Attributes:
         points (list): A list of Points defining the polygon contour.
         grass (boolean): A boolean deciding whether or not the polygon is a
             grass polygon.
     """
+    _lists = ('points',)
+
     def __init__(self, points: List[Point], grass: bool = False) -> None:
         self.points = points
         self.grass = grass
+        # digest and the change token it is valid for
+        self._digest: Optional[Tuple[object, bytes]] = None
+        # digest and simplified polygons by tolerance exponent
+        self._simplified: Optional[Tuple[bytes, Dict[int, Polygon]]] = None
 
     def __repr__(self) -> str:
         return 'Polygon(points: %s, grass: %s)' % (self.points, self.grass)
@@ -178,8 +405,55 @@ class Polygon(object):
     def __eq__(self, other_polygon: object) -> bool:
         if not isinstance(other_polygon, Polygon):
             return NotImplemented
-        return (self.points == other_polygon.points and
-                self.grass == other_polygon.grass)
+        if self is other_polygon:
+            return True
+        if self._digest is not None and other_polygon._digest is not None and \
+                self._digest[0] is _change_token is other_polygon._digest[0]:
+            return self._digest[1] == other_polygon._digest[1]
+        return self.points == other_polygon.points and self.grass == other_polygon.grass
+
+    def __hash__(self) -> int:
+        return hash(self.digest())
+
+    def digest(self) -> bytes:
+        """
+        Returns a digest of the points and grass flag of the polygon. Equal
+        polygons have equal digests.
+        """
+        if self._digest is None or self._digest[0] is not _change_token:
+            xs = _coordinates([p.x for p in self.points])
+            ys = _coordinates([p.y for p in self.points])
+            self._digest = _change_token, _hash(xs, ys, b'\1' if self.grass else b'\0')
+        return self._digest[1]
+
+    def simplified(self, tolerance: float) -> Polygon:
+        """
+        Returns the polygon with vertices removed so that its outline moves by
+        at most tolerance, using a radial distance pass and Douglas-Peucker.
+        At least three vertices are kept.
+
+        The tolerance is rounded down to a power of two, and results are
+        cached per power of two until the digest of the polygon changes. The
+        cached digest makes this check take constant time while nothing has
+        changed. The returned polygon is shared and must not be changed.
+
+        Args:
+            tolerance: maximum distance in level units between the outlines
+
+        Raises:
+            ValueError: if the tolerance is not positive.
+        """
+        if not tolerance > 0:
+            raise ValueError(f"Non-positive tolerance {tolerance}")
+        exponent = frexp(tolerance)[1] - 1
+        digest = self.digest()
+        if self._simplified is None or self._simplified[0] != digest:
+            self._simplified = digest, {}
+        cache = self._simplified[1]
+        if exponent not in cache:
+            points = _simplify(self.points, ldexp(1.0, exponent))
+            cache[exponent] = Polygon([Point(p.x, p.y) for p in points], grass=self.grass)
+        return cache[exponent]
 
     def move_by(self, x: float = 0, y: float = 0) -> None:
         self.points = [Point(p.x + x, p.y + y) for p in self.points]
@@ -296,6 +570,9 @@ class Top10Time(object):
                 self.kuski == other_time.kuski and
                 self.kuski2 == other_time.kuski2)
 
+    def __hash__(self) -> int:
+        return hash((self.time, self.kuski, self.kuski2))
+
 
 class Top10(object):
     """
@@ -318,21 +595,45 @@ class Top10(object):
         self.multi = sorted(self.multi, key=lambda t: t.time)[:10]
 
     def merge(self, other_top10: Top10) -> None:
-        for s in self.single:
-            for o in other_top10.single:
-                if s.time == o.time and s.kuski == o.kuski:
-                    other_top10.single.remove(o)
-                    break
-        self.single.extend([o for o in other_top10.single])
-
-        for s in self.multi:
-            for o in other_top10.multi:
-                if (s.time == o.time and s.kuski == o.kuski and
-                        s.kuski2 == o.kuski2):
-                    other_top10.multi.remove(o)
-                    break
-        self.multi.extend([o for o in other_top10.multi])
-        self.sort()
+        """
+        Merge the times of another top10 into this top10, keeping the best 10
+        unique times of each. The other top10 is left unchanged.
+        """
+        merged = Top10.merged(self, other_top10)
+        self.single = merged.single
+        self.multi = merged.multi
+
+    @classmethod
+    def merged(cls, *top10s: Top10) -> Top10:
+        """
+        Returns a new top10 with the best 10 unique singleplayer and
+        multiplayer times of any number of top10s. Times are unique by time,
+        kuski and kuski2. Of equal times, those of earlier top10s come first.
+        """
+        top10 = cls()
+        top10.single = Top10._best_times(itertools.chain.from_iterable(t.single for t in top10s))
+        top10.multi = Top10._best_times(itertools.chain.from_iterable(t.multi for t in top10s))
+        return top10
+
+    @staticmethod
+    def _best_times(times: Iterable[Top10Time], n: int = 10) -> List[Top10Time]:
+        """
+        Returns the best n unique times sorted by time, keeping only n times
+        in a heap at any point.
+        """
+        seen = set()
+        # max-heap on (time, order) so the worst kept time is at the root
+        heap: List[Tuple[int, int, Top10Time]] = []
+        for order, t in enumerate(times):
+            key = (t.time, t.kuski, t.kuski2)
+            if key in seen:
+                continue
+            seen.add(key)
+            if len(heap) < n:
+                heapq.heappush(heap, (-t.time, -order, t))
+            elif (-t.time, -order) > heap[0][:2]:
+                heapq.heapreplace(heap, (-t.time, -order, t))
+        return [t for _, _, t in sorted(heap, reverse=True)]
 
     def to_buffer(self) -> bytes:
         self.sort()
@@ -360,10 +661,14 @@ class Top10(object):
         ])
 
 
-class Level(object):
+class Level(_Tracked):
     """
     Represents an Elasto Mania level.
 
+    Levels are hashable and compared by a structural digest of their
+    polygons, objects and pictures, which is cached like the digests of
+    polygons.
+
     Attributes:
         version (string): VERSION_ELMA ('POT14') or VERSION_ACROSS ('POT06').
         polygons (list): A list of Polygons in the level.
@@ -385,6 +690,8 @@ class Level(object):
         integrity (list): A list of four integrity values read from an existing
             level. Empty, if preserve_integrity_values is False.
     """
+    _lists = ('polygons', 'objects', 'pictures')
+
     def __init__(self) -> None:
         self.version = VERSION_ELMA
         self.polygons: List[Polygon] = []
@@ -398,6 +705,8 @@ class Level(object):
         self.top10 = Top10()
         self.preserve_integrity_values = False
         self.integrity: List[float] = []
+        # digest and the change token it is valid for
+        self._digest: Optional[Tuple[object, bytes]] = None
 
     @property
     def ground_polygons(self) -> List[Polygon]:
@@ -413,14 +722,24 @@ class Level(object):
         """
         return [polygon for polygon in self.polygons if polygon.grass]
 
+    def polygon_tree(self) -> elma.nesting.PolygonTree:
+        """
+        Returns the containment hierarchy of the ground polygons, e.g. to
+        find which polygon contains another or whether a point is in the
+        ground. The tree does not follow later changes to the polygons.
+        """
+        return elma.nesting.PolygonTree(self.ground_polygons)
+
     def as_image(self,
                  *,
-                 max_width: Optional[int] = LevelRenderer.DEFAULT_WIDTH,
-                 max_height: Optional[int] = LevelRenderer.DEFAULT_HEIGHT,
+                 max_width: Optional[int] = RENDER_WIDTH,
+                 max_height: Optional[int] = RENDER_HEIGHT,
                  scale: Optional[float] = None,
-                 padding: int = LevelRenderer.DEFAULT_PADDING,
+                 padding: int = RENDER_PADDING,
                  render_objects: bool = True,
-                 show: bool = False) -> Image:
+                 show: bool = False,
+                 lgr: Optional[LGR] = None,
+                 simplify: bool = False) -> Image.Image:
         """
         Render image of the level.
 
@@ -433,11 +752,18 @@ class Level(object):
             render_objects: render both objects and polygons if True,
                 else render only polygons
             show: show rendered image if True
+            lgr: optional LGR to render the level with its ground and sky
+                textures, pictures and object sprites
+            simplify: render polygons simplified to the pixel size, which is
+                faster for levels with many vertices
         """
+        # imported here so that Pillow is only imported when rendering
+        from elma.render import LevelRenderer
         if scale:
-            renderer = LevelRenderer.with_scale(level=self, scale=scale, padding=padding)
+            renderer = LevelRenderer.with_scale(level=self, scale=scale, padding=padding, lgr=lgr, simplify=simplify)
         else:
-            renderer = LevelRenderer(level=self, max_width=max_width, max_height=max_height, padding=padding)
+            renderer = LevelRenderer(level=self, max_width=max_width, max_height=max_height, padding=padding, lgr=lgr,
+                                     simplify=simplify)
         if show:
             renderer.show(render_objects=render_objects)
         return renderer.render(render_objects=render_objects)
@@ -491,12 +817,15 @@ class Level(object):
         file.write_bytes(self.pack())
 
     @classmethod
-    def load(cls, file: Union[str, Path]) -> Level:
+    def load(cls, file: Union[str, Path, BinaryIO], cache: Optional[elma.cache.DiskCache] = None) -> Level:
         """
         Load level from a file
 
         Args:
-            file: path to a file containing an Elasto Mania level
+            file: path to a file containing an Elasto Mania level, or a
+                readable binary file object
+            cache: optional DiskCache to load the level through, to skip
+                unpacking files that have been loaded before
 
         Returns:
             Level object unpacked from the file
@@ -504,10 +833,9 @@ class Level(object):
         Raises:
             FileNotFoundError: if the file does not exists
         """
-        file = Path(file)
-        if not file.exists():
-            raise FileNotFoundError(f"File {file} not found.")
-        level = cls.unpack(file.read_bytes())
+        if cache is not None:
+            return cache.load_level(file)
+        level = cls.unpack(read_file(file))
         return level
 
     def pack(self) -> bytes:
@@ -522,12 +850,13 @@ class Level(object):
         return packed_level
 
     @classmethod
-    def unpack(cls, packed_level: bytes) -> Level:
+    def unpack(cls, packed_level: Union[bytes, bytearray, memoryview]) -> Level:
         """
         Unpack level from its binary representation readable by Elasto Mania
 
         Args:
-            packed_level: packed level as bytes
+            packed_level: packed level as bytes or any other object that
+                supports the buffer protocol
 
         Returns:
             Unpacked Level object
@@ -535,6 +864,11 @@ class Level(object):
         level = elma.packing.unpack_level(packed_level)
         return level
 
+    def __reduce__(self) -> tuple:
+        # pickle the polygon, object and picture columns instead of the objects
+        import elma.shared
+        return elma.shared.from_buffer, (elma.shared.to_buffer(self),)
+
     def __repr__(self) -> str:
         return (('Level(level_id: %s, name: %s, lgr: %s, ' +
                  'ground_texture: %s, sky_texture: %s)') %
@@ -544,11 +878,35 @@ class Level(object):
     def __eq__(self, other_level: object) -> bool:
         if not isinstance(other_level, Level):
             return NotImplemented
+        if self is other_level:
+            return True
+        if self._digest is not None and other_level._digest is not None and \
+                self._digest[0] is _change_token is other_level._digest[0]:
+            return self._digest[1] == other_level._digest[1]
         # level_id, integrity and name can differ
         return (self.polygons == other_level.polygons and
                 self.objects == other_level.objects and
                 self.pictures == other_level.pictures)
 
+    def __hash__(self) -> int:
+        return hash(self.digest())
+
+    def digest(self) -> bytes:
+        """
+        Returns a digest of the polygons, objects and pictures of the level.
+        Equal levels have equal digests.
+        """
+        if self._digest is None or self._digest[0] is not _change_token:
+            polygons = b''.join([polygon.digest() for polygon in self.polygons])
+            objects = _coordinates([float(value) for obj in self.objects
+                                    for value in (obj.point.x, obj.point.y, obj.type, obj.gravity,
+                                                  obj.animation_number)])
+            pictures = _coordinates([float(value) for pic in self.pictures
+                                     for value in (pic.point.x, pic.point.y, pic.distance, pic.clipping)])
+            names = repr([(pic.picture_name, pic.texture_name, pic.mask_name) for pic in self.pictures])
+            self._digest = _change_token, _hash(polygons, objects, pictures, names.encode('utf-8'))
+        return self._digest[1]
+
     def _all_points(self) -> List[Point]:
         """
         Returns all coordinate points of vertices, pictures and level objects.
@@ -572,7 +930,8 @@ class Frame(object):
             this frame relative to the position of the kuski.
         head_position (point): The position of the kuski's head in this frame
             relative to the position of the kuski.
-        rotation (int): The rotation of the kuski in 10000ths of a radian.
+        rotation (int): The rotation of the kuski in 10000ths of a full
+            rotation.
         left_wheel_rotation (int): The rotation of the bike's left wheel in
             249/2/pi-ths of a radian.
         right_wheel_rotation (int): The rotation of the bike's right wheel in
@@ -584,10 +943,10 @@ class Frame(object):
             this frame.
     """
     def __init__(self):
-        self.position = Point(0, 0)
-        self.left_wheel_position = Point(0, 0)
-        self.right_wheel_position = Point(0, 0)
-        self.head_position = Point(0, 0)
+        self.position = _UntrackedPoint(0, 0)
+        self.left_wheel_position = _UntrackedPoint(0, 0)
+        self.right_wheel_position = _UntrackedPoint(0, 0)
+        self.head_position = _UntrackedPoint(0, 0)
         self.rotation = 0
         self.left_wheel_rotation = 0
         self.right_wheel_rotation = 0
@@ -615,7 +974,7 @@ class Frame(object):
                     self.spring_sound_effect_volume)
 
 
-class Event(object):
+class Event(_Tracked):
     """
     Abstract base representation of a single replay event.
 
@@ -687,7 +1046,7 @@ class AppleTouchEvent(Event):
     """
 
 
-class Replay(object):
+class Replay(_Tracked):
     """
     Represents an Elasto Mania replay.
 
@@ -700,16 +1059,114 @@ class Replay(object):
         frames (list): The frames of this replay.
         events (list): The events of this replay.
         time (float): The time of this replay in seconds.
+        second_rider (Replay): The replay of the second rider of a
+            multiplayer replay, or None.
+
+    Replays are hashable and compared by a structural digest of the above.
+    The digest is cached like the digests of polygons while the frames are
+    columns of a packed replay, i.e. until they are first accessed through
+    `frames`, as Frames do not track their changes.
     """
+    _lists = ('events',)
+
     def __init__(self) -> None:
         self.is_finished = False
         self.is_multi = False
         self.is_flagtag = False
         self.level_id = 0
         self.level_name = ''
-        self.frames: List[Frame] = []
+        self._frames: Optional[List[Frame]] = []
+        # column views into a packed replay, decoded into _frames on first use
+        self._frame_view: Optional[elma.columns.FrameColumns] = None
         self.events: List[Event] = []
         self.time = 0.0
+        self._second_rider: Optional[Replay] = None
+        # section of a packed multiplayer replay, unpacked on first use
+        self._second_rider_view: Optional[memoryview] = None
+        # digest and the change token it is valid for
+        self._digest: Optional[Tuple[object, bytes]] = None
+
+    @property
+    def frames(self) -> List[Frame]:
+        if self._frames is None:
+            assert self._frame_view is not None
+            self._frames = _ChangeList(elma.columns.frames_from_columns(self._frame_view))
+            self._frame_view = None
+        return self._frames
+
+    @frames.setter
+    def frames(self, frames: List[Frame]) -> None:
+        self._frames = frames if type(frames) is _ChangeList else _ChangeList(frames)
+        self._frame_view = None
+        _changed()
+
+    def _set_frame_view(self, columns: elma.columns.FrameColumns) -> None:
+        """
+        Use read-only frame columns, e.g. views into a packed replay, as the
+        frames of the replay until they are accessed through `frames`.
+        """
+        self._frames = None
+        self._frame_view = columns
+
+    @property
+    def second_rider(self) -> Optional[Replay]:
+        if self._second_rider is None and self._second_rider_view is not None:
+            self._second_rider = elma.packing.unpack_replay(self._second_rider_view)
+            self._second_rider_view = None
+        return self._second_rider
+
+    @second_rider.setter
+    def second_rider(self, replay: Optional[Replay]) -> None:
+        self._second_rider = replay
+        self._second_rider_view = None
+        _changed()
+
+    @property
+    def riders(self) -> List[Replay]:
+        """
+        Returns the replays of all riders: this replay, followed by the second
+        rider of a multiplayer replay.
+        """
+        second_rider = self.second_rider
+        return [self] if second_rider is None else [self, second_rider]
+
+    def frame_columns(self) -> elma.columns.FrameColumns:
+        """
+        Returns the frames of the replay stored column-wise in arrays.
+        """
+        if self._frame_view is not None:
+            return self._frame_view
+        return elma.columns.frame_columns(self.frames)
+
+    def event_columns(self) -> elma.columns.EventColumns:
+        """
+        Returns the events of the replay stored column-wise in arrays.
+        """
+        return elma.columns.event_columns(self.events)
+
+    def event_index(self) -> elma.events.EventIndex:
+        """
+        Returns a time-sorted index of the events for queries by time and
+        type. The index does not follow later changes to the events.
+        """
+        return elma.events.EventIndex(self.events)
+
+    def state_at(self, times: Union[float, Iterable[float]]) -> elma.columns.KuskiState:
+        """
+        Returns the kuski state interpolated between frames at the given
+        times. See elma.columns.interpolate_frames().
+
+        Args:
+            times: a single time or a sequence of times in seconds
+
+        Returns:
+            KuskiState of floats for a single time, or of arrays for a sequence
+        """
+        if self._frame_view is None and isinstance(times, (int, float)) and self.frames:
+            # only the two frames around the time are converted to columns
+            i, j, weight = elma.columns._neighbours(times * elma.columns.FRAMES_PER_SECOND, len(self.frames) - 1)
+            return elma.columns._interpolate_pair(elma.columns.frame_columns(self.frames[i:j + 1]), 0, j - i, weight)
+        return elma.columns.interpolate_frames(self.frame_columns(), times)
 
     def save(self, file: Union[str, Path], allow_overwrite: bool = False, create_dirs: bool = False) -> None:
         """
@@ -730,12 +1187,15 @@ class Replay(object):
         file.write_bytes(self.pack())
 
     @classmethod
-    def load(cls, file: Union[str, Path]) -> Replay:
+    def load(cls, file: Union[str, Path, BinaryIO], cache: Optional[elma.cache.DiskCache] = None) -> Replay:
         """
         Load replay from a file
 
         Args:
-            file: path to a file containing an Elasto Mania replay
+            file: path to a file containing an Elasto Mania replay, or a
+                readable binary file object
+            cache: optional DiskCache to load the replay through, to skip
+                unpacking files that have been loaded before
 
         Returns:
             Replay object unpacked from the file
@@ -743,10 +1203,9 @@ class Replay(object):
         Raises:
             FileNotFoundError: if the file does not exist
         """
-        file = Path(file)
-        if not file.exists():
-            raise FileNotFoundError(f"File {file} not found.")
-        replay = cls.unpack(file.read_bytes())
+        if cache is not None:
+            return cache.load_replay(file)
+        replay = cls.unpack(read_file(file))
         return replay
 
     def pack(self) -> bytes:
@@ -760,12 +1219,13 @@ class Replay(object):
         return packed_replay
 
     @classmethod
-    def unpack(cls, packed_replay: bytes) -> Replay:
+    def unpack(cls, packed_replay: Union[bytes, bytearray, memoryview]) -> Replay:
         """
         Unpack replay from its binary representation readable by Elasto Mania
 
         Args:
-            packed_replay: packed replay as bytes
+            packed_replay: packed replay as bytes or any other object that
+                supports the buffer protocol. The frames are views into it.
 
         Returns:
             Unpacked Replay object
@@ -778,4 +1238,59 @@ class Replay(object):
             'Replay(is_multi: %s, is_flagtag: %s, level_id: %s, ' +
             'level_name: %s, len(frames): %s, len(events): %s)') % (
             self.is_multi, self.is_flagtag, self.level_id, self.level_name,
-            len(self.frames), len(self.events))
+            len(self.frames if self._frame_view is None else self._frame_view.x),
+            len(self.events))
+
+    def __eq__(self, other_replay: object) -> bool:
+        if not isinstance(other_replay, Replay):
+            return NotImplemented
+        if self is other_replay:
+            return True
+        digest, other_digest = self._cached_digest(), other_replay._cached_digest()
+        if digest is not None and other_digest is not None:
+            return digest == other_digest
+        second_rider, other_second_rider = self.second_rider, other_replay.second_rider
+        return (self._header() == other_replay._header() and
+                all(memoryview(a) == memoryview(b)
+                    for a, b in zip(self.frame_columns() + self.event_columns(),
+                                    other_replay.frame_columns() + other_replay.event_columns())) and
+                second_rider == other_second_rider)
+
+    def _header(self) -> Tuple[Any, ...]:
+        return self.is_finished, self.is_multi, self.is_flagtag, self.level_id, self.level_name, self.time
+
+    def __hash__(self) -> int:
+        return hash(self.digest())
+
+    def _cached_digest(self) -> Optional[bytes]:
+        """
+        Returns the cached digest, or None if it is missing or may be stale.
+        """
+        if self._digest is None or self._digest[0] is not _change_token or self._frames is not None:
+            return None
+        if self._second_rider is not None and self._second_rider._cached_digest() is None:
+            return None
+        return self._digest[1]
+
+    def digest(self) -> bytes:
+        """
+        Returns a digest of the attributes, frames and events of the replay
+        and of its second rider. Equal replays have equal digests.
+        """
+        digest = self._cached_digest()
+        if digest is None:
+            frame_columns = self.frame_columns()
+            event_columns = self.event_columns()
+            header = _coordinates([float(value) for value in self._header() if not isinstance(value, str)] +
+                                  [len(frame_columns.x), len(event_columns.time)])
+            columns = [_column_bytes(column) for column in frame_columns + event_columns]
+            second_rider = self.second_rider
+            digest = _hash(header, self.level_name.encode('utf-8'), *columns,
+                           second_rider.digest() if second_rider is not None else b'')
+            self._digest = _change_token, digest
+        return digest
+
+    def __reduce__(self) -> tuple:
+        # pickle the frame and event columns instead of the Frame objects
+        import elma.shared
+        return elma.shared.from_buffer, (elma.shared.to_buffer(self),)
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+from math import ceil, floor, sqrt
+from operator import attrgetter, mul
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import elma.models
+from elma.utils import BoundingBox
+
+__all__ = ["PolygonNode", "PolygonTree"]
+
+# polygons with fewer vertices are tested without an edge index
+_MIN_INDEXED_VERTICES = 16
+# average number of vertices per horizontal slab of an edge index
+_VERTICES_PER_SLAB = 4
+
+
+class _EdgeIndex(object):
+    """
+    Edges of a polygon bucketed into horizontal slabs by their y interval,
+    so a point-in-polygon test only looks at the edges of the slab of the
+    point.
+    """
+    def __init__(self, xs: List[float], ys: List[float], min_y: float, max_y: float) -> None:
+        self._min_y = min_y
+        self._count = max(1, len(xs) // _VERTICES_PER_SLAB)
+        self._height = (max_y - min_y) / self._count or 1.0
+        self._slabs: List[List[Tuple[float, float, float, float]]] = [[] for _ in range(self._count)]
+        last = self._count - 1
+        for x1, y1, x2, y2 in zip(xs, ys, xs[1:] + xs[:1], ys[1:] + ys[:1]):
+            first_slab = min(last, int((min(y1, y2) - min_y) / self._height))
+            last_slab = min(last, int((max(y1, y2) - min_y) / self._height))
+            for slab in range(first_slab, last_slab + 1):
+                self._slabs[slab].append((x1, y1, x2, y2))
+
+    def contains(self, x: float, y: float) -> bool:
+        slab = min(self._count - 1, int((y - self._min_y) / self._height))
+        return _crossings(self._slabs[slab], x, y)
+
+
+def _crossings(edges: Sequence[Tuple[float, float, float, float]], x: float, y: float) -> bool:
+    """
+    Returns True if a ray from (x, y) to the right crosses the edges an odd
+    number of times.
+    """
+    inside = False
+    for x1, y1, x2, y2 in edges:
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+    return inside
+
+
+class PolygonNode(object):
+    """
+    A polygon in a PolygonTree.
+
+    Attributes:
+        polygon (Polygon): The polygon.
+        parent (PolygonNode): The innermost polygon containing the polygon,
+            or None.
+        children (list): PolygonNodes of the polygons directly inside the
+            polygon.
+        depth (int): The number of polygons containing the polygon.
+        bounding_box (BoundingBox): The bounding box of the polygon.
+        area (float): The area of the polygon.
+    """
+    def __init__(self, polygon: elma.models.Polygon) -> None:
+        self.polygon = polygon
+        self.parent: Optional[PolygonNode] = None
+        self.children: List[PolygonNode] = []
+        self.depth = 0
+        self._xs = xs = [p.x for p in polygon.points]
+        self._ys = ys = [p.y for p in polygon.points]
+        self.bounding_box = BoundingBox(min(xs), max(xs), min(ys), max(ys))
+        # shoelace formula
+        self.area = abs(sum(map(mul, xs, ys[1:] + ys[:1])) - sum(map(mul, xs[1:] + xs[:1], ys))) / 2
+        self._edges: Optional[_EdgeIndex] = None
+
+    def __repr__(self) -> str:
+        return 'PolygonNode(depth: %s, area: %s, children: %s)' % (self.depth, self.area, len(self.children))
+
+    @property
+    def is_ground_inside(self) -> bool:
+        """
+        True if the area directly inside the polygon, outside its children, is
+        ground. The area outside all polygons is ground, the area inside the
+        outermost polygons is sky, and so on alternately.
+        """
+        return self.depth % 2 == 1
+
+    def contains(self, x: float, y: float) -> bool:
+        """
+        Returns True if (x, y) is inside the polygon.
+        """
+        box = self.bounding_box
+        if not (box.min_x <= x <= box.max_x and box.min_y <= y <= box.max_y):
+            return False
+        if len(self._xs) < _MIN_INDEXED_VERTICES:
+            xs, ys = self._xs, self._ys
+            return _crossings(list(zip(xs, ys, xs[1:] + xs[:1], ys[1:] + ys[:1])), x, y)
+        if self._edges is None:
+            self._edges = _EdgeIndex(self._xs, self._ys, box.min_y, box.max_y)
+        return self._edges.contains(x, y)
+
+    def _encloses(self, other: PolygonNode) -> bool:
+        box, inner = self.bounding_box, other.bounding_box
+        return (self.area > other.area and box.min_x <= inner.min_x and inner.max_x <= box.max_x and
+                box.min_y <= inner.min_y and inner.max_y <= box.max_y)
+
+
+class PolygonTree(object):
+    """
+    Containment hierarchy of polygons, which must not intersect each other,
+    as in a valid level.
+
+    Candidate parents are found through a uniform grid over the bounding
+    boxes of the polygons and pruned by bounding box and area, so a polygon
+    is usually tested against a single candidate, with one point-in-polygon
+    test of one of its vertices. Polygons with many vertices are tested
+    through an index of their edges.
+
+    The tree is a snapshot: build a new one after changing the polygons.
+
+    Attributes:
+        nodes (list): A PolygonNode for each polygon, in the order of the
+            polygons.
+        roots (list): PolygonNodes of the polygons not inside any other.
+    """
+    def __init__(self, polygons: Sequence[elma.models.Polygon]) -> None:
+        self.nodes = [PolygonNode(polygon) for polygon in polygons]
+        self.roots: List[PolygonNode] = []
+        self._cells: Dict[Tuple[int, int], List[PolygonNode]] = {}
+        if not self.nodes:
+            return
+        self._min_x = min(node.bounding_box.min_x for node in self.nodes)
+        self._min_y = min(node.bounding_box.min_y for node in self.nodes)
+        width = max(node.bounding_box.max_x for node in self.nodes) - self._min_x
+        height = max(node.bounding_box.max_y for node in self.nodes) - self._min_y
+        # about one cell per polygon
+        self._cell_size = sqrt(width * height / len(self.nodes)) or max(width, height) or 1.0
+        columns = ceil(width / self._cell_size) or 1
+        rows = ceil(height / self._cell_size) or 1
+        for node in self.nodes:
+            (x1, y1), (x2, y2) = self._cell(node.bounding_box.min_x, node.bounding_box.min_y), \
+                self._cell(node.bounding_box.max_x, node.bounding_box.max_y)
+            for cx in range(x1, min(x2, columns) + 1):
+                for cy in range(y1, min(y2, rows) + 1):
+                    self._cells.setdefault((cx, cy), []).append(node)
+        # smallest first, so the first candidate containing a point is the
+        # innermost polygon containing it
+        by_area = attrgetter('area')
+        for cell in self._cells.values():
+            cell.sort(key=by_area)
+        # parents are larger than their children, so they are placed first
+        for node in sorted(self.nodes, key=by_area, reverse=True):
+            x, y = node._xs[0], node._ys[0]
+            for candidate in self._cells[self._cell(x, y)]:
+                if candidate._encloses(node) and candidate.contains(x, y):
+                    node.parent = candidate
+                    node.depth = candidate.depth + 1
+                    candidate.children.append(node)
+                    break
+            else:
+                self.roots.append(node)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return floor((x - self._min_x) / self._cell_size), floor((y - self._min_y) / self._cell_size)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __iter__(self) -> Iterator[PolygonNode]:
+        """
+        Iterates over the nodes depth first, parents before their children.
+        """
+        stack = list(reversed(self.roots))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def __repr__(self) -> str:
+        return 'PolygonTree(polygons: %s, roots: %s)' % (len(self.nodes), len(self.roots))
+
+    def innermost(self, x: float, y: float) -> Optional[PolygonNode]:
+        """
+        Returns the node of the innermost polygon containing (x, y), or None
+        if no polygon contains it.
+        """
+        if not self.nodes:
+            return None
+        for node in self._cells.get(self._cell(x, y), []):
+            if node.contains(x, y):
+                return node
+        return None
+
+    def is_ground(self, x: float, y: float) -> bool:
+        """
+        Returns True if (x, y) is in the ground: outside all polygons, or
+        inside an even number of them.
+        """
+        node = self.innermost(x, y)
+        return node is None or node.is_ground_inside
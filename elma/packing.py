@@ -2,17 +2,28 @@ from __future__ import annotations
 
 import random
 import struct
-from typing import Union, Iterator, TYPE_CHECKING
+from typing import List, Optional, Union, Iterator, Tuple, TYPE_CHECKING
 
 import elma.models
+from elma.columns import FRAME_COLUMNS, FrameColumns
 from elma.constants import VERSION_ELMA
 from elma.constants import VERSION_ACROSS
 from elma.constants import END_OF_DATA_MARKER
 from elma.constants import END_OF_FILE_MARKER
 from elma.constants import END_OF_REPLAY_FILE_MARKER
+from elma.constants import EVENT_APPLE_TOUCH
+from elma.constants import EVENT_GROUND_TOUCH
+from elma.constants import EVENT_LEFT_VOLT
+from elma.constants import EVENT_OBJECT_TOUCH
+from elma.constants import EVENT_RIGHT_VOLT
+from elma.constants import EVENT_TIME_UNIT
+from elma.constants import EVENT_TURN
+from elma.constants import TOP10_SIZE
+from elma.instrumentation import instrumented
 from elma.utils import null_padded, crypt_top10
 
-__all__ = ["pack_level", "unpack_level", "pack_replay", "unpack_replay"]
+__all__ = ["integrity_values", "pack_level_header", "pack_level", "unpack_level", "unpack_level_header",
+           "unpack_top10", "replace_top10", "pack_replay_header", "pack_replay", "unpack_replay"]
 
 if TYPE_CHECKING:
     # defined here to avoid circular import at runtime
@@ -30,33 +41,78 @@ packers = {
     'Polygon': lambda polygon: b''.join([
         struct.pack('I', polygon.grass),
         struct.pack('I', len(polygon.points)),
-    ] + [pack_level(point) for point in polygon.points]),
+    ] + [_pack_level(point) for point in polygon.points]),
     'AcrossPolygon': lambda polygon: b''.join([
         struct.pack('I', len(polygon.points)),
-    ] + [pack_level(point) for point in polygon.points]),
+    ] + [_pack_level(point) for point in polygon.points]),
     'Obj': lambda obj: b''.join([
-        pack_level(obj.point),
+        _pack_level(obj.point),
         struct.pack('I', obj.type),
         struct.pack('I', obj.gravity),
         struct.pack('I', obj.animation_number - 1)]),
     'AcrossObj': lambda obj: b''.join([
-        pack_level(obj.point),
+        _pack_level(obj.point),
         struct.pack('I', obj.type)]),
     'Picture': lambda picture: b''.join([
         null_padded(picture.picture_name, 10),
         null_padded(picture.texture_name, 10),
         null_padded(picture.mask_name, 10),
-        pack_level(picture.point),
+        _pack_level(picture.point),
         struct.pack('I', picture.distance),
         struct.pack('I', picture.clipping)])
 }
 
 
+def integrity_values(checksum: float,
+                     rng: Optional[random.Random] = None) -> Tuple[float, float, float, float]:
+    """
+    Returns the four integrity values of an Elasto Mania level from the sum of
+    the x and y coordinates of its polygon vertices, objects and pictures plus
+    the types of its objects.
+
+    Args:
+        checksum: The sum of the coordinates and object types.
+        rng: Optional random number generator for the random parts of the
+            values, the random module by default.
+    """
+    randint = rng.randint if rng is not None else random.randint
+    collected_checksum = 3247.764325643 * checksum
+    return (collected_checksum,
+            randint(0, 5871) + 11877 - collected_checksum,
+            randint(0, 5871) + 11877 - collected_checksum,
+            randint(0, 6102) + 12112 - collected_checksum)
+
+
+def pack_level_header(level: elma.models.Level, integrity: Tuple[float, float, float, float]) -> bytes:
+    """
+    Pack the header of an Elasto Mania level, from its version up to the
+    polygon count, with the given integrity values.
+    """
+    return b''.join([
+        bytes(level.version, 'latin1'),
+        struct.pack('H', level.level_id & 0xFFFF),
+        struct.pack('I', level.level_id),
+    ] + [struct.pack('d', value) for value in integrity] + [
+        null_padded(level.name, 51),
+        null_padded(level.lgr, 16),
+        null_padded(level.ground_texture, 10),
+        null_padded(level.sky_texture, 10),
+    ])
+
+
+@instrumented('pack_level', size=lambda packed, *args, **kwargs: len(packed))
 def pack_level(item: LevelItem, is_elma: bool = True) -> bytes:
     """
     Pack a level-related item to its binary representation readable by
     Elasto Mania.
     """
+    return _pack_level(item, is_elma)
+
+
+def _pack_level(item: LevelItem, is_elma: bool = True) -> bytes:
+    """
+    Uninstrumented pack_level, also used for the items within a level.
+    """
 
     if not is_elma and type(item).__name__ in ['Polygon', 'Obj']:
         packer_name = 'Across' + type(item).__name__
@@ -81,40 +137,24 @@ def pack_level(item: LevelItem, is_elma: bool = True) -> bytes:
                            for obj in level.objects])
     picture_checksum = sum([picture.point.x + picture.point.y
                             for picture in level.pictures]) if is_elma else 0
-    collected_checksum = 3247.764325643 * (polygon_checksum +
-                                           object_checksum +
-                                           picture_checksum)
     if level.preserve_integrity_values:
         integrity_1, integrity_2, integrity_3, integrity_4 = level.integrity
     else:
-        integrity_1 = collected_checksum
-        integrity_2 = random.randint(0, 5871) + 11877 - collected_checksum
-        integrity_3 = random.randint(0, 5871) + 11877 - collected_checksum
-        integrity_4 = random.randint(0, 6102) + 12112 - collected_checksum
+        integrity_1, integrity_2, integrity_3, integrity_4 = integrity_values(
+            polygon_checksum + object_checksum + picture_checksum)
     assert ((integrity_3 - integrity_2) <= 5871)
 
     if is_elma:
         return b''.join([
-            bytes(level.version, 'latin1'),
-            struct.pack('H', level.level_id & 0xFFFF),
-            struct.pack('I', level.level_id),
-            struct.pack('d', integrity_1),
-            struct.pack('d', integrity_2),
-            struct.pack('d', integrity_3),
-            struct.pack('d', integrity_4),
-            null_padded(level.name, 51),
-            null_padded(level.lgr, 16),
-            null_padded(level.ground_texture, 10),
-            null_padded(level.sky_texture, 10),
+            pack_level_header(level, (integrity_1, integrity_2, integrity_3, integrity_4)),
             struct.pack('d', len(level.polygons) + 0.4643643),
-        ] + [pack_level(polygon) for polygon in level.polygons] + [
+        ] + [_pack_level(polygon) for polygon in level.polygons] + [
             struct.pack('d', len(level.objects) + 0.4643643),
-        ] + [pack_level(obj) for obj in level.objects] + [
+        ] + [_pack_level(obj) for obj in level.objects] + [
             struct.pack('d', len(level.pictures) + 0.2345672),
-        ] + [pack_level(picture) for picture in level.pictures] + [
+        ] + [_pack_level(picture) for picture in level.pictures] + [
             struct.pack('I', END_OF_DATA_MARKER),
-        ] + [bytes(chr(c), 'latin1')
-             for c in crypt_top10(level.top10.to_buffer())] + [
+            crypt_top10(level.top10.to_buffer()),
             struct.pack('I', END_OF_FILE_MARKER),
         ])
     else:
@@ -128,27 +168,28 @@ def pack_level(item: LevelItem, is_elma: bool = True) -> bytes:
             null_padded(level.name, 15),
             null_padded('', 44),
             struct.pack('d', len(level.polygons) + 0.4643643),
-        ] + [pack_level(polygon, False) for polygon in level.polygons] + [
+        ] + [_pack_level(polygon, False) for polygon in level.polygons] + [
             struct.pack('d', len(level.objects) + 0.4643643),
-        ] + [pack_level(obj, False) for obj in level.objects]
+        ] + [_pack_level(obj, False) for obj in level.objects]
 
         if len(level.top10.single) > 0 or len(level.top10.multi) > 0:
             level_data += [
                 struct.pack('I', END_OF_DATA_MARKER),
-            ] + [bytes(chr(c), 'latin1')
-                 for c in crypt_top10(level.top10.to_buffer())] + [
+                crypt_top10(level.top10.to_buffer()),
                 struct.pack('I', END_OF_FILE_MARKER),
             ]
         return b''.join(level_data)
 
 
-def unpack_level(packed_item: bytes) -> elma.models.Level:
+@instrumented('unpack_level', size=lambda level, packed_item: memoryview(packed_item).nbytes)
+def unpack_level(packed_item: Union[bytes, bytearray, memoryview]) -> elma.models.Level:
     """
     Unpack a level-related item from its binary representation readable by
-    Elasto Mania.
+    Elasto Mania, given as bytes or any other object that supports the buffer
+    protocol.
     """
 
-    data = iter(packed_item)
+    data = iter(memoryview(packed_item).cast('B'))
 
     def munch(n: int, dataiter: Iterator[int] = data) -> bytes:
         return b''.join([bytes(chr(next(dataiter)), 'latin1')
@@ -227,160 +268,168 @@ def unpack_level(packed_item: bytes) -> elma.models.Level:
 
     assert (struct.unpack('I', eod_marker)[0] == END_OF_DATA_MARKER)
 
-    top10 = iter(crypt_top10(munch(688)))
-    for top10_block in ['single', 'multi']:
-        times = []
-        kuskis1 = []
-        kuskis2 = []
-        time_count = struct.unpack('I', munch(4, top10))[0]
-        for _ in range(10):
-            times.append(struct.unpack('I', munch(4, top10))[0])
-        for _ in range(10):
-            kuskis1.append(munch(15, top10).split(b'\0')[0].decode('latin1'))
-        for _ in range(10):
-            kuskis2.append(munch(15, top10).split(b'\0')[0].decode('latin1'))
-        times = times[:time_count]
-        kuskis1 = kuskis1[:time_count]
-        kuskis2 = kuskis2[:time_count]
-        if top10_block == 'single':
-            level.top10.single = [elma.models.Top10Time(t, kuskis1[i], kuskis2[i])
-                                  for i, t in enumerate(times)
-                                  if (t > 0 and len(kuskis1[i]) > 0)]
-        else:
-            level.top10.multi = [elma.models.Top10Time(t, kuskis1[i], kuskis2[i], True)
-                                 for i, t in enumerate(times)
-                                 if (t > 0 and len(kuskis1[i]) > 0 and
-                                     len(kuskis2[i]) > 0)]
+    level.top10 = _unpack_top10_block(munch(TOP10_SIZE))
 
     assert (struct.unpack('I', munch(4))[0] == END_OF_FILE_MARKER)
     return level
 
 
-def unpack_replay(packed_item: bytes) -> elma.models.Replay:
+def unpack_level_header(packed_level: Union[bytes, bytearray, memoryview]) -> Tuple[str, int, str]:
     """
-    Unpack a replay-related item from its binary representation readable by
-    Elasto Mania.
+    Unpack only the version, level_id and name of a packed level. It is
+    enough to pass the first 94 bytes of the level file.
+
+    Returns:
+        (version, level_id, name) of the level
     """
+    version = bytes(packed_level[:5]).decode('latin1')
+    assert (version in [VERSION_ELMA, VERSION_ACROSS])
+    if version == VERSION_ELMA:
+        level_id = struct.unpack_from('I', packed_level, 7)[0]
+        name = bytes(packed_level[43:94])
+    else:
+        level_id = struct.unpack_from('I', packed_level, 5)[0]
+        name = bytes(packed_level[41:56])
+    return version, level_id, name.split(b'\0')[0].decode('latin1')
 
-    data = iter(packed_item)
 
-    def munch(n: int) -> bytes:
-        return b''.join([bytes(chr(next(data)), 'latin1') for _ in range(n)])
+def _unpack_top10_block(block: bytes) -> elma.models.Top10:
+    """
+    Unpack an encrypted top10 block of a level file.
+    """
+    top10 = elma.models.Top10()
+    buffer = crypt_top10(block)
+    for offset, is_multi in [(0, False), (TOP10_SIZE // 2, True)]:
+        time_count = struct.unpack_from('I', buffer, offset)[0]
+        times = struct.unpack_from('10I', buffer, offset + 4)[:time_count]
+        names = offset + 44
+        kuskis1 = [buffer[names + 15 * i:names + 15 * (i + 1)].split(b'\0')[0].decode('latin1')
+                   for i in range(len(times))]
+        names += 150
+        kuskis2 = [buffer[names + 15 * i:names + 15 * (i + 1)].split(b'\0')[0].decode('latin1')
+                   for i in range(len(times))]
+        if not is_multi:
+            top10.single = [elma.models.Top10Time(t, kuskis1[i], kuskis2[i])
+                            for i, t in enumerate(times)
+                            if (t > 0 and len(kuskis1[i]) > 0)]
+        else:
+            top10.multi = [elma.models.Top10Time(t, kuskis1[i], kuskis2[i], True)
+                           for i, t in enumerate(times)
+                           if (t > 0 and len(kuskis1[i]) > 0 and
+                               len(kuskis2[i]) > 0)]
+    return top10
 
-    def read_int32() -> int:
-        return struct.unpack('i', munch(4))[0]
 
-    def read_uint32() -> int:
-        return struct.unpack('I', munch(4))[0]
+def _top10_block_offset(packed_level: Union[bytes, bytearray, memoryview]) -> int:
+    """
+    Returns the offset of the encrypted top10 block from the end of a packed
+    level, or -1 if the level has no top10 (Across levels).
+    """
+    tail = len(packed_level) - TOP10_SIZE - 8
+    if (tail >= 0 and
+            struct.unpack_from('I', packed_level, tail)[0] == END_OF_DATA_MARKER and
+            struct.unpack_from('I', packed_level, len(packed_level) - 4)[0] == END_OF_FILE_MARKER):
+        return tail + 4
+    return -1
 
-    def read_int16() -> int:
-        return struct.unpack('h', munch(2))[0]
 
-    def read_uint8() -> int:
-        return struct.unpack('B', munch(1))[0]
+def unpack_top10(packed_level: Union[bytes, bytearray, memoryview]) -> elma.models.Top10:
+    """
+    Unpack only the top10 of a packed level, without unpacking the rest of the
+    level. The top10 is stored at the end of a level file, so it is enough to
+    pass the last 696 bytes of the file.
 
-    def read_float() -> float:
-        return struct.unpack('f', munch(4))[0]
+    Returns:
+        Top10 of the level, empty if the level has no top10
 
-    def read_double() -> float:
-        return struct.unpack('d', munch(8))[0]
+    Raises:
+        ValueError: if the packed level is an Elma level without a top10.
+    """
+    offset = _top10_block_offset(packed_level)
+    if offset < 0:
+        if bytes(packed_level[:5]) == VERSION_ELMA.encode('latin1'):
+            raise ValueError("Elma level has no top10, it may be truncated")
+        return elma.models.Top10()
+    return _unpack_top10_block(bytes(packed_level[offset:offset + TOP10_SIZE]))
 
-    replay = elma.models.Replay()
 
-    number_of_replay_frames = read_int32()
-    munch(4)
-    replay.is_multi = bool(read_int32())
-    replay.is_flagtag = bool(read_int32())
-    replay.level_id = read_uint32()
-    replay.level_name = munch(12).split(b'\0')[0].decode('latin1')
-    munch(4)
-
-    frame_numbers = range(number_of_replay_frames)
-    xs = [read_float() for _ in frame_numbers]
-    ys = [read_float() for _ in frame_numbers]
-    left_wheel_xs = [read_int16() for _ in frame_numbers]
-    left_wheel_ys = [read_int16() for _ in frame_numbers]
-    right_wheel_xs = [read_int16() for _ in frame_numbers]
-    right_wheel_ys = [read_int16() for _ in frame_numbers]
-    head_xs = [read_int16() for _ in frame_numbers]
-    head_ys = [read_int16() for _ in frame_numbers]
-    rotations = [read_int16() for _ in frame_numbers]
-    left_wheel_rotations = [read_uint8() for _ in frame_numbers]
-    right_wheel_rotations = [read_uint8() for _ in frame_numbers]
-    gas_and_turn_states = [read_uint8() for _ in frame_numbers]
-    sound_effect_volumes = [read_int16() for _ in frame_numbers]
-
-    for (x,
-         y,
-         left_wheel_x,
-         left_wheel_y,
-         right_wheel_x,
-         right_wheel_y,
-         head_x,
-         head_y,
-         rotation,
-         left_wheel_rotation,
-         right_wheel_rotation,
-         gas_and_turn_state,
-         sound_effect_volume) in zip(xs,
-                                     ys,
-                                     left_wheel_xs,
-                                     left_wheel_ys,
-                                     right_wheel_xs,
-                                     right_wheel_ys,
-                                     head_xs,
-                                     head_ys,
-                                     rotations,
-                                     left_wheel_rotations,
-                                     right_wheel_rotations,
-                                     gas_and_turn_states,
-                                     sound_effect_volumes):
-
-        frame = elma.models.Frame()
-        frame.position = elma.models.Point(x, y)
-        frame.left_wheel_position = elma.models.Point(left_wheel_x, left_wheel_y)
-        frame.right_wheel_position = elma.models.Point(right_wheel_x, right_wheel_y)
-        frame.head_position = elma.models.Point(head_x, head_y)
-        frame.rotation = rotation
-        frame.left_wheel_rotation = left_wheel_rotation
-        frame.right_wheel_rotation = right_wheel_rotation
-        frame.is_gasing = bool(gas_and_turn_state & 0b1)
-        frame.is_turned_right = bool(gas_and_turn_state & 0b10)
-        # preserve remaining 6 bits of state
-        frame._gas_and_turn_state = gas_and_turn_state
-        frame.spring_sound_effect_volume = sound_effect_volume
-        replay.frames.append(frame)
-
-    number_of_replay_events = read_int32()
-    for _ in range(number_of_replay_events):
-        event_time = read_double()
-        info = read_int16()
-        event_type = read_int16()
-        event_sound_volume = read_float()
-        event: elma.models.Event
-        if event_type == 0:
-            event = elma.models.ObjectTouchEvent()
-            event.object_number = info
-        elif event_type == 5:
-            event = elma.models.TurnEvent()
-        elif event_type == 7:
-            event = elma.models.LeftVoltEvent()
-        elif event_type == 6:
-            event = elma.models.RightVoltEvent()
-        elif event_type == 1:
-            event = elma.models.GroundTouchEvent()
-            event.event_sound_volume = event_sound_volume
-        elif event_type == 4:
-            event = elma.models.AppleTouchEvent()
-        else:
-            raise NotImplementedError(f"Event type {event_type} not implemented.")
+def replace_top10(packed_level: Union[bytes, bytearray, memoryview], top10: elma.models.Top10) -> bytes:
+    """
+    Returns a packed level with its top10 replaced, without unpacking and
+    repacking the rest of the level.
+    """
+    offset = _top10_block_offset(packed_level)
+    body = bytes(packed_level if offset < 0 else packed_level[:offset - 4])
+    if (bytes(packed_level[:5]) == VERSION_ACROSS.encode('latin1') and
+            len(top10.single) == 0 and len(top10.multi) == 0):
+        # Across levels are stored without a top10 until they have been finished
+        return body
+    return b''.join([
+        body,
+        struct.pack('I', END_OF_DATA_MARKER),
+        crypt_top10(top10.to_buffer()),
+        struct.pack('I', END_OF_FILE_MARKER),
+    ])
 
-        event.time = event_time
-        replay.events.append(event)
 
-    last_frame_time = len(replay.frames)/30.0
+@instrumented('unpack_replay', size=lambda replay, packed_item: memoryview(packed_item).nbytes)
+def unpack_replay(packed_item: Union[bytes, bytearray, memoryview]) -> elma.models.Replay:
+    """
+    Unpack a replay-related item from its binary representation readable by
+    Elasto Mania.
+
+    Frames are not decoded up front: the replay keeps zero-copy views of the
+    frame columns in the buffer and builds its Frames on first access. In a
+    multiplayer replay, the second rider's section that follows the first one
+    is kept as a view and unpacked when Replay.second_rider is first accessed.
+    """
+
+    view = memoryview(packed_item).cast('B')
+    replay, end = _unpack_replay_section(view)
+    if replay.is_multi and len(view) > end:
+        replay._second_rider_view = view[end:]
+    return replay
+
+
+def _unpack_replay_section(view: memoryview) -> Tuple[elma.models.Replay, int]:
+    """
+    Unpack the replay section of one rider at the start of a buffer.
+
+    Returns:
+        Unpacked Replay and the length of the section in bytes
+    """
+
+    replay = elma.models.Replay()
+
+    number_of_replay_frames = struct.unpack_from('i', view, 0)[0]
+    replay.is_multi = bool(struct.unpack_from('i', view, 8)[0])
+    replay.is_flagtag = bool(struct.unpack_from('i', view, 12)[0])
+    replay.level_id = struct.unpack_from('I', view, 16)[0]
+    replay.level_name = bytes(view[20:32]).split(b'\0')[0].decode('latin1')
+    offset = 36
+
+    columns = []
+    for _, typecode in FRAME_COLUMNS:
+        size = struct.calcsize(typecode) * number_of_replay_frames
+        if offset + size > len(view):
+            raise struct.error("Replay data ends in the middle of the frames")
+        columns.append(view[offset:offset + size].cast(typecode))  # type: ignore
+        offset += size
+    replay._set_frame_view(FrameColumns(*columns))
+
+    number_of_replay_events = struct.unpack_from('i', view, offset)[0]
+    offset += 4
+    events_size = 16 * number_of_replay_events
+    if offset + events_size > len(view):
+        raise struct.error("Replay data ends in the middle of the events")
+    replay.events = _unpack_events(view[offset:offset + events_size])
+    offset += events_size
+    # end of replay marker
+    offset += 4
+
+    last_frame_time = number_of_replay_frames/30.0
     last_event_time = (0.0 if len(replay.events) == 0 else
-                       replay.events[-1].time * (0.001/(0.182*0.0024)))
+                       replay.events[-1].time * EVENT_TIME_UNIT)
 
     replay.is_finished = False
     # Potentially finished, if replay ends in a touch event
@@ -399,9 +448,13 @@ def unpack_replay(packed_item: bytes) -> elma.models.Replay:
                 replay.is_finished = True
         elif (len(replay.events) >= 3 and
               isinstance(replay.events[-1], elma.models.AppleTouchEvent)):
-            end_apple_count = sum(1 for e in replay.events
-                                  if isinstance(e, elma.models.AppleTouchEvent) and
-                                  e.time == replay.events[-1].time)
+            # events are stored in time order, so the end apples are at the end
+            end_apple_count = 0
+            for e in reversed(replay.events):
+                if e.time != replay.events[-1].time:
+                    break
+                if isinstance(e, elma.models.AppleTouchEvent):
+                    end_apple_count += 1
             possible_flower_event = replay.events[-1 - 2*end_apple_count]
             if (isinstance(possible_flower_event, elma.models.ObjectTouchEvent) and
                     possible_flower_event.time == replay.events[-1].time):
@@ -409,14 +462,71 @@ def unpack_replay(packed_item: bytes) -> elma.models.Replay:
                 replay.is_finished = True
 
     replay.time = last_event_time if replay.is_finished else last_frame_time
-    return replay
+    return replay, offset
+
+
+@instrumented('unpack_events', size=lambda events, view: len(view))
+def _unpack_events(view: memoryview) -> List[elma.models.Event]:
+    """
+    Unpack the 16 byte records of replay events.
+    """
+    events: List[elma.models.Event] = []
+    for (event_time,
+         info,
+         event_type,
+         event_sound_volume) in struct.iter_unpack('dhhf', view):
+        event: elma.models.Event
+        if event_type == EVENT_OBJECT_TOUCH:
+            event = elma.models.ObjectTouchEvent()
+            event.object_number = info
+        elif event_type == EVENT_TURN:
+            event = elma.models.TurnEvent()
+        elif event_type == EVENT_LEFT_VOLT:
+            event = elma.models.LeftVoltEvent()
+        elif event_type == EVENT_RIGHT_VOLT:
+            event = elma.models.RightVoltEvent()
+        elif event_type == EVENT_GROUND_TOUCH:
+            event = elma.models.GroundTouchEvent()
+            event.event_sound_volume = event_sound_volume
+        elif event_type == EVENT_APPLE_TOUCH:
+            event = elma.models.AppleTouchEvent()
+        else:
+            raise NotImplementedError(f"Event type {event_type} not implemented.")
+
+        event.time = event_time
+        events.append(event)
+    return events
+
+
+def pack_replay_header(replay: elma.models.Replay, number_of_frames: int) -> bytes:
+    """
+    Pack the header of a rider's section of a replay, which is followed by
+    the frame columns.
+    """
+    return b''.join([
+        struct.pack('i', number_of_frames),
+        struct.pack('i', 0x83),
+        struct.pack('i', replay.is_multi),
+        struct.pack('i', replay.is_flagtag),
+        struct.pack('I', replay.level_id),
+        null_padded(replay.level_name, 12),
+        struct.pack('i', 0),
+    ])
 
 
+@instrumented('pack_replay', size=lambda packed, *args, **kwargs: len(packed))
 def pack_replay(item: Union[elma.models.Event, elma.models.Replay]) -> bytes:
     """
     Pack a replay-related item to its binary representation readable by
     Elasto Mania.
     """
+    return _pack_replay(item)
+
+
+def _pack_replay(item: Union[elma.models.Event, elma.models.Replay]) -> bytes:
+    """
+    Uninstrumented pack_replay, also used for the events within a replay.
+    """
 
     if isinstance(item, elma.models.ObjectTouchEvent):
         return (struct.pack('d', item.time) +
@@ -457,44 +567,14 @@ def pack_replay(item: Union[elma.models.Event, elma.models.Replay]) -> bytes:
     else:
         raise NotImplementedError(f"Packing not implemented for type {type(item)}")
 
-    name = null_padded(replay.level_name, 12)
-    return b''.join([
-        struct.pack('i', len(replay.frames)),
-        struct.pack('i', 0x83),
-        struct.pack('i', replay.is_multi),
-        struct.pack('i', replay.is_flagtag),
-        struct.pack('I', replay.level_id),
-        name,
-        struct.pack('i', 0),
-        b''.join([struct.pack('f', frame.position.x)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('f', frame.position.y)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('h', frame.left_wheel_position.x)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('h', frame.left_wheel_position.y)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('h', frame.right_wheel_position.x)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('h', frame.right_wheel_position.y)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('h', frame.head_position.x)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('h', frame.head_position.y)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('h', frame.rotation)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('B', frame.left_wheel_rotation)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('B', frame.right_wheel_rotation)
-                  for frame in replay.frames]),
-        b''.join([struct.pack('B',
-                              frame._gas_and_turn_state & 0b11111100 |
-                              (frame.is_turned_right << 1) | frame.is_gasing)
-                 for frame in replay.frames]),
-        b''.join([struct.pack('h', frame.spring_sound_effect_volume)
-                  for frame in replay.frames]),
+    columns = replay.frame_columns()
+    packed = b''.join([
+        pack_replay_header(replay, len(columns.x)),
+        b''.join([column.tobytes() for column in columns]),
         struct.pack('I', len(replay.events)),
-        b''.join([pack_replay(event) for event in replay.events]),
+        b''.join([_pack_replay(event) for event in replay.events]),
         struct.pack('I', END_OF_REPLAY_FILE_MARKER),
     ])
+    if replay.is_multi and replay.second_rider is not None:
+        packed += _pack_replay(replay.second_rider)
+    return packed
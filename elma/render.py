@@ -1,24 +1,63 @@
 from __future__ import annotations
 
-from typing import Tuple, Optional
-from PIL import Image, ImageDraw
+import weakref
+from collections import OrderedDict
+from math import floor
+from typing import Dict, Tuple, Optional
+from PIL import Image, ImageChops, ImageDraw
 import elma.models
+from elma.constants import LGR_PIXELS_PER_UNIT
 from elma.constants import OBJECT_RADIUS
+from elma.constants import RENDER_HEIGHT
+from elma.constants import RENDER_PADDING
+from elma.constants import RENDER_SIMPLIFY_TOLERANCE
+from elma.constants import RENDER_WIDTH
+from elma.instrumentation import instrumented
+from elma.lgr import LGR, LGR_Image
 
 __all__ = ["LevelRenderer"]
 
+# Scaled textures and sprites per LGR image, shared by all renderers, with a
+# weak reference to the LGR image and the PIL image they were made from. LGR
+# images compare by content and are not hashable, so they are keyed by id,
+# and entries are dropped together with the LGR image. Only the most recently
+# used scales of each image are kept.
+_lgr_image_cache: Dict[int, Tuple[weakref.ref, Image, OrderedDict]] = {}
+_CACHED_SCALES = 4
+
+
+def _forget_image(key: int, ref: weakref.ref) -> None:
+    entry = _lgr_image_cache.get(key)
+    if entry is not None and entry[0] is ref:
+        del _lgr_image_cache[key]
+
+
+def _image_cache(image: LGR_Image) -> OrderedDict:
+    """
+    Returns the scaled images of an LGR image, empty if the LGR image or its
+    PIL image is new.
+    """
+    key = id(image)
+    entry = _lgr_image_cache.get(key)
+    if entry is None or entry[0]() is not image or entry[1] is not image.img:
+        entry = weakref.ref(image, lambda ref: _forget_image(key, ref)), image.img, OrderedDict()
+        _lgr_image_cache[key] = entry
+    return entry[2]
+
 
 class LevelRenderer:
 
-    DEFAULT_WIDTH = 1920
-    DEFAULT_HEIGHT = 1080
-    DEFAULT_PADDING = 10
+    DEFAULT_WIDTH = RENDER_WIDTH
+    DEFAULT_HEIGHT = RENDER_HEIGHT
+    DEFAULT_PADDING = RENDER_PADDING
 
     def __init__(self,
                  level: elma.models.Level,
                  max_width: Optional[int] = DEFAULT_WIDTH,
                  max_height: Optional[int] = DEFAULT_HEIGHT,
-                 padding: int = DEFAULT_PADDING) -> None:
+                 padding: int = DEFAULT_PADDING,
+                 lgr: Optional[LGR] = None,
+                 simplify: bool = False) -> None:
         """
         Render image of a level
 
@@ -27,9 +66,16 @@ class LevelRenderer:
             max_width: optional maximum width of the rendered image in pixels or None
             max_height: optional maximum height of the rendered image in pixels or None
             padding: space around the image in pixels
+            lgr: optional LGR to render the level with textures, pictures
+                and object sprites instead of flat colors
+            simplify: draw polygons simplified with Polygon.simplified() to
+                RENDER_SIMPLIFY_TOLERANCE pixels at the scale of the image,
+                which is faster for levels with many vertices per pixel
         """
         self.level = level
         self.padding = padding
+        self.lgr = lgr
+        self.simplify = simplify
         self.scale = float("inf")
         self._min_x, self._max_x, self._min_y, self._max_y = level.bounding_box()
         # use defaults if both size limits are None
@@ -57,7 +103,12 @@ class LevelRenderer:
         }
 
     @classmethod
-    def with_scale(cls, level: elma.models.Level, scale: float, padding: int = DEFAULT_PADDING) -> LevelRenderer:
+    def with_scale(cls,
+                   level: elma.models.Level,
+                   scale: float,
+                   padding: int = DEFAULT_PADDING,
+                   lgr: Optional[LGR] = None,
+                   simplify: bool = False) -> LevelRenderer:
         """
         Create a LevelRenderer with a constant scaling factor.
 
@@ -65,11 +116,13 @@ class LevelRenderer:
             level: Level object to render
             scale: scaling factor to convert level coordinates to pixels
             padding: space around the image in pixels
+            lgr: optional LGR to render the level with textures
+            simplify: draw polygons simplified to the pixel size
 
         Returns:
             LevelRenderer instance
         """
-        renderer = cls(level=level, padding=padding)
+        renderer = cls(level=level, padding=padding, lgr=lgr, simplify=simplify)
         renderer.scale = scale
         return renderer
 
@@ -94,6 +147,7 @@ class LevelRenderer:
         """
         return self.image_width, self.image_height
 
+    @instrumented('render')
     def render(self, render_objects: bool = True) -> Image:
         """
         Render image of the level
@@ -105,6 +159,8 @@ class LevelRenderer:
         Returns:
             image of the level
         """
+        if self.lgr is not None:
+            return self._render_textured(render_objects)
         im = Image.new('RGB', self.image_size, color=self.colors["sky"])
         self._render_polygons(im)
         if render_objects:
@@ -159,7 +215,11 @@ class LevelRenderer:
         """
         Returns a binary mask of all non-grass polygons of the level.
         """
-        polygons = sorted(self.level.ground_polygons, key=lambda p: p.area(), reverse=True)
+        polygons = self.level.ground_polygons
+        if self.simplify:
+            tolerance = RENDER_SIMPLIFY_TOLERANCE / self.scale
+            polygons = [polygon.simplified(tolerance) for polygon in polygons]
+        polygons = sorted(polygons, key=lambda p: p.area(), reverse=True)
         mask_color = 0
         if not polygons[0].is_filled():
             mask_color = 1
@@ -193,17 +253,164 @@ class LevelRenderer:
         Add rendered level objects to the given image.
         """
         for obj in self.level.objects:
-            x = obj.point.x - OBJECT_RADIUS
-            y = obj.point.y - OBJECT_RADIUS
-            position = self.to_pixel_coordinates(x, y)
-            if obj.type == elma.models.Obj.FLOWER:
-                color = self.colors["flower"]
-            elif obj.type == elma.models.Obj.FOOD:
-                color = self.colors["apple"]
+            self._render_object(im, obj)
+
+    def _render_object(self, im: Image, obj: elma.models.Obj) -> None:
+        """
+        Add a single level object rendered as a circle to the given image.
+        """
+        x = obj.point.x - OBJECT_RADIUS
+        y = obj.point.y - OBJECT_RADIUS
+        position = self.to_pixel_coordinates(x, y)
+        if obj.type == elma.models.Obj.FLOWER:
+            color = self.colors["flower"]
+        elif obj.type == elma.models.Obj.FOOD:
+            color = self.colors["apple"]
+        elif obj.type == elma.models.Obj.KILLER:
+            color = self.colors["killer"]
+        elif obj.type == elma.models.Obj.START:
+            color = self.colors["start"]
+        else:
+            raise NotImplementedError(f"Object type {obj.type} not implemented")
+        im.paste(color, position, self.object_mask())
+
+    def _cached_image(self, kind: str, image: LGR_Image) -> Image:
+        """
+        Returns an LGR image converted to RGBA and resized to the current
+        scale. Objects are cropped to their first frame and resized to the
+        object diameter. Results are cached per LGR image for a few scales
+        and shared between renderers, until the image is replaced.
+        """
+        cache = _image_cache(image)
+        key = (kind, self.scale)
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        rgba = image.to_rgba()
+        if kind == "object":
+            frame_size = min(rgba.height, rgba.width)
+            rgba = rgba.crop((0, 0, frame_size, frame_size))
+            size = max(1, round(2 * OBJECT_RADIUS * self.scale))
+            cache[key] = rgba.resize((size, size))
+        else:
+            ratio = self.scale / LGR_PIXELS_PER_UNIT
+            cache[key] = rgba.resize((max(1, round(rgba.width * ratio)),
+                                      max(1, round(rgba.height * ratio))))
+        if len(cache) > _CACHED_SCALES:
+            cache.popitem(last=False)
+        return cache[key]
+
+    def _find_image(self, name: str) -> Optional[LGR_Image]:
+        """
+        Returns the LGR image with the given name or None if the LGR does not
+        contain it.
+        """
+        assert self.lgr is not None
+        try:
+            return self.lgr.images[self.lgr.find_LGR_Image(name)]
+        except ValueError:
+            return None
+
+    def _tiled(self, name: str, size: Tuple[int, int], origin: Tuple[float, float]) -> Optional[Image]:
+        """
+        Returns an image of the given size covered with a texture, aligned so
+        that a tile starts at the level origin. Returns None if the LGR does
+        not contain the texture.
+        """
+        image = self._find_image(name)
+        if image is None:
+            return None
+        tile = self._cached_image("texture", image)
+        tile_width, tile_height = tile.size
+        width, height = size
+        offset_x = floor(origin[0]) % tile_width - tile_width
+        offset_y = floor(origin[1]) % tile_height - tile_height
+        # build one row of tiles and repeat it, instead of pasting every tile
+        row = Image.new('RGBA', (width - offset_x, tile_height))
+        for x in range(0, row.width, tile_width):
+            row.paste(tile, (x, 0))
+        im = Image.new('RGBA', size)
+        for y in range(offset_y, height, tile_height):
+            im.paste(row, (offset_x, y))
+        return im
+
+    def _render_textured(self, render_objects: bool) -> Image:
+        """
+        Render the level with the textures, pictures and object sprites of
+        the LGR.
+        """
+        level_origin = (self.scale * -self._min_x + self.padding,
+                        self.scale * -self._min_y + self.padding)
+        im = Image.new('RGBA', self.image_size, color=self.colors["sky"])
+        ground_mask = self.polygon_mask().convert('L')
+        sky_mask = ImageChops.invert(ground_mask)
+        sky = self._tiled(self.level.sky_texture, self.image_size, level_origin)
+        if sky is not None:
+            im.alpha_composite(sky)
+        ground = self._tiled(self.level.ground_texture, self.image_size, level_origin)
+        if ground is not None:
+            im.paste(ground, mask=ground_mask)
+        else:
+            im.paste(self.colors["ground"], mask=ground_mask)
+        # pictures furthest away are drawn first
+        for picture in sorted(self.level.pictures, key=lambda p: p.distance, reverse=True):
+            self._render_picture(im, picture, level_origin, ground_mask, sky_mask)
+        if render_objects:
+            self._render_object_sprites(im)
+        return im.convert('RGB')
+
+    def _render_picture(self,
+                        im: Image,
+                        picture: elma.models.Picture,
+                        level_origin: Tuple[float, float],
+                        ground_mask: Image,
+                        sky_mask: Image) -> None:
+        """
+        Add a rendered picture or masked texture to the given image, clipped
+        to the ground or the sky according to its clipping.
+        """
+        position = self.to_pixel_coordinates(picture.point.x, picture.point.y)
+        if picture.picture_name:
+            image = self._find_image(picture.picture_name)
+            if image is None:
+                return
+            sprite = self._cached_image("picture", image)
+        else:
+            mask_image = self._find_image(picture.mask_name)
+            if mask_image is None:
+                return
+            shape = self._cached_image("picture", mask_image)
+            texture_origin = (level_origin[0] - position[0], level_origin[1] - position[1])
+            sprite = self._tiled(picture.texture_name, shape.size, texture_origin)
+            if sprite is None:
+                return
+            sprite.putalpha(shape.getchannel('A'))
+        alpha = sprite.getchannel('A')
+        box = (position[0], position[1], position[0] + sprite.width, position[1] + sprite.height)
+        if picture.clipping == elma.models.Picture.CLIPPING_G:
+            alpha = ImageChops.multiply(alpha, ground_mask.crop(box))
+        elif picture.clipping == elma.models.Picture.CLIPPING_S:
+            alpha = ImageChops.multiply(alpha, sky_mask.crop(box))
+        im.paste(sprite, position, alpha)
+
+    def _render_object_sprites(self, im: Image) -> None:
+        """
+        Add level objects rendered with the qfood, qkiller and qexit sprites
+        of the LGR to the given image. Start objects and objects whose sprite
+        is missing are drawn as circles.
+        """
+        for obj in self.level.objects:
+            image = None
+            if obj.type == elma.models.Obj.FOOD:
+                image = (self._find_image("qfood%s" % obj.animation_number) or
+                         self._find_image("qfood1"))
             elif obj.type == elma.models.Obj.KILLER:
-                color = self.colors["killer"]
-            elif obj.type == elma.models.Obj.START:
-                color = self.colors["start"]
+                image = self._find_image("qkiller")
+            elif obj.type == elma.models.Obj.FLOWER:
+                image = self._find_image("qexit")
+            position = self.to_pixel_coordinates(obj.point.x - OBJECT_RADIUS, obj.point.y - OBJECT_RADIUS)
+            if image is None:
+                self._render_object(im, obj)
             else:
-                raise NotImplementedError(f"Object type {obj.type} not implemented")
-            im.paste(color, position, self.object_mask())
+                sprite = self._cached_image("object", image)
+                im.alpha_composite(sprite, position)
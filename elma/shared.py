@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import sys
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING, Union
+
+import elma.models
+from elma.columns import FRAME_COLUMNS, EventColumns, FrameColumns, event_columns, events_from_columns
+
+__all__ = ["to_buffer", "from_buffer", "to_shared_memory", "from_shared_memory", "attach_shared_memory"]
+
+# buffers written with another format version cannot be read
+_FORMAT_VERSION = 1
+_MAGIC = b'ELMC'
+# magic, format version and length of the JSON metadata
+_HEADER = struct.Struct('<4sII')
+_ALIGNMENT = 8
+
+# JSON metadata and (name, typecode, column) triples of a buffer
+_Entry = Tuple[Dict[str, Any], List[Tuple[str, str, Any]]]
+
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+    Item = Union[elma.models.Level, elma.models.Replay]
+
+
+def _aligned(n: int) -> int:
+    return (n + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _level_entry(level: elma.models.Level) -> _Entry:
+    meta = {
+        'version': level.version,
+        'level_id': level.level_id,
+        'name': level.name,
+        'lgr': level.lgr,
+        'ground_texture': level.ground_texture,
+        'sky_texture': level.sky_texture,
+        'preserve_integrity_values': level.preserve_integrity_values,
+        'integrity': level.integrity,
+        'single': [[t.time, t.kuski, t.kuski2] for t in level.top10.single],
+        'multi': [[t.time, t.kuski, t.kuski2] for t in level.top10.multi],
+        'picture_names': [[p.picture_name, p.texture_name, p.mask_name] for p in level.pictures],
+    }
+    points = [point for polygon in level.polygons for point in polygon.points]
+    columns = [
+        ('polygon_size', 'I', array('I', [len(polygon.points) for polygon in level.polygons])),
+        ('polygon_grass', 'I', array('I', [polygon.grass for polygon in level.polygons])),
+        ('point_x', 'd', array('d', [point.x for point in points])),
+        ('point_y', 'd', array('d', [point.y for point in points])),
+        ('object_x', 'd', array('d', [obj.point.x for obj in level.objects])),
+        ('object_y', 'd', array('d', [obj.point.y for obj in level.objects])),
+        ('object_type', 'I', array('I', [obj.type for obj in level.objects])),
+        ('object_gravity', 'I', array('I', [obj.gravity for obj in level.objects])),
+        ('object_animation_number', 'I', array('I', [obj.animation_number for obj in level.objects])),
+        ('picture_x', 'd', array('d', [picture.point.x for picture in level.pictures])),
+        ('picture_y', 'd', array('d', [picture.point.y for picture in level.pictures])),
+        ('picture_distance', 'I', array('I', [picture.distance for picture in level.pictures])),
+        ('picture_clipping', 'I', array('I', [picture.clipping for picture in level.pictures])),
+    ]
+    return meta, columns
+
+
+def _level_from_entry(meta: Dict[str, Any], columns: Dict[str, memoryview]) -> elma.models.Level:
+    Point = elma.models.Point
+    level = elma.models.Level()
+    level.version = meta['version']
+    level.level_id = meta['level_id']
+    level.name = meta['name']
+    level.lgr = meta['lgr']
+    level.ground_texture = meta['ground_texture']
+    level.sky_texture = meta['sky_texture']
+    level.preserve_integrity_values = meta['preserve_integrity_values']
+    level.integrity = meta['integrity']
+    level.top10.single = [elma.models.Top10Time(time, kuski, kuski2) for time, kuski, kuski2 in meta['single']]
+    level.top10.multi = [elma.models.Top10Time(time, kuski, kuski2, True) for time, kuski, kuski2 in meta['multi']]
+
+    points = list(map(Point, columns['point_x'].tolist(), columns['point_y'].tolist()))
+    start = 0
+    for size, grass in zip(columns['polygon_size'].tolist(), columns['polygon_grass'].tolist()):
+        level.polygons.append(elma.models.Polygon(points[start:start + size], grass=bool(grass)))
+        start += size
+    level.objects = [elma.models.Obj(Point(x, y), object_type, gravity=gravity, animation_number=animation_number)
+                     for x, y, object_type, gravity, animation_number
+                     in zip(columns['object_x'].tolist(), columns['object_y'].tolist(),
+                            columns['object_type'].tolist(), columns['object_gravity'].tolist(),
+                            columns['object_animation_number'].tolist())]
+    level.pictures = [elma.models.Picture(Point(x, y), picture_name=picture_name, texture_name=texture_name,
+                                          mask_name=mask_name, distance=distance, clipping=clipping)
+                      for x, y, distance, clipping, (picture_name, texture_name, mask_name)
+                      in zip(columns['picture_x'].tolist(), columns['picture_y'].tolist(),
+                             columns['picture_distance'].tolist(), columns['picture_clipping'].tolist(),
+                             meta['picture_names'])]
+    return level
+
+
+def _replay_entry(replay: elma.models.Replay, prefix: str = '') -> _Entry:
+    second_rider = replay.second_rider
+    meta: Dict[str, Any] = {prefix + 'header': {
+        'is_finished': replay.is_finished,
+        'is_multi': replay.is_multi,
+        'is_flagtag': replay.is_flagtag,
+        'level_id': replay.level_id,
+        'level_name': replay.level_name,
+        'time': replay.time,
+        'has_second_rider': second_rider is not None,
+    }}
+    columns: List[Tuple[str, str, Any]] = [
+        (prefix + name, typecode, column)
+        for (name, typecode), column in zip(FRAME_COLUMNS, replay.frame_columns())]
+    columns.extend((prefix + 'event_' + name, column.typecode, column)
+                   for name, column in zip(EventColumns._fields, event_columns(replay.events)))
+    if second_rider is not None:
+        second_meta, second_columns = _replay_entry(second_rider, prefix + 'second_rider.')
+        meta.update(second_meta)
+        columns.extend(second_columns)
+    return meta, columns
+
+
+def _replay_from_entry(meta: Dict[str, Any],
+                       columns: Dict[str, memoryview],
+                       prefix: str = '') -> elma.models.Replay:
+    header = meta[prefix + 'header']
+    replay = elma.models.Replay()
+    replay.is_finished = header['is_finished']
+    replay.is_multi = header['is_multi']
+    replay.is_flagtag = header['is_flagtag']
+    replay.level_id = header['level_id']
+    replay.level_name = header['level_name']
+    replay.time = header['time']
+    # frames stay views into the buffer until they are used
+    replay._set_frame_view(FrameColumns(*[columns[prefix + name] for name, _ in FRAME_COLUMNS]))
+    replay.events = events_from_columns(EventColumns(*[columns[prefix + 'event_' + name]
+                                                       for name in EventColumns._fields]))
+    if header['has_second_rider']:
+        replay.second_rider = _replay_from_entry(meta, columns, prefix + 'second_rider.')
+    return replay
+
+
+def _layout(item: Item) -> Tuple[bytes, int, List[Tuple[int, Any]]]:
+    """
+    Returns the header and metadata, the total size and the (offset, column)
+    pairs of the buffer of a level or replay.
+    """
+    if isinstance(item, elma.models.Level):
+        meta, columns = _level_entry(item)
+        meta['kind'] = 'level'
+    elif isinstance(item, elma.models.Replay):
+        meta, columns = _replay_entry(item)
+        meta['kind'] = 'replay'
+    else:
+        raise TypeError(f"Cannot convert {type(item)} to a buffer")
+    descriptors: List[List[Any]] = []
+    offset = 0
+    for name, typecode, column in columns:
+        descriptors.append([name, typecode, offset, len(column)])
+        offset += _aligned(len(column) * array(typecode).itemsize)
+    encoded = json.dumps(dict(meta, columns=descriptors)).encode('utf-8')
+    header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, len(encoded)) + encoded
+    header += bytes(_aligned(len(header)) - len(header))
+    placed = [(len(header) + descriptor[2], column) for descriptor, (_, _, column) in zip(descriptors, columns)]
+    return header, len(header) + offset, placed
+
+
+def _write(buffer: memoryview, header: bytes, placed: List[Tuple[int, Any]]) -> None:
+    buffer[:len(header)] = header
+    for offset, column in placed:
+        data = memoryview(column).cast('B')
+        buffer[offset:offset + len(data)] = data
+
+
+def to_buffer(item: Item) -> bytes:
+    """
+    Returns a level or replay as a flat buffer: JSON metadata followed by its
+    columns as aligned raw arrays in the machine's native byte order. Replay
+    frames are stored with the precision of replay files.
+    """
+    header, size, placed = _layout(item)
+    buffer = bytearray(size)
+    _write(memoryview(buffer), header, placed)
+    return bytes(buffer)
+
+
+def from_buffer(buffer: Union[bytes, bytearray, memoryview, Any]) -> Item:
+    """
+    Returns the level or replay of a buffer written by to_buffer. Replay
+    frames are views into the buffer until they are used, so the buffer must
+    not be changed or released while the replay is in use.
+
+    Raises:
+        ValueError: if the buffer is not a level or replay buffer of this
+            version of elma
+    """
+    view = memoryview(buffer).cast('B')
+    magic, version, meta_length = _HEADER.unpack_from(view)
+    if magic != _MAGIC or version != _FORMAT_VERSION:
+        raise ValueError(f"Not a level or replay buffer of format version {_FORMAT_VERSION}")
+    meta = json.loads(bytes(view[_HEADER.size:_HEADER.size + meta_length]))
+    data_start = _aligned(_HEADER.size + meta_length)
+    columns = {}
+    for name, typecode, offset, count in meta['columns']:
+        start = data_start + offset
+        stop = start + count * array(typecode).itemsize
+        if stop > len(view):
+            raise ValueError("Level or replay buffer is truncated")
+        columns[name] = view[start:stop].cast(typecode)
+    if meta['kind'] == 'level':
+        return _level_from_entry(meta, columns)
+    return _replay_from_entry(meta, columns)
+
+
+def to_shared_memory(item: Item, name: Optional[str] = None) -> SharedMemory:
+    """
+    Writes a level or replay into a new block of shared memory as a buffer of
+    to_buffer, without copying it to an intermediate buffer first.
+
+    The caller owns the block, and must close and unlink it when the
+    receiving processes are done with it.
+
+    Args:
+        item: level or replay to write
+        name: name of the block, or None for a unique name
+
+    Returns:
+        The SharedMemory block. Pass its name to other processes.
+    """
+    from multiprocessing.shared_memory import SharedMemory
+    header, size, placed = _layout(item)
+    shm = SharedMemory(name=name, create=True, size=size)
+    assert shm.buf is not None
+    _write(shm.buf, header, placed)
+    return shm
+
+
+# serializes the replacement of resource_tracker.register in
+# attach_shared_memory
+_register_lock = threading.Lock()
+
+
+def attach_shared_memory(name: str) -> SharedMemory:
+    """
+    Opens a block of shared memory created by to_shared_memory in another
+    process, without registering it with this process' resource tracker, so
+    it is not unlinked when this process exits.
+
+    Before Python 3.13, if this process may share its resource tracker with
+    the creating process, as workers started by multiprocessing do, the
+    registration is skipped by briefly replacing the process-wide
+    resource_tracker.register. Shared memory created or opened by other
+    threads at the same time is then not registered either, so do not call
+    this while other threads use shared memory.
+    """
+    from multiprocessing import resource_tracker
+    from multiprocessing.shared_memory import SharedMemory
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+    if os.name != 'posix':
+        # shared memory is only tracked on POSIX
+        return SharedMemory(name=name)
+    if getattr(resource_tracker._resource_tracker, '_fd', None) is None:
+        # no tracker is running or inherited, so registering starts one that
+        # only this process uses and the registration can be dropped again
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')  # type: ignore[attr-defined]
+        return shm
+    # unregistering would also drop the registration of the creating process
+    # if the tracker is shared with it, so skip the registration instead
+    with _register_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def from_shared_memory(shm: SharedMemory) -> Item:
+    """
+    Returns the level or replay of a block of shared memory written by
+    to_shared_memory. Replay frames are views into the block, so it must
+    stay open while the replay is in use::
+
+        shm = attach_shared_memory(name)
+        replay = from_shared_memory(shm)
+        ...
+        del replay
+        shm.close()
+    """
+    assert shm.buf is not None
+    return from_buffer(shm.buf)
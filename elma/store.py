@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import itertools
+import lzma
+import os
+import struct
+import zlib
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+import elma.models
+from elma.columns import FRAME_COLUMNS
+from elma.packing import pack_replay, unpack_replay
+from elma.utils import read_file
+
+__all__ = ["ReplayStore"]
+
+_MAGIC = b'ELMAREC1'
+_INDEX_MAGIC = b'ELMAIDX1'
+# magic and compression
+_HEADER = struct.Struct('<8sB7x')
+# index offset, index length and magic
+_TRAILER = struct.Struct('<QQ8s')
+# record offset, record length and id length, followed by the id
+_INDEX_ENTRY = struct.Struct('<QIH')
+# number of rider sections and length of trailing bytes of a record
+_RECORD_HEADER = struct.Struct('<BI')
+
+_REPLAY_HEADER_SIZE = 36
+_EVENT_SIZE = 16
+
+_COMPRESSIONS = {'zlib': 0, 'lzma': 1}
+
+# size of the blocks read when searching backwards for the last index
+_SEARCH_BLOCK = 1 << 20
+
+# frame columns are delta encoded as unsigned integers of the same size, so
+# float positions are encoded losslessly through their bit patterns
+_UNSIGNED = {'f': 'I', 'h': 'H', 'B': 'B'}
+_COLUMN_CODES = [_UNSIGNED[typecode] for _, typecode in FRAME_COLUMNS]
+
+
+def _encode_column(raw: Union[bytes, memoryview], typecode: str) -> bytes:
+    """
+    Delta encodes a column and splits it into byte planes, the first bytes of
+    all values followed by the second bytes and so on, which compress well
+    when consecutive values are close.
+    """
+    values = array(typecode)
+    values.frombytes(raw)
+    mask = (1 << (8 * values.itemsize)) - 1
+    deltas = array(typecode, values[:1])
+    deltas.extend([(b - a) & mask for a, b in zip(values, values[1:])])
+    data = deltas.tobytes()
+    return b''.join([data[i::values.itemsize] for i in range(values.itemsize)])
+
+
+def _decode_column(planes: bytes, typecode: str) -> bytes:
+    size = array(typecode).itemsize
+    count = len(planes) // size
+    data = bytearray(len(planes))
+    for i in range(size):
+        data[i::size] = planes[i * count:(i + 1) * count]
+    mask = (1 << (8 * size)) - 1
+    deltas = array(typecode)
+    deltas.frombytes(data)
+    return array(typecode, itertools.accumulate(deltas, lambda a, b: (a + b) & mask)).tobytes()
+
+
+def _section_length(data: memoryview, offset: int) -> int:
+    """
+    Returns the length of the rider section of a packed replay at offset.
+
+    Raises:
+        ValueError: if the data ends within the section.
+    """
+    if offset + _REPLAY_HEADER_SIZE > len(data):
+        raise ValueError("Replay data ends in the middle of the header")
+    frames = struct.unpack_from('<i', data, offset)[0]
+    events_offset = offset + _REPLAY_HEADER_SIZE + frames * sum(struct.calcsize(code) for code in _COLUMN_CODES)
+    if frames < 0 or events_offset + 4 > len(data):
+        raise ValueError("Replay data ends in the middle of the frames")
+    events = struct.unpack_from('<i', data, events_offset)[0]
+    end = events_offset + 4 + events * _EVENT_SIZE + 4
+    if events < 0 or end > len(data):
+        raise ValueError("Replay data ends in the middle of the events")
+    return end - offset
+
+
+def _encode_replay(packed: bytes) -> bytes:
+    """
+    Encodes a packed replay as its rider sections with delta encoded frame
+    columns, followed by any trailing bytes, so it can be restored byte for
+    byte.
+    """
+    data = memoryview(packed).cast('B')
+    parts: List[Union[bytes, memoryview]] = []
+    offset = 0
+    sections = 0
+    # a multiplayer replay has a second section for the second rider
+    while sections == 0 or (sections == 1 and offset < len(data) and struct.unpack_from('<i', data, 8)[0]):
+        length = _section_length(data, offset)
+        frames = struct.unpack_from('<i', data, offset)[0]
+        parts.append(data[offset:offset + _REPLAY_HEADER_SIZE])
+        column_offset = offset + _REPLAY_HEADER_SIZE
+        for code in _COLUMN_CODES:
+            size = struct.calcsize(code) * frames
+            parts.append(_encode_column(data[column_offset:column_offset + size], code))
+            column_offset += size
+        parts.append(data[column_offset:offset + length])
+        offset += length
+        sections += 1
+    return _RECORD_HEADER.pack(sections, len(data) - offset) + b''.join(parts) + data[offset:]
+
+
+def _decode_replay(record: bytes) -> bytes:
+    sections, trailing = _RECORD_HEADER.unpack_from(record, 0)
+    offset = _RECORD_HEADER.size
+    parts = []
+    for _ in range(sections):
+        header = record[offset:offset + _REPLAY_HEADER_SIZE]
+        frames = struct.unpack_from('<i', header, 0)[0]
+        parts.append(header)
+        offset += _REPLAY_HEADER_SIZE
+        for code in _COLUMN_CODES:
+            size = struct.calcsize(code) * frames
+            parts.append(_decode_column(record[offset:offset + size], code))
+            offset += size
+        events = struct.unpack_from('<i', record, offset)[0]
+        size = 4 + events * _EVENT_SIZE + 4
+        parts.append(record[offset:offset + size])
+        offset += size
+    parts.append(record[offset:offset + trailing])
+    return b''.join(parts)
+
+
+class ReplayStore(object):
+    """
+    Container file of many replays, each stored with its frame columns delta
+    encoded and compressed with zlib or lzma. An index at the end of the file
+    maps replay ids to their records for random access. Replays are restored
+    byte for byte, including files with nonstandard headers.
+
+    Replays can be added to an existing store. They are written after its
+    last index, and a new index is written after them when the store is
+    flushed or closed, which commits them. If a store is not closed, opening
+    it finds the last committed index, so only the replays added since the
+    last flush are lost.
+
+    Usage::
+
+        with ReplayStore('replays.elst', 'a') as store:
+            store.add_file('myreplay.rec')
+        with ReplayStore('replays.elst') as store:
+            replay = store.get('myreplay.rec')
+
+    Attributes:
+        path (Path): Path of the store file.
+        mode (str): 'r' to read, 'a' to read and add replays, creating the
+            file if it does not exist, or 'w' to create a new empty store.
+        compression (str): 'zlib' or 'lzma'. Compression of a store is fixed
+            when it is created.
+    """
+    def __init__(self, path: Union[str, Path], mode: str = 'r', compression: str = 'zlib') -> None:
+        if mode not in ('r', 'a', 'w'):
+            raise ValueError(f"Invalid mode {mode}")
+        if compression not in _COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression}")
+        self.path = Path(path)
+        self.mode = mode
+        self.compression = compression
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._file: BinaryIO
+        self._modified = False
+        if mode == 'w' or (mode == 'a' and not self.path.exists()):
+            self._file = open(self.path, 'w+b')
+            self._file.write(_HEADER.pack(_MAGIC, _COMPRESSIONS[compression]))
+            self._end = self._file.tell()
+            self._modified = True
+            return
+        self._file = open(self.path, 'rb' if mode == 'r' else 'r+b')
+        try:
+            self._read_index()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _read_index(self) -> None:
+        header = self._file.read(_HEADER.size)
+        if len(header) < _HEADER.size or self.path.stat().st_size < _HEADER.size + _TRAILER.size:
+            raise ValueError(f"{self.path} is not a replay store")
+        magic, compression = _HEADER.unpack(header)
+        if magic != _MAGIC or compression not in _COMPRESSIONS.values():
+            raise ValueError(f"{self.path} is not a replay store")
+        self.compression = {value: key for key, value in _COMPRESSIONS.items()}[compression]
+        found = self._find_index()
+        if found is None:
+            raise ValueError(f"{self.path} has no index, it may not have been closed")
+        index, self._end = found
+        offset = 0
+        while offset < len(index):
+            record_offset, record_length, id_length = _INDEX_ENTRY.unpack_from(index, offset)
+            offset += _INDEX_ENTRY.size
+            self._index[index[offset:offset + id_length].decode('utf-8')] = (record_offset, record_length)
+            offset += id_length
+
+    def _find_index(self) -> Optional[Tuple[bytes, int]]:
+        """
+        Searches backwards from the end of the file for the last trailer that
+        follows its index, skipping records of replays that were added but
+        not committed.
+
+        Returns:
+            The decompressed index and the offset after its trailer, or None
+            if the file has no index.
+        """
+        end = self._file.seek(0, os.SEEK_END)
+        while end - _HEADER.size >= _TRAILER.size:
+            start = max(_HEADER.size, end - _SEARCH_BLOCK)
+            self._file.seek(start)
+            block = self._file.read(end - start)
+            position = block.rfind(_INDEX_MAGIC)
+            while position >= 0:
+                trailer_offset = start + position + len(_INDEX_MAGIC) - _TRAILER.size
+                if trailer_offset >= _HEADER.size:
+                    self._file.seek(trailer_offset)
+                    index_offset, index_length, _ = _TRAILER.unpack(self._file.read(_TRAILER.size))
+                    if index_offset >= _HEADER.size and index_offset + index_length == trailer_offset:
+                        self._file.seek(index_offset)
+                        try:
+                            return zlib.decompress(self._file.read(index_length)), trailer_offset + _TRAILER.size
+                        except zlib.error:
+                            pass
+                position = block.rfind(_INDEX_MAGIC, 0, position + len(_INDEX_MAGIC) - 1)
+            if start == _HEADER.size:
+                break
+            # blocks overlap so that a magic split between them is found
+            end = start + len(_INDEX_MAGIC) - 1
+        return None
+
+    def __enter__(self) -> ReplayStore:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, replay_id: object) -> bool:
+        return replay_id in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._index))
+
+    def __getitem__(self, replay_id: str) -> elma.models.Replay:
+        return self.get(replay_id)
+
+    def __repr__(self) -> str:
+        return 'ReplayStore(path: %s, replays: %s, compression: %s)' % (self.path, len(self), self.compression)
+
+    def ids(self) -> List[str]:
+        """
+        Returns the ids of the replays in the order they were added.
+        """
+        return list(self._index)
+
+    def add(self, replay_id: str, replay: Union[elma.models.Replay, bytes, bytearray, memoryview]) -> None:
+        """
+        Adds a replay, given as a Replay or packed as in a .rec file.
+
+        Raises:
+            KeyError: if a replay with the id is already in the store.
+            ValueError: if the packed replay is truncated.
+            io.UnsupportedOperation: if the store is opened for reading.
+        """
+        if replay_id in self._index:
+            raise KeyError(f"Replay {replay_id} is already in the store")
+        if isinstance(replay, elma.models.Replay):
+            replay = pack_replay(replay)
+        record = _encode_replay(bytes(replay))
+        if self.compression == 'lzma':
+            record = lzma.compress(record)
+        else:
+            record = zlib.compress(record, 9)
+        self._file.seek(self._end)
+        self._file.write(record)
+        self._index[replay_id] = (self._end, len(record))
+        self._end += len(record)
+        self._modified = True
+
+    def add_file(self, file: Union[str, Path], replay_id: Optional[str] = None) -> str:
+        """
+        Adds a replay file, with its file name as the id by default.
+
+        Returns:
+            The id of the replay.
+        """
+        replay_id = replay_id if replay_id is not None else Path(file).name
+        self.add(replay_id, read_file(file))
+        return replay_id
+
+    def get_bytes(self, replay_id: str) -> bytes:
+        """
+        Returns a replay packed exactly as the file or bytes it was added
+        from.
+
+        Raises:
+            KeyError: if there is no replay with the id.
+        """
+        offset, length = self._index[replay_id]
+        self._file.seek(offset)
+        record = self._file.read(length)
+        if self.compression == 'lzma':
+            return _decode_replay(lzma.decompress(record))
+        return _decode_replay(zlib.decompress(record))
+
+    def get(self, replay_id: str) -> elma.models.Replay:
+        """
+        Returns an unpacked replay.
+
+        Raises:
+            KeyError: if there is no replay with the id.
+        """
+        return unpack_replay(self.get_bytes(replay_id))
+
+    def flush(self) -> None:
+        """
+        Writes the index after the records, committing the added replays.
+        Replays added later are written after it, so it stays valid until
+        the next flush.
+        """
+        if not self._modified:
+            return
+        entries = []
+        for replay_id, (offset, length) in self._index.items():
+            encoded = replay_id.encode('utf-8')
+            entries.append(_INDEX_ENTRY.pack(offset, length, len(encoded)) + encoded)
+        index = zlib.compress(b''.join(entries))
+        self._file.seek(self._end)
+        self._file.write(index)
+        self._file.write(_TRAILER.pack(self._end, len(index), _INDEX_MAGIC))
+        self._file.truncate()
+        self._file.flush()
+        self._end = self._file.tell()
+        self._modified = False
+
+    def close(self) -> None:
+        """
+        Flushes and closes the store.
+        """
+        if self._file.closed:
+            return
+        if self.mode != 'r':
+            self.flush()
+        self._file.close()
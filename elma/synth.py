@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+import math
+import os
+import random
+import struct
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import elma.models
+from elma.columns import FRAME_COLUMNS, FRAMES_PER_SECOND, FULL_ROTATION, FrameColumns
+from elma.constants import END_OF_DATA_MARKER
+from elma.constants import END_OF_FILE_MARKER
+from elma.constants import END_OF_REPLAY_FILE_MARKER
+from elma.constants import EVENT_TIME_UNIT
+from elma.packing import integrity_values, pack_level, pack_level_header, pack_replay, pack_replay_header
+from elma.utils import crypt_top10
+
+__all__ = ["random_level", "write_level", "random_replay", "write_replay", "write_corpus"]
+
+#: Side of the grid cell of each island of a synthetic level in level units
+CELL_SIZE = 10.0
+
+# largest island radius relative to CELL_SIZE, which keeps islands clear of
+# the cell corners where the objects are placed
+_ISLAND_RADIUS = 0.4
+# largest depth of the bumps on the bottom edge of the outer polygon relative
+# to CELL_SIZE
+_BUMP_DEPTH = 0.25
+# offset of the objects from their cell corner relative to CELL_SIZE
+_OBJECT_JITTER = 0.1
+
+# bike geometry of synthetic replays in level units: wheel and head positions
+# relative to the kuski and the wheel radius
+_LEFT_WHEEL = (-0.85, -0.6)
+_RIGHT_WHEEL = (0.85, -0.6)
+_HEAD = (-0.03, 0.44)
+_WHEEL_RADIUS = 0.4
+_RIDE_HEIGHT = 1.0
+# motion of synthetic replays in level units and seconds
+_GRAVITY = 10.0
+_ACCELERATION = 8.0
+_DRAG = 0.4
+_TOP_SPEED = 20.0
+_VOLT_SPIN = 3.0
+_TURN_RATE = 0.2
+_VOLT_RATE = 0.5
+_LANDING_SPEED = 2.0
+_GROUND_TOUCH_RATE = 3.0
+
+#: Number of replay frames generated at a time by write_replay
+CHUNK_FRAMES = 4096
+
+
+class _Layout(NamedTuple):
+    islands: int
+    holes: int
+    columns: int
+    rows: int
+    vertex_counts: List[int]
+    frame_bumps: int
+
+
+def _layout(polygons: int, vertices: int, objects: int) -> _Layout:
+    """
+    Returns how the polygons, vertices and objects of a synthetic level are
+    arranged: the polygons other than the outer one are islands in a grid of
+    cells, the first ones with a hole inside, and the objects are placed at
+    the corners of the cells.
+    """
+    if polygons < 1:
+        raise ValueError("A level needs at least one polygon")
+    if objects < 2:
+        raise ValueError("A level needs at least a start and a flower")
+    inner = polygons - 1
+    if vertices < 4 + 3 * inner:
+        raise ValueError(f"{vertices} vertices are not enough for {polygons} polygons")
+    islands = (inner + 1) // 2
+    columns = max(1, math.ceil(math.sqrt(max(islands, objects))))
+    rows = max(1, math.ceil(islands / columns), math.ceil(objects / (columns + 1)) - 1)
+    if inner:
+        count, remainder = divmod(vertices - 4, inner)
+        vertex_counts = [count + (i < remainder) for i in range(inner)]
+        frame_bumps = 0
+    else:
+        vertex_counts = []
+        frame_bumps = vertices - 4
+    return _Layout(islands, inner - islands, columns, rows, vertex_counts, frame_bumps)
+
+
+def _star(rng: random.Random, cx: float, cy: float, n: int, radius: float) -> List[elma.models.Point]:
+    """
+    Returns the vertices of a random polygon that is star-shaped around
+    (cx, cy), with a smoothly varying distance between radius / 2 and radius
+    from the center.
+    """
+    harmonics = [(rng.uniform(0.2, 1), rng.randint(1, 6), rng.uniform(0, 2 * math.pi)) for _ in range(3)]
+    total = sum(amplitude for amplitude, _, _ in harmonics)
+    points = []
+    for i in range(n):
+        # jitter keeps the angles increasing, so the polygon is simple
+        angle = 2 * math.pi * (i + 0.5 + 0.4 * (rng.random() - 0.5)) / n
+        wave = sum(amplitude * math.sin(k * angle + phase) for amplitude, k, phase in harmonics) / total
+        r = radius * (0.75 + 0.25 * wave)
+        points.append(elma.models.Point(cx + r * math.cos(angle), cy + r * math.sin(angle)))
+    return points
+
+
+def _clearance(cx: float, cy: float, points: List[elma.models.Point]) -> float:
+    """
+    Returns the distance from (cx, cy) to the nearest edge of a polygon.
+    """
+    clearance = float('inf')
+    for p, q in zip(points, points[1:] + points[:1]):
+        dx, dy = q.x - p.x, q.y - p.y
+        t = max(0.0, min(1.0, ((cx - p.x) * dx + (cy - p.y) * dy) / (dx * dx + dy * dy)))
+        clearance = min(clearance, math.hypot(p.x + t * dx - cx, p.y + t * dy - cy))
+    return clearance
+
+
+def _polygons(rng: random.Random, layout: _Layout) -> Iterator[elma.models.Polygon]:
+    """
+    Yields the polygons of a synthetic level: the outer polygon around the
+    grid, then an island in each cell, each followed by its hole if it has
+    one. Holes fit inside the largest circle around the center of their
+    island, so no two polygons intersect.
+    """
+    left, top = -CELL_SIZE / 2, -CELL_SIZE / 2
+    right, bottom = (layout.columns + 0.5) * CELL_SIZE, (layout.rows + 0.5) * CELL_SIZE
+    frame = [elma.models.Point(left, top), elma.models.Point(right, top), elma.models.Point(right, bottom)]
+    for i in range(layout.frame_bumps, 0, -1):
+        x = left + (right - left) * i / (layout.frame_bumps + 1)
+        frame.append(elma.models.Point(x, bottom + rng.uniform(0, _BUMP_DEPTH * CELL_SIZE)))
+    frame.append(elma.models.Point(left, bottom))
+    yield elma.models.Polygon(frame)
+
+    counts = iter(layout.vertex_counts)
+    for island in range(layout.islands):
+        row, column = divmod(island, layout.columns)
+        cx, cy = (column + 0.5) * CELL_SIZE, (row + 0.5) * CELL_SIZE
+        points = _star(rng, cx, cy, next(counts), _ISLAND_RADIUS * CELL_SIZE)
+        # islands are wound the other way round than the outer polygon and
+        # the holes, so they are filled with ground
+        yield elma.models.Polygon(points[::-1])
+        if island < layout.holes:
+            yield elma.models.Polygon(_star(rng, cx, cy, next(counts), 0.9 * _clearance(cx, cy, points)))
+
+
+def _objects(rng: random.Random, layout: _Layout, objects: int, killers: float) -> List[elma.models.Obj]:
+    """
+    Returns the objects of a synthetic level at random cell corners, which
+    are in open space: a start, a flower, and apples and killers.
+    """
+    corners = [(column, row) for row in range(layout.rows + 1) for column in range(layout.columns + 1)]
+    rng.shuffle(corners)
+    result = []
+    for i, (column, row) in enumerate(corners[:objects]):
+        if i == 0:
+            obj_type = elma.models.Obj.START
+        elif i == 1:
+            obj_type = elma.models.Obj.FLOWER
+        else:
+            obj_type = elma.models.Obj.KILLER if rng.random() < killers else elma.models.Obj.FOOD
+        jitter = _OBJECT_JITTER * CELL_SIZE
+        point = elma.models.Point(column * CELL_SIZE + rng.uniform(-jitter, jitter),
+                                  row * CELL_SIZE + rng.uniform(-jitter, jitter))
+        result.append(elma.models.Obj(point, obj_type))
+    return result
+
+
+def _empty_level(rng: random.Random) -> elma.models.Level:
+    level = elma.models.Level()
+    level.level_id = rng.randint(0, (2 ** 32) - 1)
+    level.name = 'Synthetic level %08X' % level.level_id
+    return level
+
+
+def random_level(seed: Any = None,
+                 polygons: int = 100,
+                 vertices: int = 10000,
+                 objects: int = 100,
+                 killers: float = 0.2) -> elma.models.Level:
+    """
+    Generates a random level. The polygons are an outer polygon with islands
+    inside, some of which have holes, and none of them intersect. The objects
+    are placed in open space between the islands.
+
+    Args:
+        seed: Seed of the random number generator. The same seed and sizes
+            give the same level.
+        polygons: Number of polygons, including the outer polygon.
+        vertices: Total number of vertices of the polygons.
+        objects: Number of objects, including the start and the flower.
+        killers: Share of killers among the objects other than the start
+            and the flower, the rest are apples.
+
+    Returns:
+        The generated Level.
+
+    Raises:
+        ValueError: if there are too few vertices for the polygons or fewer
+            than two objects.
+    """
+    layout = _layout(polygons, vertices, objects)
+    rng = random.Random(seed)
+    level = _empty_level(rng)
+    level.polygons = list(_polygons(rng, layout))
+    level.objects = _objects(rng, layout, objects, killers)
+    return level
+
+
+def write_level(file: Union[str, Path],
+                seed: Any = None,
+                polygons: int = 100,
+                vertices: int = 10000,
+                objects: int = 100,
+                killers: float = 0.2) -> None:
+    """
+    Generates a random level like random_level and writes it to a file one
+    polygon at a time, so levels of any size are written in bounded memory.
+    The integrity values are written last, once the coordinates are summed.
+    """
+    layout = _layout(polygons, vertices, objects)
+    rng = random.Random(seed)
+    level = _empty_level(rng)
+    # summed like pack_level, so the integrity values match bit for bit
+    polygon_checksum = object_checksum = 0.0
+    with open(file, 'wb') as f:
+        # the integrity values follow the version and the level id
+        integrity_offset = f.tell() + len(level.version) + 6
+        f.write(pack_level_header(level, (0, 0, 0, 0)))
+        f.write(struct.pack('d', polygons + 0.4643643))
+        for polygon in _polygons(rng, layout):
+            polygon_checksum += sum([point.x + point.y for point in polygon.points])
+            f.write(pack_level(polygon))
+        f.write(struct.pack('d', objects + 0.4643643))
+        for obj in _objects(rng, layout, objects, killers):
+            object_checksum += obj.point.x + obj.point.y + obj.type
+            f.write(pack_level(obj))
+        # no pictures
+        f.write(struct.pack('d', 0.2345672))
+        f.write(struct.pack('I', END_OF_DATA_MARKER))
+        f.write(crypt_top10(level.top10.to_buffer()))
+        f.write(struct.pack('I', END_OF_FILE_MARKER))
+        f.seek(integrity_offset)
+        f.write(struct.pack('4d', *integrity_values(polygon_checksum + object_checksum + 0, rng)))
+
+
+class _ReplayPlan(NamedTuple):
+    frames: int
+    level_id: int
+    start: Tuple[float, float]
+    flower: Optional[int]
+    apples: List[int]
+
+
+def _plan(rng: random.Random, seconds: float, level: Optional[elma.models.Level]) -> _ReplayPlan:
+    if seconds <= 0:
+        raise ValueError(f"Non-positive replay length {seconds}")
+    frames = max(1, round(seconds * FRAMES_PER_SECOND))
+    if level is None:
+        return _ReplayPlan(frames, rng.randint(0, (2 ** 32) - 1), (0.0, 0.0), None, [])
+    start = (0.0, 0.0)
+    flower = None
+    apples = []
+    for i, obj in enumerate(level.objects):
+        if obj.type == elma.models.Obj.START:
+            # replay y coordinates point up, level y coordinates down
+            start = (obj.point.x, -obj.point.y)
+        elif obj.type == elma.models.Obj.FLOWER and flower is None:
+            flower = i
+        elif obj.type == elma.models.Obj.FOOD:
+            apples.append(i)
+    return _ReplayPlan(frames, level.level_id, start, flower, apples)
+
+
+def _frame_chunks(rng: random.Random, plan: _ReplayPlan, events: List[elma.models.Event],
+                  chunk_frames: int = CHUNK_FRAMES) -> Iterator[FrameColumns]:
+    """
+    Yields the frames of a synthetic replay as FrameColumns of up to
+    chunk_frames frames, and appends the turn, volt and ground touch events
+    to events.
+
+    The bike rides over rolling terrain that is independent of the level: it
+    accelerates while gasing up to a top speed, falls under gravity when the
+    terrain drops away, leans with the slope on the ground and spins when
+    volting in the air.
+    """
+    dt = 1 / FRAMES_PER_SECOND
+    terrain = [(rng.uniform(0.5, 2), rng.uniform(0.05, 0.2), rng.uniform(0, 2 * math.pi)) for _ in range(3)]
+
+    def height(x: float) -> float:
+        return sum(amplitude * math.sin(frequency * x + phase) for amplitude, frequency, phase in terrain)
+
+    def slope(x: float) -> float:
+        return sum(amplitude * frequency * math.cos(frequency * x + phase)
+                   for amplitude, frequency, phase in terrain)
+
+    x = plan.start[0]
+    y = plan.start[1]
+    offset = y - height(x) - _RIDE_HEIGHT
+    vx = vy = angle = spin = wheel_angle = 0.0
+    is_turned_right = True
+    is_gasing = False
+    in_air = False
+    next_gas_change = 0
+
+    def relative(point: Tuple[float, float], direction: int) -> Tuple[int, int]:
+        px, py = point[0] * direction, point[1]
+        return (round(1000 * (px * math.cos(angle) - py * math.sin(angle))),
+                round(1000 * (px * math.sin(angle) + py * math.cos(angle))))
+
+    for chunk_start in range(0, plan.frames, chunk_frames):
+        columns = FrameColumns(*[array(typecode) for _, typecode in FRAME_COLUMNS])
+        for i in range(chunk_start, min(plan.frames, chunk_start + chunk_frames)):
+            event_time = i * dt / EVENT_TIME_UNIT
+            if i >= next_gas_change:
+                is_gasing = rng.random() < 0.7
+                next_gas_change = i + rng.randint(15, 90)
+            if rng.random() < _TURN_RATE * dt:
+                is_turned_right = not is_turned_right
+                turn = elma.models.TurnEvent()
+                turn.time = event_time
+                events.append(turn)
+            if rng.random() < _VOLT_RATE * dt:
+                volt = rng.choice([elma.models.LeftVoltEvent, elma.models.RightVoltEvent])()
+                volt.time = event_time
+                events.append(volt)
+                spin += _VOLT_SPIN if isinstance(volt, elma.models.LeftVoltEvent) else -_VOLT_SPIN
+            direction = 1 if is_turned_right else -1
+
+            vx += ((_ACCELERATION * direction if is_gasing else 0) - _DRAG * vx) * dt
+            vx = max(-_TOP_SPEED, min(_TOP_SPEED, vx))
+            vy -= _GRAVITY * dt
+            x += vx * dt
+            y += vy * dt
+            ground = height(x) + offset + _RIDE_HEIGHT
+            if y <= ground:
+                if (in_air and vy < -_LANDING_SPEED) or rng.random() < _GROUND_TOUCH_RATE * dt:
+                    touch = elma.models.GroundTouchEvent()
+                    touch.time = event_time
+                    touch.event_sound_volume = min(0.99, 0.1 + math.hypot(vx, vy) / (2 * _TOP_SPEED))
+                    events.append(touch)
+                in_air = False
+                y = ground
+                vy = slope(x) * vx
+                speed = math.hypot(vx, vy)
+                if speed > _TOP_SPEED:
+                    vx, vy = vx * _TOP_SPEED / speed, vy * _TOP_SPEED / speed
+                angle += (math.atan(slope(x)) - angle) * 0.3
+                spin = 0.0
+            else:
+                in_air = True
+                angle += spin * dt
+                spin *= 0.98
+            wheel_angle += vx * dt / _WHEEL_RADIUS
+
+            left_wheel = relative(_LEFT_WHEEL, direction)
+            right_wheel = relative(_RIGHT_WHEEL, direction)
+            head = relative(_HEAD, direction)
+            columns.x.append(x)
+            columns.y.append(y)
+            columns.left_wheel_x.append(left_wheel[0])
+            columns.left_wheel_y.append(left_wheel[1])
+            columns.right_wheel_x.append(right_wheel[0])
+            columns.right_wheel_y.append(right_wheel[1])
+            columns.head_x.append(head[0])
+            columns.head_y.append(head[1])
+            columns.rotation.append(round(angle / (2 * math.pi) * FULL_ROTATION) % FULL_ROTATION)
+            columns.left_wheel_rotation.append(round(-wheel_angle * 249 / (2 * math.pi)) % 250)
+            columns.right_wheel_rotation.append(round(-wheel_angle * 249 / (2 * math.pi) + 31) % 250)
+            columns.gas_and_turn_state.append(is_gasing | (is_turned_right << 1))
+            columns.spring_sound_effect_volume.append(0)
+        yield columns
+
+
+def _finish_events(rng: random.Random, plan: _ReplayPlan, finished: bool,
+                   events: List[elma.models.Event]) -> Tuple[List[elma.models.Event], bool, float]:
+    """
+    Adds the apple touches spread over the replay and the flower touch at its
+    end to the events.
+
+    Returns:
+        The events in time order, whether the replay is finished, and its
+        time in seconds.
+    """
+    end = (plan.frames - 0.5) / FRAMES_PER_SECOND
+    for apple in plan.apples if finished else []:
+        time = rng.uniform(0, end) / EVENT_TIME_UNIT
+        touch = elma.models.ObjectTouchEvent()
+        touch.time = time
+        touch.object_number = apple
+        events.append(touch)
+        event = elma.models.AppleTouchEvent()
+        event.time = time
+        events.append(event)
+    events.sort(key=lambda e: e.time)
+    if not finished:
+        return events, False, plan.frames / FRAMES_PER_SECOND
+    touch = elma.models.ObjectTouchEvent()
+    touch.time = end / EVENT_TIME_UNIT
+    touch.object_number = plan.flower or 0
+    events.append(touch)
+    return events, True, touch.time * EVENT_TIME_UNIT
+
+
+def _empty_replay(plan: _ReplayPlan, level_name: str) -> elma.models.Replay:
+    replay = elma.models.Replay()
+    replay.level_id = plan.level_id
+    replay.level_name = level_name
+    return replay
+
+
+def random_replay(seed: Any = None,
+                  seconds: float = 60.0,
+                  level: Optional[elma.models.Level] = None,
+                  level_name: str = 'SYNTH.LEV',
+                  finished: bool = True) -> elma.models.Replay:
+    """
+    Generates a random replay of a bike riding over rolling terrain, with
+    turns, volts and ground touches. The motion is physically plausible, but
+    does not follow the polygons of the level.
+
+    Args:
+        seed: Seed of the random number generator. The same seed and
+            arguments give the same replay.
+        seconds: Length of the replay in seconds.
+        level: Optional level the replay is of. The bike starts at its start
+            object, and a finished replay touches all of its apples and then
+            its flower.
+        level_name: File name of the level stored in the replay.
+        finished: Whether the replay ends with touching the flower.
+
+    Returns:
+        The generated Replay.
+
+    Raises:
+        ValueError: if seconds is not positive.
+    """
+    rng = random.Random(seed)
+    plan = _plan(rng, seconds, level)
+    events: List[elma.models.Event] = []
+    columns = FrameColumns(*[array(typecode) for _, typecode in FRAME_COLUMNS])
+    for chunk in _frame_chunks(rng, plan, events):
+        for column, part in zip(columns, chunk):
+            column.extend(part)
+    replay = _empty_replay(plan, level_name)
+    replay._set_frame_view(columns)
+    replay.events, replay.is_finished, replay.time = _finish_events(rng, plan, finished, events)
+    return replay
+
+
+def write_replay(file: Union[str, Path],
+                 seed: Any = None,
+                 seconds: float = 60.0,
+                 level: Optional[elma.models.Level] = None,
+                 level_name: str = 'SYNTH.LEV',
+                 finished: bool = True) -> None:
+    """
+    Generates a random replay like random_replay and writes it to a file.
+    Frames are generated in chunks of CHUNK_FRAMES and each chunk is written
+    into every column of the file, so replays of any length are written in
+    bounded memory.
+    """
+    rng = random.Random(seed)
+    plan = _plan(rng, seconds, level)
+    replay = _empty_replay(plan, level_name)
+    header = pack_replay_header(replay, plan.frames)
+    sizes = [struct.calcsize(typecode) for _, typecode in FRAME_COLUMNS]
+    offsets = [len(header) + plan.frames * sum(sizes[:i]) for i in range(len(sizes))]
+    events: List[elma.models.Event] = []
+    with open(file, 'wb') as f:
+        f.write(header)
+        written = 0
+        for chunk in _frame_chunks(rng, plan, events):
+            for column, offset, size in zip(chunk, offsets, sizes):
+                f.seek(offset + written * size)
+                f.write(column.tobytes())
+            written += len(chunk.x)
+        events, _, _ = _finish_events(rng, plan, finished, events)
+        f.seek(len(header) + plan.frames * sum(sizes))
+        f.write(struct.pack('I', len(events)))
+        for event in events:
+            f.write(pack_replay(event))
+        f.write(struct.pack('I', END_OF_REPLAY_FILE_MARKER))
+
+
+def write_corpus(directory: Union[str, Path],
+                 levels: int = 0,
+                 replays: int = 0,
+                 seed: Any = None,
+                 level_options: Optional[Dict[str, Any]] = None,
+                 replay_options: Optional[Dict[str, Any]] = None) -> List[Path]:
+    """
+    Writes random levels and replays to a directory, one file at a time, so
+    corpora of any size are written in bounded memory.
+
+    Args:
+        directory: Directory to write the files to, which is created if it
+            does not exist.
+        levels: Number of levels, written as synth00000.lev and so on.
+        replays: Number of replays, written as synth00000.rec and so on.
+        seed: Seed of the random number generator that seeds each file.
+        level_options: Keyword arguments of write_level, e.g. vertices.
+        replay_options: Keyword arguments of write_replay, e.g. seconds.
+
+    Returns:
+        The paths of the written files.
+    """
+    directory = Path(directory)
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(levels):
+        path = directory / ('synth%05d.lev' % i)
+        write_level(path, seed=rng.getrandbits(64), **(level_options or {}))
+        paths.append(path)
+    for i in range(replays):
+        path = directory / ('synth%05d.rec' % i)
+        write_replay(path, seed=rng.getrandbits(64), **(replay_options or {}))
+        paths.append(path)
+    return paths
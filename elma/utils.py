@@ -1,8 +1,8 @@
 from collections import namedtuple
 from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Union
 
-__all__ = ["null_padded", "signed_mod", "crypt_top10", "check_writable_file", "BoundingBox"]
+__all__ = ["null_padded", "signed_mod", "crypt_top10", "check_writable_file", "read_file", "BoundingBox"]
 
 
 def null_padded(string: str, length: int) -> bytes:
@@ -37,7 +37,7 @@ def crypt_top10(buffer: bytes) -> bytes:
     for i in range(1, len(top10)):
         top10[i] ^= (x & 0xFF)
         x += signed_mod(x, c) * c * d
-    return b''.join([bytes(chr(c), 'latin1') for c in top10])
+    return bytes(top10)
 
 
 def check_writable_file(file: Union[str, Path], exist_ok: bool = False, create_dirs: bool = False) -> None:
@@ -65,4 +65,20 @@ def check_writable_file(file: Union[str, Path], exist_ok: bool = False, create_d
         raise FileNotFoundError(f"Directory {parent} not found")
 
 
+def read_file(file: Union[str, Path, BinaryIO]) -> bytes:
+    """
+    Read the contents of a file given by its path or as a readable binary
+    file object, which is read from its current position.
+
+    Raises:
+        FileNotFoundError: if the file does not exist
+    """
+    if not isinstance(file, (str, Path)):
+        return file.read()
+    file = Path(file)
+    if not file.exists():
+        raise FileNotFoundError(f"File {file} not found.")
+    return file.read_bytes()
+
+
 BoundingBox = namedtuple('BoundingBox', ['min_x', 'max_x', 'min_y', 'max_y'])
@@ -11,6 +11,11 @@ setup(
     description='Elma Python Library.',
     test_suite="tests",
     packages=['elma'],
+    entry_points={
+        'console_scripts': [
+            'elma = elma.cli:main',
+        ],
+    },
     install_requires=[
         'pillow>=4.0.0',
     ],
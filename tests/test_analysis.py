@@ -0,0 +1,44 @@
+import unittest
+from math import hypot
+
+from elma.analysis import batch_replay_stats, replay_stats
+from elma.models import GroundTouchEvent, LeftVoltEvent, Replay, RightVoltEvent, TurnEvent
+
+
+class TestAnalysis(unittest.TestCase):
+
+    def test_replay_stats(self):
+        replay = Replay.load('tests/files/test.rec')
+        stats = replay_stats(replay)
+        self.assertEqual(replay.level_id, stats.level_id)
+        self.assertEqual(replay.time, stats.time)
+        self.assertEqual(len(replay.frames), stats.frames)
+        steps = [hypot(b.position.x - a.position.x, b.position.y - a.position.y)
+                 for a, b in zip(replay.frames, replay.frames[1:])]
+        self.assertAlmostEqual(sum(steps), stats.distance)
+        self.assertAlmostEqual(max(steps) * 30, stats.top_speed)
+        self.assertAlmostEqual(sum(f.is_gasing for f in replay.frames) / 30, stats.gas_time)
+        self.assertEqual(sum(isinstance(e, TurnEvent) for e in replay.events), stats.turns)
+        self.assertEqual(sum(isinstance(e, LeftVoltEvent) for e in replay.events), stats.left_volts)
+        self.assertEqual(sum(isinstance(e, RightVoltEvent) for e in replay.events), stats.right_volts)
+
+    def test_airtime(self):
+        replay = Replay()
+        for time in [0.0, 0.1, 1.1, 1.3, 3.3]:
+            event = GroundTouchEvent()
+            event.time = time / (0.001 / (0.182 * 0.0024))
+            replay.events.append(event)
+        stats = replay_stats(replay, min_airtime=0.5)
+        self.assertAlmostEqual(3.0, stats.airtime)
+        self.assertAlmostEqual(2.0, stats.longest_airtime)
+        self.assertEqual(0.0, stats.top_speed)
+
+    def test_batch(self):
+        files = ['tests/files/test.rec', 'tests/files/test_nonstandard_rec_format.rec']
+        expected = [replay_stats(file) for file in files]
+        self.assertEqual(expected, batch_replay_stats(files))
+        self.assertEqual(expected, batch_replay_stats(files, jobs=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
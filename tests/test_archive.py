@@ -0,0 +1,78 @@
+from io import BytesIO
+from pathlib import Path
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from elma.archive import iter_levels, iter_members, iter_replays
+from elma.models import Level, Replay
+
+FILES = ['qwquu039.lev', 'test.lev', 'test.rec', 'test_nonstandard_rec_format.rec']
+
+
+def zip_archive():
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name in FILES:
+            zf.write(Path('tests/files', name), 'pack/' + name.upper() if name == 'test.lev' else 'pack/' + name)
+        zf.writestr('pack/readme.txt', 'not a level')
+    buffer.seek(0)
+    return buffer
+
+
+def tar_archive(mode='w:gz'):
+    buffer = BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as tf:
+        for name in FILES:
+            tf.add(Path('tests/files', name), 'pack/' + name)
+    buffer.seek(0)
+    return buffer
+
+
+class NonSeekable(BytesIO):
+    def seekable(self):
+        return False
+
+
+class TestArchive(unittest.TestCase):
+
+    def test_iter_members(self):
+        self.assertEqual(['pack/qwquu039.lev', 'pack/TEST.LEV'],
+                         [name for name, _ in iter_members(zip_archive(), ['.lev'])])
+        members = dict(iter_members(tar_archive(), ['.rec', '.lev']))
+        self.assertEqual(Path('tests/files/test.rec').read_bytes(), members['pack/test.rec'])
+        self.assertEqual(4, len(members))
+        stream = NonSeekable(tar_archive('w').getvalue())
+        self.assertEqual(2, len(list(iter_members(stream, ['.rec']))))
+
+    def test_iter_levels(self):
+        expected = Level.load('tests/files/qwquu039.lev')
+        for archive in [zip_archive(), tar_archive()]:
+            levels = dict(iter_levels(archive))
+            self.assertEqual(2, len(levels))
+            self.assertEqual(expected, levels['pack/qwquu039.lev'])
+
+    def test_iter_replays_parallel(self):
+        expected = [(name, Replay.load(Path('tests/files', name.split('/')[1])).frame_columns())
+                    for name in ['pack/test.rec', 'pack/test_nonstandard_rec_format.rec']]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, 'pack.tar.gz')
+            path.write_bytes(tar_archive().getvalue())
+            for jobs in [None, 2]:
+                replays = [(name, replay.frame_columns()) for name, replay in iter_replays(path, jobs=jobs)]
+                self.assertEqual(expected, replays)
+
+    def test_load_buffers(self):
+        packed = Path('tests/files/test.rec').read_bytes()
+        replay = Replay.load('tests/files/test.rec')
+        for source in [bytearray(packed), memoryview(packed)]:
+            self.assertEqual(replay.frame_columns(), Replay.unpack(source).frame_columns())
+        with open('tests/files/test.rec', 'rb') as f:
+            self.assertEqual(replay.frame_columns(), Replay.load(f).frame_columns())
+        level = Level.load('tests/files/qwquu039.lev')
+        packed = Path('tests/files/qwquu039.lev').read_bytes()
+        self.assertEqual(level, Level.unpack(memoryview(packed)))
+        self.assertEqual(level, Level.load(BytesIO(packed)))
+        with self.assertRaises(FileNotFoundError):
+            Level.load('tests/files/missing.lev')
@@ -0,0 +1,67 @@
+import json
+import tempfile
+import unittest
+
+from elma.atlas import Atlas
+from elma.lgr import LGR_Image, unpack_LGR
+
+
+class TestAtlas(unittest.TestCase):
+
+    def setUp(self):
+        self.lgr = unpack_LGR('tests/files/default.lgr')
+
+    def assertNoOverlap(self, atlas):
+        sprites = list(atlas.sprites.values())
+        for i, a in enumerate(sprites):
+            page_width, page_height = atlas.pages[a.page].size
+            self.assertLessEqual(a.x + a.width, page_width)
+            self.assertLessEqual(a.y + a.height, page_height)
+            for b in sprites[i + 1:]:
+                self.assertFalse(a.page == b.page and
+                                 a.x < b.x + b.width and b.x < a.x + a.width and
+                                 a.y < b.y + b.height and b.y < a.y + a.height,
+                                 '%s overlaps %s' % (a, b))
+
+    def test_packing(self):
+        for max_size in [512, 2048]:
+            atlas = self.lgr.to_atlas(max_size=max_size)
+            self.assertEqual(len(self.lgr.images), len(atlas.sprites))
+            self.assertNoOverlap(atlas)
+            for image in self.lgr.images:
+                self.assertEqual(image.img.size, atlas.sprite_image(image.name).size)
+        self.assertEqual(1, len(self.lgr.to_atlas(max_size=2048).pages))
+
+    def test_transparency(self):
+        barrel = self.lgr.images[self.lgr.find_LGR_Image('barrel')]
+        index = barrel.transparent_color_index()
+        self.assertEqual(barrel.img.getpixel((0, 0)), index)
+        sprite = self.lgr.to_atlas().sprite_image('barrel')
+        self.assertEqual(0, sprite.getpixel((0, 0))[3])
+        self.assertEqual(255, sprite.getpixel((37, 38))[3])
+        barrel.transparency = LGR_Image.TRANSPARENCY_PAL_ZERO
+        self.assertEqual(0, barrel.transparent_color_index())
+        ground = self.lgr.images[self.lgr.find_LGR_Image('ground')]
+        self.assertIsNone(ground.transparent_color_index())
+
+    def test_manifest(self):
+        atlas = self.lgr.to_atlas()
+        manifest = json.loads(atlas.manifest_json())
+        self.assertEqual(self.lgr.content_hash(), manifest['lgr_hash'])
+        self.assertEqual(list(atlas.sprites['barrel']), manifest['sprites']['barrel'])
+        self.assertEqual(4 + 4 * len(atlas.pages) + 18 * len(atlas.sprites), len(atlas.manifest_binary()))
+
+    def test_cache(self):
+        self.assertIs(self.lgr.to_atlas(), self.lgr.to_atlas())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            atlas = self.lgr.to_atlas(max_size=1024, cache_dir=tmp_dir)
+            loaded = Atlas.load('%s/%s-1024-1' % (tmp_dir, self.lgr.content_hash()))
+            self.assertEqual(atlas.sprites, loaded.sprites)
+            self.assertEqual(atlas.pages[0].tobytes(), loaded.pages[0].tobytes())
+        old_hash = self.lgr.content_hash()
+        self.lgr.images[0].padding = [0] * 7
+        self.assertNotEqual(old_hash, self.lgr.content_hash())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from elma.cache import DiskCache, ObjectCache, estimate_size
+from elma.models import Level, Replay
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def test_level(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DiskCache(tmp_dir)
+            level = Level.load('tests/files/qwquu039.lev')
+            for _ in range(2):
+                cached = Level.load('tests/files/qwquu039.lev', cache=cache)
+                self.assertEqual(level.polygons, cached.polygons)
+                self.assertEqual(level.objects, cached.objects)
+                self.assertEqual(level.pictures, cached.pictures)
+                self.assertEqual(level.top10.single, cached.top10.single)
+                self.assertEqual((level.level_id, level.name, level.lgr), (cached.level_id, cached.name, cached.lgr))
+            stats = cache.stats()
+            self.assertEqual((1, 1, 0, 1), stats[:4])
+            self.assertEqual(stats.size, sum(path.stat().st_size for path in Path(tmp_dir).iterdir()))
+
+    def test_replay(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DiskCache(tmp_dir)
+            packed = Path('tests/files/test.rec').read_bytes()
+            Replay.load('tests/files/test.rec', cache=cache)
+            replay = Replay.load('tests/files/test.rec', cache=cache)
+            self.assertEqual((1, 1), (cache.hits, cache.misses))
+            self.assertEqual(857, len(replay.frames))
+            self.assertEqual(83, len(replay.events))
+            self.assertEqual(packed, replay.pack())
+
+            # entries are read by new caches over the same directory
+            cache = DiskCache(tmp_dir)
+            self.assertEqual(1, len(cache))
+            self.assertEqual(packed, Replay.load('tests/files/test.rec', cache=cache).pack())
+            self.assertEqual(1, cache.hits)
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DiskCache(tmp_dir, max_size=1)
+            Level.load('tests/files/test.lev', cache=cache)
+            self.assertEqual((0, 1, 1, 0, 0), cache.stats())
+            self.assertEqual([], list(Path(tmp_dir).iterdir()))
+
+            cache = DiskCache(tmp_dir)
+            Level.load('tests/files/test.lev', cache=cache)
+            Replay.load('tests/files/test.rec', cache=cache)
+            Level.load('tests/files/test.lev', cache=cache)
+            cache.max_size = cache.stats().size - 1
+            Replay.load('tests/files/test_nonstandard_rec_format.rec', cache=cache)
+            # the replay was the least recently used entry
+            self.assertEqual(1, cache.evictions)
+            Level.load('tests/files/test.lev', cache=cache)
+            self.assertEqual(2, cache.hits)
+
+    def test_corrupt_entry(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = DiskCache(tmp_dir)
+            Level.load('tests/files/test.lev', cache=cache)
+            entry, = Path(tmp_dir).iterdir()
+            entry.write_bytes(entry.read_bytes()[:100])
+            level = Level.load('tests/files/test.lev', cache=cache)
+            self.assertEqual(Level.load('tests/files/test.lev').polygons, level.polygons)
+            self.assertEqual((0, 2), (cache.hits, cache.misses))
+
+
+class TestObjectCache(unittest.TestCase):
+
+    def test_hits_and_reloads(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'test.lev'
+            shutil.copy('tests/files/test.lev', path)
+            cache = ObjectCache()
+            level = cache.get_level(path)
+            self.assertIs(level, cache.get_level(str(path)))
+            self.assertEqual((1, 1, 0, 1), cache.stats()[:4])
+            self.assertEqual(estimate_size(level), cache.stats().size)
+
+            os.utime(path, ns=(1, 1))
+            self.assertIsNot(level, cache.get_level(path))
+            self.assertEqual(2, cache.misses)
+            cache.invalidate(path)
+            self.assertEqual(0, len(cache))
+
+    def test_estimate_size(self):
+        replay = Replay.load('tests/files/test.rec')
+        lazy = estimate_size(replay)
+        replay.frames
+        self.assertGreater(estimate_size(replay), lazy)
+        level = Level.load('tests/files/qwquu039.lev')
+        self.assertGreater(estimate_size(level), estimate_size(Level.load('tests/files/test.lev')))
+
+    def test_eviction(self):
+        level_size = estimate_size(Level.load('tests/files/test.lev'))
+        replay_size = estimate_size(Replay.load('tests/files/test.rec'))
+        cache = ObjectCache(max_bytes=level_size + replay_size)
+        cache.get_level('tests/files/test.lev')
+        cache.get_replay('tests/files/test.rec')
+        cache.get_level('tests/files/test.lev')
+        cache.get_replay('tests/files/test_nonstandard_rec_format.rec')
+        self.assertEqual(1, cache.evictions)
+        # the replay was the least recently used entry
+        cache.get_level('tests/files/test.lev')
+        self.assertEqual(2, cache.hits)
+
+    def test_concurrent_loads(self):
+        cache = ObjectCache()
+        barrier = threading.Barrier(4)
+        load = Level.load
+
+        def slow_load(*args, **kwargs):
+            time.sleep(0.1)
+            return load(*args, **kwargs)
+
+        def get():
+            barrier.wait()
+            return cache.get_level('tests/files/test.lev')
+
+        with mock.patch.object(Level, 'load', side_effect=slow_load) as mocked_load, \
+                ThreadPoolExecutor(max_workers=4) as executor:
+            levels = list(executor.map(lambda _: get(), range(4)))
+        self.assertEqual(1, mocked_load.call_count)
+        self.assertTrue(all(level is levels[0] for level in levels))
+        self.assertEqual((3, 1), (cache.hits, cache.misses))
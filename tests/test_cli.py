@@ -0,0 +1,93 @@
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from pathlib import Path
+import json
+import tempfile
+import unittest
+
+from elma.cli import _run, main
+from elma.models import Level, Obj
+
+
+def run(*argv):
+    stdout = StringIO()
+    with redirect_stdout(stdout), redirect_stderr(StringIO()):
+        status = main(list(argv))
+    return status, [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+
+class TestCli(unittest.TestCase):
+
+    def test_info(self):
+        for jobs in ['1', '2']:
+            status, results = run('info', 'tests/files', '--jobs', jobs)
+            self.assertEqual(0, status)
+            results = {Path(result['path']).name: result for result in results}
+            self.assertEqual(['default.lgr', 'qwquu039.lev', 'test.lev', 'test.rec',
+                              'test_nonstandard_rec_format.rec'], sorted(results))
+            self.assertEqual(24, results['qwquu039.lev']['apples'])
+            self.assertEqual('sig0957.lev', results['test.rec']['level_name'])
+            self.assertEqual(77, results['default.lgr']['images'])
+
+    def test_glob(self):
+        status, results = run('validate', 'tests/files/*.lev', '--jobs', '1')
+        self.assertEqual(0, status)
+        self.assertEqual(2, len(results))
+        self.assertTrue(all(result['ok'] for result in results))
+
+    def test_failure(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, 'broken.lev').write_bytes(b'POT14 broken')
+            status, results = run('validate', directory, 'tests/files/test.lev', '--jobs', '2')
+        self.assertEqual(1, status)
+        self.assertIn('error', results[0])
+        self.assertNotIn('error', results[1])
+
+    def test_render_and_convert(self):
+        with tempfile.TemporaryDirectory() as directory:
+            status, results = run('render', 'tests/files', '-o', directory, '--scale', '5', '--jobs', '1')
+            self.assertEqual(0, status)
+            self.assertEqual(2, len(results))
+            self.assertTrue(Path(directory, 'test.png').exists())
+            status, results = run('convert', 'tests/files/test.rec', '-o', directory)
+            self.assertEqual(0, status)
+            self.assertEqual(Path('tests/files/test.rec').read_bytes(), Path(directory, 'test.rec').read_bytes())
+
+    def test_deleted(self):
+        result = _run(('info', Path('tests/files/deleted.lev'), {}))
+        self.assertEqual(0, result['size'])
+        self.assertIn('FileNotFoundError', result['error'])
+
+    def test_invalid(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, 'nostart.lev').write_bytes(Path('tests/files/test.lev').read_bytes())
+            level = Level.load(Path(directory, 'nostart.lev'))
+            level.objects = [obj for obj in level.objects if obj.type != Obj.START]
+            level.save(Path(directory, 'nostart.lev'), allow_overwrite=True)
+            status, results = run('validate', directory, '--jobs', '1')
+        self.assertEqual(1, status)
+        self.assertFalse(results[0]['ok'])
+        self.assertNotIn('error', results[0])
+
+    def test_output_collisions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, 'sub').mkdir()
+            Path(directory, 'sub', 'TEST.LEV').write_bytes(Path('tests/files/test.lev').read_bytes())
+            output = Path(directory, 'output')
+            status, results = run('convert', 'tests/files/test.lev', 'tests/files/qwquu039.lev',
+                                  str(Path(directory, 'sub')), 'tests/files/test.lev', '-o', str(output))
+            self.assertEqual(1, status)
+            errors = [result for result in results if 'error' in result]
+            self.assertEqual(3, len(errors))
+            self.assertTrue(all(error['error'].startswith('OutputCollision') for error in errors))
+            self.assertEqual(['qwquu039.lev'], [path.name for path in output.iterdir()])
+            status, results = run('convert', 'tests/files/test.rec', 'tests/files/test.rec', '-o', str(output))
+            self.assertEqual(0, status)
+
+    def test_missing(self):
+        status, results = run('info', 'tests/files/*.missing', 'tests/files/test.lev', '--jobs', '1')
+        self.assertEqual(1, status)
+        self.assertEqual(2, len(results))
+        self.assertEqual('tests/files/*.missing', results[0]['path'])
+        self.assertTrue(results[0]['error'].startswith('FileNotFoundError'))
+        self.assertNotIn('error', results[1])
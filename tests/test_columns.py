@@ -0,0 +1,65 @@
+import unittest
+
+from elma.columns import frame_columns, frames_from_columns, interpolate_frames
+from elma.models import Frame, Replay
+
+
+class TestColumns(unittest.TestCase):
+
+    def setUp(self):
+        self.replay = Replay.load('tests/files/test.rec')
+
+    def test_columns_round_trip(self):
+        columns = self.replay.frame_columns()
+        self.assertEqual(len(self.replay.frames), len(columns.x))
+        replay = Replay()
+        replay.frames = frames_from_columns(columns)
+        self.assertEqual(columns, frame_columns(replay.frames))
+
+    def test_state_at_frames(self):
+        frame = self.replay.frames[100]
+        state = self.replay.state_at(100 / 30)
+        self.assertAlmostEqual(frame.position.x, state.x)
+        self.assertAlmostEqual(frame.position.y, state.y)
+        self.assertAlmostEqual(frame.head_position.y, state.head_y)
+        self.assertAlmostEqual(frame.rotation, state.rotation)
+
+    def test_state_at_interpolation(self):
+        first, second = self.replay.frames[200:202]
+        state = self.replay.state_at([200.25 / 30])
+        self.assertEqual(1, len(state.x))
+        self.assertAlmostEqual(first.position.x + 0.25 * (second.position.x - first.position.x), state.x[0])
+        self.assertAlmostEqual(
+            first.left_wheel_position.y + 0.25 * (second.left_wheel_position.y - first.left_wheel_position.y),
+            state.left_wheel_y[0])
+
+    def test_state_at_clamping(self):
+        state = self.replay.state_at([-1.0, 1000.0])
+        self.assertEqual(self.replay.frames[0].position.x, state.x[0])
+        self.assertEqual(self.replay.frames[-1].position.x, state.x[1])
+
+    def test_state_at_scalar(self):
+        times = [-1.0, 0.0, 200.25 / 30, 7.123, 1000.0]
+        packed = Replay.load('tests/files/test.rec')
+        states = self.replay.state_at(times)
+        self.replay.frames  # decodes the frames
+        for index, time in enumerate(times):
+            expected = tuple(values[index] for values in states)
+            self.assertEqual(expected, tuple(packed.state_at(time)))
+            self.assertEqual(expected, tuple(self.replay.state_at(time)))
+
+    def test_rotation_wrap_around(self):
+        frames = [Frame(), Frame()]
+        frames[0].rotation = 9900
+        frames[1].rotation = 100
+        state = interpolate_frames(frame_columns(frames), [0.25 / 30, 0.75 / 30])
+        self.assertAlmostEqual(9950, state.rotation[0])
+        self.assertAlmostEqual(50, state.rotation[1])
+
+    def test_no_frames(self):
+        with self.assertRaises(ValueError):
+            Replay().state_at(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import random
+import unittest
+from math import hypot
+
+from elma.compare import PointGrid, compare_replays, compare_to_many
+from elma.models import Replay
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_nearest(self):
+        rng = random.Random(0)
+        xs = [rng.uniform(-50, 50) for _ in range(500)]
+        ys = [rng.uniform(-20, 20) for _ in range(500)]
+        grid = PointGrid(xs, ys, cell_size=2.0)
+        for _ in range(200):
+            x, y = rng.uniform(-100, 100), rng.uniform(-50, 50)
+            index, distance = grid.nearest(x, y)
+            expected = min(hypot(px - x, py - y) for px, py in zip(xs, ys))
+            self.assertAlmostEqual(expected, distance)
+            self.assertAlmostEqual(expected, hypot(xs[index] - x, ys[index] - y))
+
+    def test_nearest_on_path(self):
+        grid = PointGrid([0.0, 1.0, 2.0], [0.0, 0.0, 0.0])
+        index, distance = grid.nearest_on_path(1.25, 0.5)
+        self.assertAlmostEqual(1.25, index)
+        self.assertAlmostEqual(0.5, distance)
+
+    def test_compare_to_itself(self):
+        replay = Replay.load('tests/files/test.rec')
+        comparison = compare_replays(replay, replay)
+        self.assertEqual(len(replay.frames), len(comparison.deltas))
+        self.assertEqual(0.0, max(abs(delta) for delta in comparison.deltas))
+        self.assertEqual(0.0, max(comparison.distances))
+        self.assertTrue(comparison.splits)
+        self.assertTrue(all(split.delta == 0.0 for split in comparison.splits))
+
+    def test_compare_to_slower(self):
+        replay = Replay.load('tests/files/test.rec')
+        slower = Replay.load('tests/files/test.rec')
+        slower.frames = slower.frames[:1] * 30 + slower.frames
+        for event in slower.events:
+            event.time += 1 / (0.001 / (0.182 * 0.0024))
+        comparison, = compare_to_many(replay, [slower])
+        self.assertAlmostEqual(-1.0, comparison.deltas[400])
+        self.assertAlmostEqual(-1.0, comparison.splits[-1].delta)
+
+
+if __name__ == '__main__':
+    unittest.main()
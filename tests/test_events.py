@@ -0,0 +1,46 @@
+import unittest
+
+from elma.constants import EVENT_TIME_UNIT
+from elma.models import AppleTouchEvent, GroundTouchEvent, LeftVoltEvent, Replay, RightVoltEvent
+
+
+class TestEventIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.replay = Replay.load('tests/files/test.rec')
+        self.index = self.replay.event_index()
+
+    def test_events_between(self):
+        t0, t1 = 2.0, 5.0
+        expected = [e for e in self.replay.events if t0 <= e.time * EVENT_TIME_UNIT <= t1]
+        self.assertEqual(expected, self.index.events_between(t0, t1))
+        expected = [e for e in expected if isinstance(e, GroundTouchEvent)]
+        self.assertTrue(expected)
+        self.assertEqual(expected, self.index.events_between(t0, t1, GroundTouchEvent))
+
+    def test_events_between_several_kinds(self):
+        volts = (LeftVoltEvent, RightVoltEvent)
+        expected = [e for e in self.replay.events if isinstance(e, volts)]
+        self.assertEqual(expected, self.index.events_between(0, self.replay.time, volts))
+
+    def test_count(self):
+        self.assertEqual(len(self.replay.events), self.index.count())
+        self.assertEqual(self.index.counts()[AppleTouchEvent], self.index.count(AppleTouchEvent))
+        self.assertEqual(len(self.index.events_between(1.0, 3.0, GroundTouchEvent)),
+                         self.index.count(GroundTouchEvent, 1.0, 3.0))
+        self.assertEqual(sum(self.index.counts().values()), len(self.index))
+
+    def test_rate(self):
+        self.assertAlmostEqual(self.index.count(GroundTouchEvent, 0.0, 10.0) / 10.0,
+                               self.index.rate(GroundTouchEvent, 0.0, 10.0))
+        with self.assertRaises(ValueError):
+            self.index.rate(GroundTouchEvent, 1.0, 1.0)
+
+    def test_events_in_frame(self):
+        event = self.index.events[len(self.index) // 2]
+        frame_index = self.index.frame_index(event.time * EVENT_TIME_UNIT)
+        events = self.index.events_in_frame(frame_index)
+        self.assertIn(event, events)
+        for e in events:
+            self.assertEqual(frame_index, self.index.frame_index(e.time * EVENT_TIME_UNIT))
+        self.assertAlmostEqual(frame_index / 30.0, self.index.frame_time(frame_index))
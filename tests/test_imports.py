@@ -0,0 +1,21 @@
+import subprocess
+import sys
+import unittest
+
+import elma
+
+
+class TestImports(unittest.TestCase):
+
+    def test_import_without_pillow(self):
+        code = ("import sys, elma, elma.index, elma.analysis, elma.compare; "
+                "sys.exit('PIL' in sys.modules)")
+        self.assertEqual(0, subprocess.run([sys.executable, '-c', code]).returncode)
+
+    def test_lazy_names(self):
+        for module, names in elma._lazy_modules.items():
+            self.assertEqual(sorted(names), sorted(__import__(module, fromlist=['__all__']).__all__))
+            for name in names:
+                self.assertIs(getattr(sys.modules[module], name), getattr(elma, name))
+        with self.assertRaises(AttributeError):
+            elma.no_such_name
@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from elma.index import ReplayCatalog, Top10Index
+from elma.models import Level, Replay, Top10Time
+
+
+class TestTop10Index(unittest.TestCase):
+
+    def save_level(self, path, level_id, single=(), multi=()):
+        level = Level()
+        level.level_id = level_id
+        level.name = 'Level %s' % level_id
+        level.top10.single = [Top10Time(*t) for t in single]
+        level.top10.multi = [Top10Time(*t, is_multi=True) for t in multi]
+        level.save(path, allow_overwrite=True)
+
+    def test_update_and_query(self):
+        with tempfile.TemporaryDirectory() as tmp_dir, Top10Index() as index:
+            self.save_level(os.path.join(tmp_dir, 'a.lev'), 1, [(1500, 'alice'), (1600, 'bob')])
+            self.save_level(os.path.join(tmp_dir, 'b.lev'), 1, [(1400, 'bob'), (1600, 'bob')],
+                            [(900, 'carol', 'alice')])
+            self.save_level(os.path.join(tmp_dir, 'c.lev'), 2, [(3000, 'alice')])
+            self.assertEqual((3, 0, 0, 0, 0), index.update([tmp_dir]))
+            self.assertEqual(3, len(index))
+
+            best = index.best_times('alice')
+            self.assertEqual([(1, 1500), (2, 3000)], [(t.level_id, t.time) for t in best])
+            self.assertEqual('Level 1', best[0].level_name)
+            best = index.best_times('alice', is_multi=None)
+            self.assertEqual([(1, 900, True), (2, 3000, False)], [(t.level_id, t.time, t.is_multi) for t in best])
+
+            times = index.level_times(1)
+            self.assertEqual([(1400, 'bob'), (1500, 'alice'), (1600, 'bob')], [(t.time, t.kuski) for t in times])
+            top10 = index.top10(1)
+            self.assertEqual([Top10Time(1400, 'bob'), Top10Time(1500, 'alice'), Top10Time(1600, 'bob')],
+                             top10.single)
+            self.assertEqual([Top10Time(900, 'carol', 'alice', True)], top10.multi)
+
+    def test_incremental_update(self):
+        with tempfile.TemporaryDirectory() as tmp_dir, Top10Index(os.path.join(tmp_dir, 'top10.db')) as index:
+            a = os.path.join(tmp_dir, 'a.lev')
+            b = os.path.join(tmp_dir, 'b.lev')
+            self.save_level(a, 1, [(1500, 'alice')])
+            self.save_level(b, 2, [(2500, 'alice')])
+            self.assertEqual((2, 0, 0, 0, 0), index.update([tmp_dir]))
+            self.assertEqual((0, 0, 2, 0, 0), index.update([tmp_dir]))
+
+            self.save_level(a, 1, [(1400, 'alice'), (1500, 'alice')])
+            os.utime(a, ns=(1, 1))
+            os.remove(b)
+            self.assertEqual((0, 1, 0, 1, 0), index.update([tmp_dir], batch_size=1))
+            self.assertEqual([(1, 1400)], [(t.level_id, t.time) for t in index.best_times('alice')])
+            self.assertEqual(2, len(index.level_times(1)))
+
+
+class TestReplayCatalog(unittest.TestCase):
+
+    def test_update_and_find(self):
+        replay = Replay.load('tests/files/test.rec')
+        other = Replay.load('tests/files/test.rec')
+        other.level_id = 42
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                ReplayCatalog(os.path.join(tmp_dir, 'replays.db')) as catalog:
+            shutil.copy('tests/files/test.rec', os.path.join(tmp_dir, 'a.rec'))
+            os.mkdir(os.path.join(tmp_dir, 'sub'))
+            shutil.copy('tests/files/test.rec', os.path.join(tmp_dir, 'sub', 'b.rec'))
+            self.assertEqual((2, 0, 0, 0, 0), catalog.update([tmp_dir]))
+            self.assertEqual((0, 0, 2, 0, 0), catalog.update([tmp_dir]))
+
+            entries = catalog.find(level_id=replay.level_id, is_finished=replay.is_finished)
+            self.assertEqual(2, len(entries))
+            entry = entries[0]
+            self.assertEqual(os.path.join(tmp_dir, 'a.rec'), entry.path)
+            self.assertEqual(replay.level_name, entry.level_name)
+            self.assertAlmostEqual(replay.time, entry.time)
+            self.assertEqual(len(replay.frames), entry.frames)
+            self.assertEqual(len(replay.events), entry.events)
+            self.assertEqual(entry.content_hash, entries[1].content_hash)
+            self.assertEqual(2, len(catalog.find(content_hash=entry.content_hash)))
+            self.assertEqual([], catalog.find(max_time=replay.time - 1))
+            self.assertEqual(1, len(catalog.find(limit=1)))
+
+            other.save(os.path.join(tmp_dir, 'a.rec'), allow_overwrite=True)
+            os.utime(os.path.join(tmp_dir, 'a.rec'), ns=(1, 1))
+            os.remove(os.path.join(tmp_dir, 'sub', 'b.rec'))
+            self.assertEqual((0, 1, 0, 1, 0), catalog.update([tmp_dir], jobs=2))
+            self.assertEqual([42], catalog.level_ids())
+            self.assertEqual(1, len(catalog.find(level_id=42)))
+
+    def test_corrupt_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                ReplayCatalog(os.path.join(tmp_dir, 'replays.db')) as catalog:
+            corrupt = os.path.join(tmp_dir, 'a.rec')
+            with open('tests/files/test.rec', 'rb') as f:
+                packed = f.read()
+            with open(corrupt, 'wb') as f:
+                f.write(packed[:50])
+            shutil.copy('tests/files/test.rec', os.path.join(tmp_dir, 'b.rec'))
+            self.assertEqual((1, 0, 0, 0, 1), catalog.update([tmp_dir], batch_size=1))
+            self.assertEqual([os.path.join(tmp_dir, 'b.rec')], [entry.path for entry in catalog.find()])
+            self.assertEqual([corrupt], [path for path, _ in catalog.failures()])
+            self.assertIn('frames', catalog.failures()[0][1])
+            # unchanged failed files are not read again
+            self.assertEqual((0, 0, 1, 0, 1), catalog.update([tmp_dir], jobs=2))
+
+            shutil.copy('tests/files/test.rec', corrupt)
+            self.assertEqual((1, 0, 1, 0, 0), catalog.update([tmp_dir]))
+            self.assertEqual([], catalog.failures())
+
+            with open(corrupt, 'wb') as f:
+                f.write(packed[:50])
+            os.utime(corrupt, ns=(1, 1))
+            self.assertEqual((0, 0, 1, 0, 1), catalog.update([tmp_dir]))
+            self.assertEqual(1, len(catalog.find()))
+            os.remove(corrupt)
+            self.assertEqual((0, 0, 1, 0, 0), catalog.update([tmp_dir]))
+            self.assertEqual([], catalog.failures())
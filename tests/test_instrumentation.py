@@ -0,0 +1,100 @@
+import unittest
+
+from elma.instrumentation import PrometheusCollector, add_hook, clear_hooks, count, instrumented, remove_hook
+from elma.lgr import unpack_LGR
+from elma.models import Level, Replay
+from elma.packing import pack_level, unpack_level
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def tearDown(self):
+        clear_hooks()
+
+    def test_hooks(self):
+        calls = []
+
+        def hook(name, seconds, size, n):
+            calls.append((name, size, n))
+
+        @instrumented('double', size=lambda result, x: x)
+        def double(x):
+            return 2 * x
+
+        self.assertEqual(4, double(2))
+        self.assertEqual([], calls)
+        add_hook(hook)
+        self.assertEqual(6, double(3))
+        count('items', 5)
+        self.assertEqual([('double', 3, 1), ('items', 0, 5)], calls)
+        remove_hook(hook)
+        double(4)
+        self.assertEqual(2, len(calls))
+        with self.assertRaises(ValueError):
+            remove_hook(hook)
+
+    def test_failing_hook(self):
+        calls = []
+
+        def failing(name, seconds, size, n):
+            raise RuntimeError("broken hook")
+
+        @instrumented('double')
+        def double(x):
+            return 2 * x
+
+        add_hook(failing)
+        add_hook(lambda name, seconds, size, n: calls.append(name))
+        with self.assertLogs('elma.instrumentation', 'ERROR') as logs:
+            self.assertEqual(6, double(3))
+            count('items')
+        self.assertEqual(['double', 'items'], calls)
+        self.assertIn('broken hook', logs.output[0])
+
+    def test_spans(self):
+        collector = PrometheusCollector()
+        add_hook(collector)
+        with open('tests/files/qwquu039.lev', 'rb') as f:
+            packed = f.read()
+        level = unpack_level(packed)
+        pack_level(level)
+        replay = Replay.load('tests/files/test.rec')
+        replay.frames
+        unpack_LGR('tests/files/default.lgr')
+        totals = collector.totals()
+        self.assertEqual((1, len(packed)), (totals['unpack_level'][0], totals['unpack_level'][2]))
+        # polygons and points packed within the level are not reported
+        self.assertEqual(1, totals['pack_level'][0])
+        self.assertEqual(24511, totals['unpack_replay'][2])
+        self.assertEqual(857 * 27, totals['unpack_frames'][2])
+        self.assertEqual(1, totals['unpack_events'][0])
+        self.assertEqual(77, totals['decode_pcx'][0])
+        self.assertGreater(totals['unpack_LGR'][1], 0)
+
+    def test_prometheus(self):
+        collector = PrometheusCollector()
+        collector('unpack_level', 0.5, 100, 1)
+        collector('unpack_level', 0.25, 50, 1)
+        collector('decode_pcx', 0.0, 10, 3)
+        self.assertEqual('\n'.join([
+            '# HELP elma_operations_total Number of instrumented elma operations or items.',
+            '# TYPE elma_operations_total counter',
+            'elma_operations_total{operation="decode_pcx"} 3',
+            'elma_operations_total{operation="unpack_level"} 2',
+            '# HELP elma_operation_seconds_total Time spent in instrumented elma operations in seconds.',
+            '# TYPE elma_operation_seconds_total counter',
+            'elma_operation_seconds_total{operation="decode_pcx"} 0.0',
+            'elma_operation_seconds_total{operation="unpack_level"} 0.75',
+            '# HELP elma_operation_bytes_total Bytes processed by instrumented elma operations.',
+            '# TYPE elma_operation_bytes_total counter',
+            'elma_operation_bytes_total{operation="decode_pcx"} 10',
+            'elma_operation_bytes_total{operation="unpack_level"} 150',
+        ]) + '\n', collector.expose())
+        collector.reset()
+        self.assertEqual({}, collector.totals())
+
+    def test_render(self):
+        collector = PrometheusCollector()
+        add_hook(collector)
+        Level.load('tests/files/test.lev').as_image()
+        self.assertEqual(1, collector.totals()['render'][0])
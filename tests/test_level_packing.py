@@ -5,7 +5,9 @@ from elma.models import Obj
 from elma.models import Picture
 from elma.models import Point
 from elma.models import Polygon
+from elma.models import Top10
 from elma.models import Top10Time
+from elma.packing import replace_top10, unpack_top10
 import unittest
 
 
@@ -132,3 +134,81 @@ class TestLevelPacking(unittest.TestCase):
                 Obj(Point(0, 0), Obj.FOOD)
                 ], level.objects):
             self.assertEqual(expected_obj, obj)
+
+    def test_merge_top10s(self):
+        top10 = Top10()
+        top10.single = [Top10Time(1000 + i, 'player%s' % i) for i in range(10)]
+        other = Top10()
+        other.single = [Top10Time(1003, 'player3'), Top10Time(999, 'player9'), Top10Time(1005, 'player10')]
+        other.multi = [Top10Time(800, 'player1', 'player2', True)]
+        merged = Top10.merged(top10, other, other)
+        self.assertEqual(3, len(other.single))
+        self.assertEqual(10, len(merged.single))
+        self.assertEqual(Top10Time(999, 'player9'), merged.single[0])
+        self.assertEqual(Top10Time(1005, 'player5'), merged.single[6])
+        self.assertEqual(Top10Time(1005, 'player10'), merged.single[7])
+        self.assertEqual(Top10Time(1007, 'player7'), merged.single[-1])
+        self.assertEqual([Top10Time(800, 'player1', 'player2', True)], merged.multi)
+        top10.merge(other)
+        self.assertEqual(merged.single, top10.single)
+        self.assertEqual(3, len(other.single))
+
+    def test_unpack_top10(self):
+        level = Level()
+        level.top10.single.append(Top10Time(1386, 'player1'))
+        level.top10.multi.append(Top10Time(709, 'player3', 'player2', True))
+        packed = level.pack()
+        top10 = unpack_top10(packed)
+        self.assertEqual(level.top10.single, top10.single)
+        self.assertEqual(level.top10.multi, top10.multi)
+        self.assertEqual(top10.single, unpack_top10(packed[-696:]).single)
+        with self.assertRaises(ValueError):
+            unpack_top10(packed[:-4])
+
+        top10.single.append(Top10Time(1379, 'player2'))
+        replaced = replace_top10(packed, top10)
+        self.assertEqual(len(packed), len(replaced))
+        self.assertEqual([Top10Time(1379, 'player2'), Top10Time(1386, 'player1')],
+                         Level.unpack(replaced).top10.single)
+
+    def test_unpack_top10_across(self):
+        level = Level()
+        level.version = VERSION_ACROSS
+        packed = level.pack()
+        self.assertEqual([], unpack_top10(packed).single)
+        top10 = Top10()
+        top10.single.append(Top10Time(1386, 'player1'))
+        replaced = replace_top10(packed, top10)
+        self.assertEqual(top10.single, Level.unpack(replaced).top10.single)
+        self.assertEqual(packed, replace_top10(replaced, Top10()))
+
+    def test_digest(self):
+        level = Level.load('tests/files/qwquu039.lev')
+        other = Level.unpack(level.pack())
+        other.level_id = level.level_id + 1
+        self.assertEqual(level, other)
+        self.assertEqual(1, len({level, other}))
+        self.assertEqual(level.digest(), deepcopy(level).digest())
+        other.polygons[0].points = other.polygons[0].points[::-1]
+        self.assertNotEqual(level, other)
+        other.polygons[0].points.reverse()
+        self.assertEqual(level, other)
+        self.assertEqual(hash(level), hash(other))
+        other.polygons[0].points[0].x += 1
+        self.assertNotEqual(level, other)
+        other.polygons[0].points[0].x -= 1
+        self.assertEqual(level, other)
+        other.objects[0].gravity = Obj.GRAVITY_UP if other.objects[0].gravity != Obj.GRAVITY_UP else Obj.GRAVITY_DOWN
+        self.assertNotEqual(level, other)
+        other.objects[0].gravity = level.objects[0].gravity
+        self.assertEqual(level, other)
+        other.objects.append(Obj(Point(0, 0), Obj.FOOD))
+        self.assertNotEqual(level, other)
+        other.objects.pop()
+        self.assertEqual(level, other)
+        self.assertEqual(hash(level), hash(other))
+        other.pictures[0].distance += 1
+        self.assertNotEqual(level, other)
+        other.pictures[0].distance -= 1
+        other.pictures[0].texture_name = 'other'
+        self.assertNotEqual(level, other)
@@ -0,0 +1,92 @@
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from elma.levelpack import LevelPack, LevelPackWriter, fingerprint
+from elma.models import Level
+from elma.synth import random_level
+
+FILES = ['tests/files/test.lev', 'tests/files/qwquu039.lev']
+
+
+class TestLevelPack(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name, 'levels.elvp')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_random_access(self):
+        synth = random_level(seed=1, polygons=5, vertices=200, objects=10)
+        with LevelPackWriter(self.path) as writer:
+            self.assertEqual(0, writer.add_file(FILES[0]))
+            self.assertEqual(1, writer.add_file(FILES[1]))
+            self.assertEqual(2, writer.add('synth.lev', synth))
+            with self.assertRaises(KeyError):
+                writer.add_file(FILES[0])
+        with LevelPack(self.path) as pack:
+            self.assertEqual(3, len(pack))
+            self.assertEqual(['test.lev', 'qwquu039.lev', 'synth.lev'], pack.names())
+            for index, file in enumerate(FILES):
+                packed = Path(file).read_bytes()
+                level = Level.load(file)
+                self.assertEqual(packed, bytes(pack.get_bytes(index)))
+                self.assertEqual(level, pack[index])
+                self.assertEqual(level, pack[Path(file).name])
+                self.assertEqual(level, pack.by_level_id(level.level_id))
+                self.assertEqual(level.level_id, pack.level_id(Path(file).name))
+                self.assertEqual(level, pack.by_fingerprint(fingerprint(packed)))
+            self.assertEqual(synth, pack[-1])
+            self.assertIn('synth.lev', pack)
+            self.assertIn(-3, pack)
+            self.assertNotIn(-4, pack)
+            self.assertNotIn(3, pack)
+            self.assertNotIn('missing.lev', pack)
+            self.assertEqual(3, len(list(pack)))
+            with self.assertRaises(KeyError):
+                pack['missing.lev']
+            with self.assertRaises(KeyError):
+                pack.by_level_id(0)
+            with self.assertRaises(IndexError):
+                pack[3]
+
+    def test_append(self):
+        with LevelPackWriter(self.path, fingerprints=False) as writer:
+            writer.add_file(FILES[0])
+        with LevelPackWriter(self.path, 'a') as writer:
+            self.assertFalse(writer.fingerprints)
+            writer.add_file(FILES[1])
+        with LevelPack(self.path) as pack:
+            self.assertEqual(['test.lev', 'qwquu039.lev'], pack.names())
+            self.assertEqual(Level.load(FILES[0]), pack['test.lev'])
+            self.assertEqual(Level.load(FILES[1]), pack['qwquu039.lev'])
+            with self.assertRaises(ValueError):
+                pack.fingerprint(0)
+
+    def test_interrupted_append(self):
+        with LevelPackWriter(self.path) as writer:
+            writer.add_file(FILES[0])
+        # the process exits without closing the writer
+        subprocess.run([sys.executable, '-c', 'import os\n'
+                        'from elma.levelpack import LevelPackWriter\n'
+                        f'writer = LevelPackWriter({str(self.path)!r}, "a")\n'
+                        f'writer.add_file({FILES[1]!r})\n'
+                        'os._exit(0)'], check=True)
+        with LevelPack(self.path) as pack:
+            self.assertEqual(['test.lev'], pack.names())
+            self.assertEqual(Level.load(FILES[0]), pack[0])
+        with LevelPackWriter(self.path, 'a') as writer:
+            writer.add_file(FILES[1])
+        with LevelPack(self.path) as pack:
+            self.assertEqual(['test.lev', 'qwquu039.lev'], pack.names())
+            self.assertEqual(Level.load(FILES[1]), pack['qwquu039.lev'])
+            self.assertEqual(fingerprint(Path(FILES[1]).read_bytes()), pack.fingerprint(1))
+
+    def test_invalid(self):
+        self.path.write_bytes(b'not a level pack, not a level pack')
+        with self.assertRaises(ValueError):
+            LevelPack(self.path)
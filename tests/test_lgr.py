@@ -124,6 +124,17 @@ class TestLGR(unittest.TestCase):
         for k in range(len(lgr1.images)):
             self.assertEqual(lgr1.images[k], lgr2.images[k])
 
+    def test_packing_parallel(self):
+        lgr = unpack_LGR('tests/files/default.lgr')
+        packed = pack_LGR(lgr)
+        self.assertEqual(packed, pack_LGR(lgr, workers=4))
+        self.assertEqual(packed, pack_LGR(lgr, workers=2, use_processes=True))
+
+    def test_unpacking_bytes(self):
+        lgr = unpack_LGR('tests/files/default.lgr')
+        with open('tests/files/default.lgr', 'rb') as f:
+            self.assertEqual(lgr.images, unpack_LGR(f.read()).images)
+
     def test_find_LGR_Image(self):
         lgr = LGR()
         lgr.images.append(LGR_Image('aAa'))
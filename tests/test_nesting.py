@@ -0,0 +1,63 @@
+import unittest
+
+from elma.models import Level, Point, Polygon
+from elma.nesting import PolygonTree
+from elma.render import LevelRenderer
+from elma.synth import random_level
+
+
+def square(x, y, size, vertices=4):
+    side = vertices // 4
+    points = ([Point(x + size * i / side, y) for i in range(side)] +
+              [Point(x + size, y + size * i / side) for i in range(side)] +
+              [Point(x + size - size * i / side, y + size) for i in range(side)] +
+              [Point(x, y + size - size * i / side) for i in range(side)])
+    return Polygon(points)
+
+
+class TestPolygonTree(unittest.TestCase):
+
+    def test_nested(self):
+        outer = square(0, 0, 100, vertices=400)
+        island = square(10, 10, 30)
+        hole = square(20, 20, 10)
+        other = square(60, 60, 20, vertices=40)
+        grass = square(70, 70, 1)
+        grass.grass = True
+        level = Level()
+        level.polygons = [hole, other, outer, grass, island]
+        tree = level.polygon_tree()
+        self.assertEqual(4, len(tree))
+        self.assertEqual([outer], [node.polygon for node in tree.roots])
+        self.assertEqual([outer, island, hole, other], [node.polygon for node in tree])
+        hole_node, other_node, outer_node, island_node = tree.nodes
+        self.assertIs(island_node, hole_node.parent)
+        self.assertEqual([2, 1, 0, 1], [node.depth for node in tree.nodes])
+        self.assertEqual(100 * 100, outer_node.area)
+        self.assertTrue(tree.is_ground(-1, 50))
+        self.assertFalse(tree.is_ground(50, 50))
+        self.assertTrue(tree.is_ground(15, 15))
+        self.assertFalse(tree.is_ground(25, 25))
+        self.assertTrue(tree.is_ground(70, 70))
+        self.assertIs(other_node, tree.innermost(70, 70))
+        self.assertIsNone(tree.innermost(200, 200))
+        self.assertTrue(PolygonTree([]).is_ground(0, 0))
+
+    def test_level(self):
+        level = Level.load('tests/files/qwquu039.lev')
+        tree = level.polygon_tree()
+        self.assertEqual(len(level.ground_polygons), len(tree))
+        for node in tree:
+            self.assertEqual(node.polygon.is_filled(), node.is_ground_inside)
+            if node.parent is not None:
+                self.assertIn(node, node.parent.children)
+        renderer = LevelRenderer(level, max_width=400, padding=10)
+        self.assertTrue(tree.is_ground(*renderer.to_level_coordinates(10, 100)))
+        self.assertFalse(tree.is_ground(*renderer.to_level_coordinates(200, 100)))
+
+    def test_many_polygons(self):
+        level = random_level(seed=1, polygons=2000, vertices=20000)
+        tree = level.polygon_tree()
+        self.assertEqual(1, len(tree.roots))
+        for node in tree:
+            self.assertEqual(node.polygon.is_filled(), node.is_ground_inside)
@@ -1,6 +1,6 @@
 from elma.models import Point, Polygon
 import unittest
-from math import pi
+from math import cos, pi, sin
 
 
 class TestPolygon(unittest.TestCase):
@@ -47,3 +47,61 @@ class TestPolygon(unittest.TestCase):
         center = poly.center_point()
         self.assertAlmostEqual(center.x, 1.0)
         self.assertAlmostEqual(center.y, 1.0)
+
+    def test_digest(self):
+        poly1 = Polygon([Point(0, 0), Point(0, 1), Point(1, 0)])
+        poly2 = Polygon([Point(0.0, -0.0), Point(0, 1), Point(1, 0)])
+        self.assertEqual(poly1, poly2)
+        self.assertEqual(poly1.digest(), poly2.digest())
+        self.assertEqual(1, len({poly1, poly2}))
+        poly2.grass = True
+        self.assertNotEqual(poly1, poly2)
+        poly2.grass = False
+        poly2.points.append(Point(1, 1))
+        self.assertNotEqual(poly1, poly2)
+        poly2.points.pop()
+        self.assertEqual(poly1, poly2)
+        poly2.mirror()
+        self.assertNotEqual(poly1, poly2)
+        poly2.mirror()
+        self.assertEqual(poly1, poly2)
+        # cached digests follow changes made in place
+        self.assertEqual(hash(poly1), hash(poly2))
+        poly2.points[0].x = 2
+        self.assertNotEqual(poly1, poly2)
+        self.assertNotEqual(poly1.digest(), poly2.digest())
+        poly2.points[0].x = 0
+        self.assertEqual(poly1, poly2)
+        self.assertEqual(hash(poly1), hash(poly2))
+        poly2.points.reverse()
+        self.assertNotEqual(poly1, poly2)
+        poly2.points.reverse()
+        self.assertEqual(hash(poly1), hash(poly2))
+        poly2.points[1] = Point(0, 2)
+        self.assertNotEqual(poly1, poly2)
+
+    def test_points_copied(self):
+        points = [Point(0, 0), Point(0, 1), Point(1, 0)]
+        poly = Polygon(points)
+        points.append(Point(1, 1))
+        self.assertEqual(3, len(poly.points))
+        self.assertEqual(points[:3], poly.points)
+
+    def test_simplified(self):
+        circle = Polygon([Point(10 * cos(2 * pi * i / 1000), 10 * sin(2 * pi * i / 1000)) for i in range(1000)])
+        simplified = circle.simplified(0.1)
+        self.assertLess(len(simplified.points), 100)
+        self.assertGreater(len(simplified.points), 10)
+        for p in simplified.points:
+            self.assertAlmostEqual(10, (p.x ** 2 + p.y ** 2) ** 0.5)
+        # the largest gap between kept vertices stays within the tolerance
+        self.assertTrue(all(10 - 0.1 < ((a.x + b.x) ** 2 + (a.y + b.y) ** 2) ** 0.5 / 2
+                            for a, b in zip(simplified.points, simplified.points[1:] + simplified.points[:1])))
+        self.assertIs(simplified, circle.simplified(0.12))
+        self.assertIsNot(simplified, circle.simplified(0.2))
+        circle.scale(2)
+        self.assertNotEqual(simplified, circle.simplified(0.1))
+        tiny = Polygon([Point(0, 0), Point(0, 0.01), Point(0.01, 0)])
+        self.assertEqual(tiny, tiny.simplified(1))
+        with self.assertRaises(ValueError):
+            tiny.simplified(0)
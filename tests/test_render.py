@@ -1,6 +1,9 @@
 import unittest
-from PIL import Image
+from PIL import Image, ImageChops
+from elma.lgr import unpack_LGR
 from elma.packing import unpack_level
+from elma.synth import random_level
+import elma.render
 
 
 class TestLevelRender(unittest.TestCase):
@@ -29,6 +32,42 @@ class TestLevelRender(unittest.TestCase):
         self.assertEqual(level.as_image(scale=20, padding=10).size, (3337, 1669))
         self.assertEqual(level.as_image(scale=20, padding=20).size, (3357, 1689))
 
+    def test_textured_image(self):
+        level = self.load_level('tests/files/qwquu039.lev')
+        lgr = unpack_LGR('tests/files/default.lgr')
+        im = level.as_image(max_width=400, padding=10, lgr=lgr)
+        self.assertEqual(level.as_image(max_width=400, padding=10).size, im.size)
+        self.assertEqual('RGB', im.mode)
+        # level corners are ground and the center is sky
+        renderer = elma.render.LevelRenderer(level, max_width=400, padding=10, lgr=lgr)
+        mask = renderer.polygon_mask()
+        self.assertEqual(1, mask.getpixel((10, 100)))
+        self.assertEqual(0, mask.getpixel((200, 100)))
+        self.assertNotEqual(im.getpixel((10, 100)), im.getpixel((200, 100)))
+        # textures and sprites are reused across renders with the same LGR
+        cached = {id(image): dict(elma.render._image_cache(image)) for image in lgr.images}
+        self.assertTrue(any(cached.values()))
+        renderer.render()
+        self.assertEqual(cached, {id(image): dict(elma.render._image_cache(image)) for image in lgr.images})
+        # only a few scales are kept per image, and dropped with the images
+        for width in range(100, 400, 40):
+            level.as_image(max_width=width, padding=10, lgr=lgr)
+        for image in lgr.images:
+            self.assertLessEqual(len(elma.render._image_cache(image)), elma.render._CACHED_SCALES)
+        del lgr, renderer, image
+        self.assertFalse(set(cached) & set(elma.render._lgr_image_cache))
+
+    def test_simplified_image(self):
+        level = random_level(seed=1, polygons=5, vertices=20000, objects=5)
+        renderer = elma.render.LevelRenderer(level, max_width=200, max_height=200)
+        mask = renderer.polygon_mask()
+        renderer.simplify = True
+        simplified = renderer.polygon_mask()
+        self.assertEqual(mask.size, simplified.size)
+        differences = ImageChops.logical_xor(mask, simplified).histogram()[-1]
+        self.assertLess(differences, 0.01 * mask.width * mask.height)
+        self.assertEqual(mask.size, level.as_image(max_width=200, max_height=200, simplify=True).size)
+
 
 if __name__ == '__main__':
     unittest.main()
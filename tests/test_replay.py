@@ -1,4 +1,6 @@
+from copy import deepcopy
 from elma.packing import unpack_replay
+import pickle
 import unittest
 
 
@@ -10,3 +12,29 @@ class TestReplay(unittest.TestCase):
             self.assertEqual(True, replay.is_finished)
             self.assertEqual(28.545999999997303,
                              replay.time)
+
+    def test_digest(self):
+        with open('tests/files/test.rec', 'rb') as f:
+            packed = f.read()
+        replay = unpack_replay(packed)
+        other = unpack_replay(packed)
+        other.frames
+        self.assertEqual(replay, other)
+        self.assertEqual(hash(replay), hash(pickle.loads(pickle.dumps(replay))))
+        self.assertEqual(1, len({replay, other}))
+        other.events.pop()
+        self.assertNotEqual(replay, other)
+        other = unpack_replay(packed)
+        other.frames
+        self.assertEqual(hash(replay), hash(other))
+        other.frames[0].rotation += 1
+        self.assertNotEqual(replay, other)
+        other.frames[0].rotation -= 1
+        self.assertEqual(hash(replay), hash(other))
+        other.events[0].time += 1
+        self.assertNotEqual(replay, other)
+        multi = deepcopy(replay)
+        multi.is_multi = True
+        multi.second_rider = deepcopy(replay)
+        self.assertNotEqual(replay, multi)
+        self.assertEqual(multi, unpack_replay(multi.pack()))
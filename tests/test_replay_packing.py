@@ -2,6 +2,8 @@ from pathlib import Path
 import tempfile
 
 from elma.models import Replay
+from elma.packing import unpack_replay
+import pickle
 import unittest
 
 
@@ -22,6 +24,36 @@ class TestReplayPacking(unittest.TestCase):
             replay.save(saved_file)
             self.assertEqual(packed_replay, saved_file.read_bytes())
 
+    def test_packing_multi(self):
+        first = Replay.load('tests/files/test.rec')
+        second = Replay.load('tests/files/test_nonstandard_rec_format.rec')
+        first.is_multi = second.is_multi = True
+        first.second_rider = second
+        packed_replay = first.pack()
+        self.assertEqual(len(Path('tests/files/test.rec').read_bytes()) +
+                         len(Path('tests/files/test_nonstandard_rec_format.rec').read_bytes()),
+                         len(packed_replay))
+
+        replay = unpack_replay(packed_replay)
+        self.assertEqual(True, replay.is_multi)
+        self.assertEqual(857, len(replay.frames))
+        self.assertEqual(2, len(replay.riders))
+        self.assertEqual(458, len(replay.second_rider.frames))
+        self.assertEqual(42, len(replay.second_rider.events))
+        self.assertIsNone(replay.second_rider.second_rider)
+        self.assertEqual(packed_replay, replay.pack())
+        self.assertEqual(packed_replay, pickle.loads(pickle.dumps(replay)).pack())
+
+        # a multiplayer flag without a second section is not an error
+        self.assertIsNone(unpack_replay(second.pack()).second_rider)
+
+    def test_unpacking_buffers(self):
+        packed_replay = Path('tests/files/test.rec').read_bytes()
+        for buffer in [bytearray(packed_replay), memoryview(packed_replay)]:
+            replay = unpack_replay(buffer)
+            self.assertEqual(857, len(replay.frames))
+            self.assertEqual(packed_replay, replay.pack())
+
     def test_packing_nonstandard_format(self):
         # this replay uses the event info field in a non-standard way
         # in the original elma it is always -1, except for the object touch events
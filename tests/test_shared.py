@@ -0,0 +1,72 @@
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from pathlib import Path
+import pickle
+import subprocess
+import sys
+import unittest
+
+from elma.models import Level, Replay
+from elma.shared import attach_shared_memory, from_buffer, from_shared_memory, to_buffer, to_shared_memory
+
+
+def count_frames(name):
+    shm = attach_shared_memory(name)
+    replay = from_shared_memory(shm)
+    frames = len(replay.frame_columns().x)
+    del replay
+    shm.close()
+    return frames
+
+
+class TestShared(unittest.TestCase):
+
+    def test_level_buffer(self):
+        level = Level.load('tests/files/qwquu039.lev')
+        for copy in [from_buffer(to_buffer(level)), pickle.loads(pickle.dumps(level)), deepcopy(level)]:
+            self.assertEqual(level.level_id, copy.level_id)
+            self.assertEqual(level.polygons, copy.polygons)
+            self.assertEqual(level.objects, copy.objects)
+            self.assertEqual(level.pictures, copy.pictures)
+            self.assertEqual(level.top10.multi, copy.top10.multi)
+
+    def test_replay_pickle(self):
+        packed = Path('tests/files/test.rec').read_bytes()
+        replay = Replay.load('tests/files/test.rec')
+        replay.frames
+        pickled = pickle.dumps(replay)
+        self.assertLess(len(pickled), 2 * len(packed))
+        copy = pickle.loads(pickled)
+        self.assertEqual(packed, copy.pack())
+        self.assertEqual(replay.time, copy.time)
+        self.assertEqual(replay.is_finished, copy.is_finished)
+
+    def test_shared_memory(self):
+        replay = Replay.load('tests/files/test.rec')
+        shm = to_shared_memory(replay)
+        try:
+            copy = from_shared_memory(shm)
+            self.assertEqual(replay.pack(), copy.pack())
+            del copy
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                self.assertEqual(857, executor.submit(count_frames, shm.name).result())
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def test_shared_memory_unrelated_process(self):
+        replay = Replay.load('tests/files/test.rec')
+        shm = to_shared_memory(replay)
+        try:
+            # a process with its own resource tracker must not unlink the
+            # block when it exits
+            subprocess.run([sys.executable, '-c', 'from tests.test_shared import count_frames\n'
+                            f'assert count_frames({shm.name!r}) == 857'], check=True)
+            self.assertEqual(857, count_frames(shm.name))
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def test_invalid_buffer(self):
+        with self.assertRaises(ValueError):
+            from_buffer(b'POT14' + bytes(100))
@@ -0,0 +1,96 @@
+from copy import deepcopy
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from elma.models import Replay
+from elma.store import ReplayStore
+
+FILES = ['tests/files/test.rec', 'tests/files/test_nonstandard_rec_format.rec']
+
+
+class TestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name, 'replays.elst')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_byte_exact(self):
+        for compression in ['zlib', 'lzma']:
+            with ReplayStore(self.path, 'w', compression=compression) as store:
+                for file in FILES:
+                    store.add_file(file)
+            with ReplayStore(self.path) as store:
+                self.assertEqual(compression, store.compression)
+                self.assertEqual(['test.rec', 'test_nonstandard_rec_format.rec'], store.ids())
+                for file in FILES:
+                    self.assertEqual(Path(file).read_bytes(), store.get_bytes(Path(file).name))
+                self.assertEqual(Replay.load(FILES[0]).frame_columns(), store['test.rec'].frame_columns())
+            self.assertLess(self.path.stat().st_size, sum(Path(file).stat().st_size for file in FILES) * 0.6)
+
+    def test_multi(self):
+        replay = Replay.load(FILES[0])
+        replay.is_multi = True
+        replay.second_rider = deepcopy(replay)
+        packed = replay.pack()
+        with ReplayStore(self.path, 'w') as store:
+            store.add('multi', replay)
+            store.add('trailing', packed + b'extra')
+            self.assertEqual(packed, store.get_bytes('multi'))
+            self.assertEqual(packed + b'extra', store.get_bytes('trailing'))
+            self.assertEqual(len(replay.second_rider.frames), len(store.get('multi').second_rider.frames))
+
+    def test_append(self):
+        with ReplayStore(self.path, 'a') as store:
+            store.add_file(FILES[0], 'first')
+        size = self.path.stat().st_size
+        with ReplayStore(self.path, 'a') as store:
+            self.assertIn('first', store)
+            store.add_file(FILES[1], 'second')
+            with self.assertRaises(KeyError):
+                store.add_file(FILES[1], 'second')
+        self.assertGreater(self.path.stat().st_size, size)
+        with ReplayStore(self.path) as store:
+            self.assertEqual(2, len(store))
+            self.assertEqual(['first', 'second'], list(store))
+            self.assertEqual(Path(FILES[1]).read_bytes(), store.get_bytes('second'))
+            with self.assertRaises(KeyError):
+                store.get('third')
+
+    def test_interrupted_append(self):
+        with ReplayStore(self.path, 'a') as store:
+            store.add_file(FILES[0], 'first')
+        # the process exits without closing the store
+        subprocess.run([sys.executable, '-c', 'import os\n'
+                        'from elma.store import ReplayStore\n'
+                        f'store = ReplayStore({str(self.path)!r}, "a")\n'
+                        f'store.add_file({FILES[1]!r}, "second")\n'
+                        'os._exit(0)'], check=True)
+        with ReplayStore(self.path) as store:
+            self.assertEqual(['first'], store.ids())
+            self.assertEqual(Path(FILES[0]).read_bytes(), store.get_bytes('first'))
+        with ReplayStore(self.path, 'a') as store:
+            store.add_file(FILES[1], 'second')
+            store.flush()
+            store.add_file(FILES[0], 'third')
+            store.flush()
+        with ReplayStore(self.path) as store:
+            self.assertEqual(['first', 'second', 'third'], store.ids())
+            self.assertEqual(Path(FILES[1]).read_bytes(), store.get_bytes('second'))
+            self.assertEqual(Path(FILES[0]).read_bytes(), store.get_bytes('third'))
+
+    def test_errors(self):
+        with ReplayStore(self.path, 'w') as store:
+            with self.assertRaises(ValueError):
+                store.add('truncated', Path(FILES[0]).read_bytes()[:1000])
+            self.assertEqual(0, len(store))
+        self.path.write_bytes(b'not a store')
+        with self.assertRaises(ValueError):
+            ReplayStore(self.path)
+        with self.assertRaises(ValueError):
+            ReplayStore(self.path, 'x')
@@ -0,0 +1,105 @@
+from pathlib import Path
+import struct
+import tempfile
+import unittest
+
+from elma.analysis import replay_stats
+from elma.models import Level, Obj, Replay
+from elma.synth import random_level, random_replay, write_corpus, write_level, write_replay
+
+
+def segments_intersect(p1, p2, q1, q2):
+    def orientation(a, b, c):
+        return (b.x - a.x) * (c.y - a.y) - (b.y - a.y) * (c.x - a.x)
+    return (orientation(p1, p2, q1) * orientation(p1, p2, q2) < 0 and
+            orientation(q1, q2, p1) * orientation(q1, q2, p2) < 0)
+
+
+def contains(polygon, point):
+    inside = False
+    points = polygon.points
+    for p, q in zip(points, points[1:] + points[:1]):
+        if (p.y > point.y) != (q.y > point.y) and point.x < p.x + (point.y - p.y) * (q.x - p.x) / (q.y - p.y):
+            inside = not inside
+    return inside
+
+
+class TestSynth(unittest.TestCase):
+
+    def test_random_level(self):
+        level = random_level(seed=1, polygons=9, vertices=200, objects=30)
+        self.assertEqual(9, len(level.polygons))
+        self.assertEqual(200, sum(len(polygon.points) for polygon in level.polygons))
+        self.assertEqual(30, len(level.objects))
+        types = [obj.type for obj in level.objects]
+        self.assertEqual(1, types.count(Obj.START))
+        self.assertEqual(1, types.count(Obj.FLOWER))
+        edges = [(polygon_index, p, q) for polygon_index, polygon in enumerate(level.polygons)
+                 for p, q in zip(polygon.points, polygon.points[1:] + polygon.points[:1])]
+        for i, (polygon_1, p1, p2) in enumerate(edges):
+            for polygon_2, q1, q2 in edges[i + 1:]:
+                if polygon_1 != polygon_2:
+                    self.assertFalse(segments_intersect(p1, p2, q1, q2))
+        for obj in level.objects:
+            # in open space: inside the outer polygon only
+            self.assertEqual([True] + [False] * 8, [contains(polygon, obj.point) for polygon in level.polygons])
+        self.assertEqual(level.polygons, random_level(seed=1, polygons=9, vertices=200, objects=30).polygons)
+        self.assertNotEqual(level.polygons, random_level(seed=2, polygons=9, vertices=200, objects=30).polygons)
+
+    def test_random_level_sizes(self):
+        level = random_level(seed=1, polygons=1, vertices=50, objects=2)
+        self.assertEqual(50, len(level.polygons[0].points))
+        with self.assertRaises(ValueError):
+            random_level(polygons=10, vertices=20)
+        with self.assertRaises(ValueError):
+            random_level(objects=1)
+
+    def test_write_level(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, 'synth.lev')
+            write_level(path, seed=3, polygons=20, vertices=1000, objects=50)
+            packed = path.read_bytes()
+        level = random_level(seed=3, polygons=20, vertices=1000, objects=50)
+        unpacked = Level.unpack(packed)
+        self.assertEqual(level.level_id, unpacked.level_id)
+        self.assertEqual(level.polygons, unpacked.polygons)
+        self.assertEqual(level.objects, unpacked.objects)
+        # the integrity values are those pack_level computes
+        self.assertEqual(struct.unpack_from('d', level.pack(), 11), struct.unpack_from('d', packed, 11))
+        level.preserve_integrity_values = True
+        level.integrity = list(struct.unpack_from('4d', packed, 11))
+        self.assertEqual(packed, level.pack())
+
+    def test_random_replay(self):
+        level = random_level(seed=4, polygons=3, vertices=30, objects=10)
+        replay = random_replay(seed=5, seconds=20, level=level)
+        self.assertEqual(600, len(replay.frames))
+        self.assertEqual(level.level_id, replay.level_id)
+        self.assertTrue(replay.is_finished)
+        apples = sum(obj.type == Obj.FOOD for obj in level.objects)
+        self.assertEqual(apples, sum(type(event).__name__ == 'AppleTouchEvent' for event in replay.events))
+        times = [event.time for event in replay.events]
+        self.assertEqual(sorted(times), times)
+        unpacked = Replay.unpack(replay.pack())
+        self.assertTrue(unpacked.is_finished)
+        self.assertAlmostEqual(replay.time, unpacked.time)
+        stats = replay_stats(unpacked)
+        self.assertLessEqual(stats.top_speed, 25)
+        self.assertGreater(stats.distance, 0)
+        self.assertFalse(random_replay(seed=5, seconds=1, finished=False).is_finished)
+
+    def test_write_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, 'synth.rec')
+            write_replay(path, seed=6, seconds=300)
+            packed = path.read_bytes()
+        self.assertEqual(random_replay(seed=6, seconds=300).pack(), packed)
+
+    def test_write_corpus(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_corpus(directory, levels=2, replays=3, seed=7,
+                                 level_options={'vertices': 500}, replay_options={'seconds': 5})
+            self.assertEqual(['synth00000.lev', 'synth00001.lev', 'synth00000.rec', 'synth00001.rec',
+                              'synth00002.rec'], [path.name for path in paths])
+            self.assertEqual(500, sum(len(polygon.points) for polygon in Level.load(paths[1]).polygons))
+            self.assertEqual(150, len(Replay.load(paths[4]).frames))